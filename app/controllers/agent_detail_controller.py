@@ -48,3 +48,10 @@ class AgentDetailController:
         """Get event table filtered by agent name"""
         event_data = await AgentDetailModel.load_event_table(start_time, end_time, group_name, agent_name)
         return event_data
+
+    @staticmethod
+    async def page_event_table(start_time: datetime, end_time: datetime, agent_name: str, group_name: Optional[List[str]] = None,
+                               page_size: int = 100, cursor: Optional[str] = None) -> Dict:
+        """Get one page of the agent's events and the cursor of the next page"""
+        page = await AgentDetailModel.load_event_table_page(start_time, end_time, group_name, agent_name, page_size, cursor)
+        return {"events": page.hits, "next_cursor": page.next_cursor}
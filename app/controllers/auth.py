@@ -1,12 +1,16 @@
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
-from app.models.user_db import UserModel as DBUserModel
-from app.ext.error import UserNotFoundError, AuthControllerError, InvalidPasswordError, UserExistedError, UserDisabledError, InvalidTokenError, PermissionError
+from app.models.user_db import UserModel as DBUserModel, AuthContext
+from app.tools.cache import principal_cache, PRINCIPAL_CACHE_TTL, PRINCIPAL_CACHE_NEGATIVE_TTL
+from app.tools.hashing import password_hasher
+from app.tools.throttle import client_limiter, username_limiter
+from app.tools.membership import membership_versions, TOKEN_GROUP_CLAIMS, TOKEN_CLAIMS_MAX_AGE
+from app.ext.error import UserNotFoundError, AuthControllerError, InvalidPasswordError, UserExistedError, UserDisabledError, InvalidTokenError, PermissionError, TooManyRequestsError
 from logging import getLogger
 
 # Get the centralized logger
@@ -16,7 +20,7 @@ class AuthController:
     SECRET_KEY = os.getenv("SECRET_KEY")
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = password_hasher.context
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
     @classmethod
@@ -35,22 +39,84 @@ class AuthController:
         return jwt.encode(to_encode, cls.SECRET_KEY, algorithm=cls.ALGORITHM)
 
     @classmethod
-    def authenticate_user(cls, username: str, password: str) -> Dict:
+    async def issue_token(cls, user) -> Dict:
+        """
+        Access token for `user`. With TOKEN_GROUP_CLAIMS it also carries the user's id, role, groups
+        and membership version, so get_auth_context can authorize requests without the database.
+        """
+        data = {"sub": user.username}
+        if TOKEN_GROUP_CLAIMS:
+            data.update({
+                "uid": user.id,
+                "role": user.user_role,
+                "groups": [] if user.user_role == 'admin' else await DBUserModel.get_user_groups(user.id),
+                "ver": await membership_versions.current(user.id),
+                "iat": int(time.time())
+            })
+        return {"access_token": cls.create_access_token(data=data), "token_type": "bearer"}
+
+    @staticmethod
+    async def context_from_claims(payload: Dict) -> Optional[AuthContext]:
+        """Context built from the token's group claims, or None when they are absent, stale or outdated."""
+        if not TOKEN_GROUP_CLAIMS or "ver" not in payload:
+            return None
+        user_id, issued_at = payload.get("uid"), payload.get("iat", 0)
+        if user_id is None or time.time() - issued_at > TOKEN_CLAIMS_MAX_AGE:
+            return None
+        if not await membership_versions.is_current(user_id, payload["ver"]):
+            return None
+        principal = DBUserModel(id=user_id, username=payload["sub"], password=None, disabled=0, user_role=payload.get("role", 'user'))
+        return AuthContext(principal, payload.get("groups"))
+
+    @staticmethod
+    def throttle(client_ip: Optional[str], username: Optional[str] = None) -> None:
+        """
+        Reject the attempt with a 429 when the client IP made too many login or signup attempts, or
+        the username had too many failed logins, before any password is hashed. Without a client IP
+        only the username limit applies, so unresolved clients do not all share one bucket.
+        """
+        retry_after = client_limiter.retry_after(client_ip) if client_ip else 0.0
+        if username is not None:
+            retry_after = max(retry_after, username_limiter.retry_after(username))
+        if retry_after > 0:
+            logger.warning(f"Throttled authentication attempt from {client_ip} for {username}")
+            raise TooManyRequestsError("Too many attempts, please retry later", retry_after=retry_after)
+        if client_ip:
+            client_limiter.hit(client_ip)
+
+    @classmethod
+    async def authenticate_user(cls, username: str, password: str, client_ip: Optional[str]) -> Dict:
+        cls.throttle(client_ip, username)
         try:
-            user = DBUserModel.get_user_by_username(username)
+            user = await DBUserModel.get_user_by_username(username)
             if not user:
                 raise UserNotFoundError("User not found")
             if user.disabled == 1:
                 raise UserDisabledError("User is disabled")
-            if not cls.verify_password(password, user.password):
+            if not await password_hasher.verify(password, user.password):
                 raise InvalidPasswordError("Incorrect password")
-            access_token = cls.create_access_token(data={"sub": user.username})
-            return {"access_token": access_token, "token_type": "bearer"}
+            username_limiter.reset(username)
+            return await cls.issue_token(user)
         except (UserNotFoundError, InvalidPasswordError, UserDisabledError):
+            username_limiter.hit(username)
             raise
         except Exception as e:
             raise
 
+    @staticmethod
+    async def resolve_user(username: str):
+        """
+        User row for `username` (None if unknown), from the principal cache when possible.
+        Cached rows are shared between requests and must be treated as read-only.
+        """
+        if PRINCIPAL_CACHE_TTL <= 0:
+            return await DBUserModel.get_user_by_username(username)
+        hit, user = principal_cache.get("principal", username)
+        if not hit:
+            user = await DBUserModel.get_user_by_username(username)
+            principal_cache.set(username, user, PRINCIPAL_CACHE_TTL if user is not None else PRINCIPAL_CACHE_NEGATIVE_TTL)
+        return user
+
     @classmethod
     async def get_current_user(cls, token: str = Depends(oauth2_scheme)) -> DBUserModel:
         try:
@@ -58,7 +124,7 @@ class AuthController:
             username: str = payload.get("sub")
             if username is None:
                 raise InvalidTokenError()
-            user = DBUserModel.get_user_by_username(username)
+            user = await cls.resolve_user(username)
             if user is None or user.disabled == 1:
                 raise InvalidTokenError()
             return user
@@ -69,17 +135,36 @@ class AuthController:
             raise AuthControllerError(f"Token validation error: {str(e)}")
 
     @classmethod
-    def create_user_signup(cls, username: str, password: str, email: str, company_name: str, license_amount: int) -> None:
+    async def get_auth_context(cls, token: str = Depends(oauth2_scheme)) -> AuthContext:
+        """
+        Route dependency with the request's authorization context. FastAPI resolves it once per
+        request, so the routes and their dependencies share the same context.
+        """
+        try:
+            context = await cls.context_from_claims(jwt.decode(token, cls.SECRET_KEY, algorithms=[cls.ALGORITHM]))
+        except JWTError:
+            raise InvalidTokenError()
+        if context is not None:
+            return context
+        current_user = await cls.get_current_user(token)
+        if current_user.disabled == 1:
+            raise PermissionError("User account is disabled")
+        return await AuthContext.resolve(current_user)
+
+    @classmethod
+    async def create_user_signup(cls, username: str, password: str, email: str, company_name: str, license_amount: int,
+                                 client_ip: Optional[str]) -> None:
+        cls.throttle(client_ip)
         try:
-            existing_active_user = DBUserModel.get_active_user(username, email)
+            existing_active_user = await DBUserModel.get_active_user(username, email)
             if existing_active_user:
                 raise UserExistedError("An active user with this username or email already exists")
 
-            existing_any_user = DBUserModel.get_any_user(username, email)
+            existing_any_user = await DBUserModel.get_any_user(username, email)
             if existing_any_user:
                 raise UserExistedError("A user with this username or email already exists but is not active")
 
-            hashed_password = cls.get_password_hash(password)
+            hashed_password = await password_hasher.hash(password)
             new_user = {
                 'username': username,
                 'password': hashed_password,
@@ -88,8 +173,8 @@ class AuthController:
                 'license_amount': license_amount,
                 'disabled': 1  
             }
-            DBUserModel.create_user_signup(**new_user)
-        except UserExistedError:
+            await DBUserModel.create_user_signup(**new_user)
+        except (UserExistedError, TooManyRequestsError):
             raise
         except Exception as e:
             logger.error(f"User creation error: {str(e)}")
@@ -101,6 +186,6 @@ class AuthController:
             raise PermissionError("User account is disabled")
         if user.user_role == 'admin':
             return
-        has_permission = DBUserModel.check_user_group(user.id, group_name)
+        has_permission = await DBUserModel.check_user_group(user.id, group_name)
         if not has_permission:
             raise PermissionError("Permission denied")
\ No newline at end of file
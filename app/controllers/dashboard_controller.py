@@ -1,11 +1,10 @@
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 from app.models.dashboard_db import DashboardModel
 
 class DashboardController:
     @staticmethod
-    async def clean_agent_summary(start_time: datetime, end_time: datetime, user_groups: List[str]=None):
-        data = await DashboardModel.load_agent_summary(start_time, end_time, user_groups)
+    def format_agent_summary(data: Dict) -> Dict:
         return {
             "agent_summary": {
                 "connected_agents": data.get("connected", 0),
@@ -14,9 +13,12 @@ class DashboardController:
         }
 
     @staticmethod
-    async def clean_agent_os(start_time: datetime, end_time: datetime, user_groups: List[str]=None):
-        """Get OS distribution of agents"""
-        data = await DashboardModel.load_agent_os(start_time, end_time, user_groups)
+    async def clean_agent_summary(start_time: datetime, end_time: datetime, user_groups: List[str]=None):
+        data = await DashboardModel.load_agent_summary(start_time, end_time, user_groups)
+        return DashboardController.format_agent_summary(data)
+
+    @staticmethod
+    def format_agent_os(data: List[Dict]) -> Dict:
         # 返回正確的嵌套結構
         return {
             "agent_os": [
@@ -29,9 +31,13 @@ class DashboardController:
         }
 
     @staticmethod
-    async def clean_alerts(start_time: datetime, end_time: datetime, user_groups: List[str]=None):
-        """Get alerts severity statistics"""
-        data = await DashboardModel.load_alerts(start_time, end_time, user_groups)
+    async def clean_agent_os(start_time: datetime, end_time: datetime, user_groups: List[str]=None):
+        """Get OS distribution of agents"""
+        data = await DashboardModel.load_agent_os(start_time, end_time, user_groups)
+        return DashboardController.format_agent_os(data)
+
+    @staticmethod
+    def format_alerts(data: Dict) -> Dict:
         return {
             "alerts": {
                 "critical_severity": data.get("critical_severity", 0),
@@ -42,9 +48,13 @@ class DashboardController:
         }
 
     @staticmethod
-    async def clean_cve_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
-        """Get CVE statistics"""
-        data = await DashboardModel.load_cve_barchart(start_time, end_time, group_name)
+    async def clean_alerts(start_time: datetime, end_time: datetime, user_groups: List[str]=None):
+        """Get alerts severity statistics"""
+        data = await DashboardModel.load_alerts(start_time, end_time, user_groups)
+        return DashboardController.format_alerts(data)
+
+    @staticmethod
+    def format_cve_barchart(data: List[Dict]) -> Dict:
         return {
             "cve_barchart": [
                 {
@@ -56,17 +66,25 @@ class DashboardController:
         }
 
     @staticmethod
-    async def clean_tactic_linechart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
-        """Get tactic timeline data"""
-        data = await DashboardModel.load_tactic_linechart(start_time, end_time, group_name)
+    async def clean_cve_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        """Get CVE statistics"""
+        data = await DashboardModel.load_cve_barchart(start_time, end_time, group_name)
+        return DashboardController.format_cve_barchart(data)
+
+    @staticmethod
+    def format_tactic_linechart(data: List[Dict]) -> Dict:
         return {
             "tactic_linechart": data
         }
 
     @staticmethod
-    async def clean_malicious_file_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
-        """Get malicious file statistics"""
-        data = await DashboardModel.load_malicious_file_barchart(start_time, end_time, group_name)
+    async def clean_tactic_linechart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        """Get tactic timeline data"""
+        data = await DashboardModel.load_tactic_linechart(start_time, end_time, group_name)
+        return DashboardController.format_tactic_linechart(data)
+
+    @staticmethod
+    def format_malicious_file_barchart(data: List[Dict]) -> Dict:
         return {
             "malicious_file_barchart": [
                 {
@@ -78,9 +96,13 @@ class DashboardController:
         }
 
     @staticmethod
-    async def clean_authentication_piechart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
-        """Get authentication statistics"""
-        data = await DashboardModel.load_authentication_piechart(start_time, end_time, group_name)
+    async def clean_malicious_file_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        """Get malicious file statistics"""
+        data = await DashboardModel.load_malicious_file_barchart(start_time, end_time, group_name)
+        return DashboardController.format_malicious_file_barchart(data)
+
+    @staticmethod
+    def format_authentication_piechart(data: List[Dict]) -> Dict:
         return {
             "authentication_piechart": [
                 {
@@ -92,9 +114,13 @@ class DashboardController:
         }
 
     @staticmethod
-    async def clean_agent_name(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
-        """Get agent event statistics"""
-        data = await DashboardModel.load_agent_events(start_time, end_time, group_name)
+    async def clean_authentication_piechart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        """Get authentication statistics"""
+        data = await DashboardModel.load_authentication_piechart(start_time, end_time, group_name)
+        return DashboardController.format_authentication_piechart(data)
+
+    @staticmethod
+    def format_agent_name(data: List[Dict]) -> Dict:
         return {
             "agent_name": [
                 {
@@ -106,9 +132,13 @@ class DashboardController:
         }
 
     @staticmethod
-    async def clean_event_table(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
-        """Get event details"""
-        data = await DashboardModel.load_event_table(start_time, end_time, group_name)
+    async def clean_agent_name(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        """Get agent event statistics"""
+        data = await DashboardModel.load_agent_events(start_time, end_time, group_name)
+        return DashboardController.format_agent_name(data)
+
+    @staticmethod
+    def format_event_table(data: List[Dict]) -> Dict:
         return {
             "event_table": [
                 {
@@ -122,3 +152,34 @@ class DashboardController:
                 for item in data
             ]
         }
+
+    @staticmethod
+    async def clean_event_table(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        """Get event details"""
+        data = await DashboardModel.load_event_table(start_time, end_time, group_name)
+        return DashboardController.format_event_table(data)
+
+    @staticmethod
+    async def page_event_table(start_time: datetime, end_time: datetime, group_name: List[str]=None,
+                               page_size: int = 100, cursor: Optional[str] = None) -> Dict:
+        """Get one page of event details and the cursor of the next page"""
+        page = await DashboardModel.load_event_table_page(start_time, end_time, group_name, page_size, cursor)
+        event_table = DashboardController.format_event_table(page.hits)
+        event_table["next_cursor"] = page.next_cursor
+        return event_table
+
+    @staticmethod
+    async def get_snapshot(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        """Get every dashboard widget from a single `_msearch`"""
+        data = await DashboardModel.load_snapshot(start_time, end_time, group_name)
+        snapshot = {}
+        snapshot.update(DashboardController.format_agent_summary(data["agent_summary"]))
+        snapshot.update(DashboardController.format_agent_os(data["agent_os"]))
+        snapshot.update(DashboardController.format_alerts(data["alerts"]))
+        snapshot.update(DashboardController.format_cve_barchart(data["cve_barchart"]))
+        snapshot.update(DashboardController.format_tactic_linechart(data["tactic_linechart"]))
+        snapshot.update(DashboardController.format_malicious_file_barchart(data["malicious_file_barchart"]))
+        snapshot.update(DashboardController.format_authentication_piechart(data["authentication_piechart"]))
+        snapshot.update(DashboardController.format_agent_name(data["agent_events"]))
+        snapshot.update(DashboardController.format_event_table(data["event_table"]))
+        return snapshot
@@ -0,0 +1,14 @@
+from app.models.ingest_queue import ingest_queue
+from app.models.user_db import UserModel
+from app.schemas.ingest import IngestBatchStatus
+from app.ext.error import NotFoundError
+
+class IngestController:
+
+    @staticmethod
+    def get_batch_status(batch_id: str, user: UserModel) -> IngestBatchStatus:
+        """Return the outcome of a queued upload. Users only see the batches they submitted."""
+        batch = ingest_queue.get_batch(batch_id)
+        if batch is None or (user.user_role != 'admin' and batch.owner != user.username):
+            raise NotFoundError("Batch not found")
+        return IngestBatchStatus(**batch.to_dict())
@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user_db import GroupSignup, UserSignup, SessionLocal
 from app.models.user_db import UserModel
 from app.models.wazuh_db import AgentModel
@@ -12,30 +13,28 @@ logger = getLogger('app_logger')
 class ManageController:
 
     @staticmethod
-    def get_group_email_map(current_user: UserModel) -> Dict[str, str]:
-        db: Session = SessionLocal()
-        try:
+    async def get_group_email_map(current_user: UserModel) -> Dict[str, str]:
+        async with SessionLocal() as db:
             # Query to get group names and associated emails
-            groups_with_emails = db.query(GroupSignup.group_name, UserSignup.email)\
-                .join(UserSignup, GroupSignup.user_signup_id == UserSignup.id)\
-                .all()
+            groups_with_emails = (await db.execute(
+                select(GroupSignup.group_name, UserSignup.email)
+                .join(UserSignup, GroupSignup.user_signup_id == UserSignup.id)
+            )).all()
             
             # Returning a dictionary mapping group names to emails
             return {group_name: email for group_name, email in groups_with_emails}
-        finally:
-            db.close()
 
     @staticmethod
     def get_current_user():
         pass
     
     @staticmethod
-    def toggle_user_status(user_id: int) -> bool:
-        return ManageModel.toggle_disabled_status(user_id)
+    async def toggle_user_status(user_id: int) -> bool:
+        return await ManageModel.toggle_disabled_status(user_id)
 
     @staticmethod
-    def update_user_license(user_id: int, license_amount: int) -> bool:
-        return ManageModel.update_license_amount(user_id, license_amount)
+    async def update_user_license(user_id: int, license_amount: int) -> bool:
+        return await ManageModel.update_license_amount(user_id, license_amount)
 
     @staticmethod
     async def get_total_agents(group_names: Optional[List[str]] = None):
@@ -49,22 +48,22 @@ class ManageController:
             raise
 
     @staticmethod
-    def get_total_license(user_id: Optional[int] = None):
+    async def get_total_license(user_id: Optional[int] = None):
         try:
             if user_id:
-                return ManageModel.get_user_license(user_id)
+                return await ManageModel.get_user_license(user_id)
             else:
-                return ManageModel.get_total_license()
+                return await ManageModel.get_total_license()
         except Exception as e:
             logger.error(f"Error getting total license: {str(e)}")
             raise
 
     @staticmethod
-    def get_users(db: Session):
-        return ManageModel.get_all_users(db)
+    async def get_users(db: AsyncSession):
+        return await ManageModel.get_all_users(db)
 
     @staticmethod
-    def get_next_agent_name(current_user: UserModel) -> str:
+    async def get_next_agent_name(current_user: UserModel) -> str:
         """Get next available agent name for the user"""
-        user_groups = ManageModel.get_user_groups(current_user.id)
-        return ManageModel.get_next_agent_name(current_user.username, user_groups)
+        user_groups = await ManageModel.get_user_groups(current_user.id)
+        return await ManageModel.get_next_agent_name(current_user.username, user_groups)
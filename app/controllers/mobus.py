@@ -1,21 +1,30 @@
 from app.models.mobus_db import ModbusEventModel
-from app.schemas.mobus import ModbusEventCreate, ModbusEventResponse, SyslogEventCreate, SyslogEventResponse
+from app.models.ingest_queue import ingest_queue, IngestBatch
+from app.schemas.mobus import ModbusEventCreate, SyslogEventCreate
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
 
 modbus_model = ModbusEventModel()
 
 class ModbusEventController:
     @staticmethod
-    def create_modbus_event(event: ModbusEventCreate):
-        return modbus_model.create_event(event)
+    async def create_modbus_event(event: ModbusEventCreate):
+        return await modbus_model.create_event(event)
 
-    def get_modbus_events(start_time: datetime, end_time: datetime) -> List[ModbusEventResponse]:
-        return modbus_model.get_events(start_time, end_time)
+    async def get_modbus_events(start_time: datetime, end_time: datetime) -> List[Dict]:
+        return await modbus_model.get_events(start_time, end_time)
     
     @staticmethod
-    def create_syslog_event(event: SyslogEventCreate):
-        return modbus_model.create_syslog_event(event)
+    async def create_syslog_event(event: SyslogEventCreate):
+        return await modbus_model.create_syslog_event(event)
 
-    def get_syslog_events(start_time: datetime, end_time: datetime) -> List[SyslogEventResponse]:
-        return modbus_model.get_syslog_events(start_time, end_time)
+    async def get_syslog_events(start_time: datetime, end_time: datetime) -> List[Dict]:
+        return await modbus_model.get_syslog_events(start_time, end_time)
+
+    @staticmethod
+    def enqueue_modbus_event(event: ModbusEventCreate, owner: Optional[str] = None) -> IngestBatch:
+        return ingest_queue.submit([modbus_model.event_bulk_action(event)], owner)
+
+    @staticmethod
+    def enqueue_syslog_event(event: SyslogEventCreate, owner: Optional[str] = None) -> IngestBatch:
+        return ingest_queue.submit([modbus_model.syslog_bulk_action(event)], owner)
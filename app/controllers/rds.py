@@ -1,12 +1,16 @@
 from datetime import datetime
-from app.schemas.rds import RDSDetectionRequest, RDSDetectionResponse, RDSGetResponse, RDSDetectionRecord
-from app.models.rds_db import RDSModel
+from typing import Dict, Optional
+from app.schemas.rds import RDSDetectionRequest, RDSDetectionResponse, RDSDetectionRecord
+from app.models.rds_db import RDSModel, create_index_with_mapping
+from app.models.ingest_queue import ingest_queue, IngestBatch
 from app.ext.error import ElasticsearchError
 from logging import getLogger
 
 # Get the centralized logger
 logger = getLogger('app_logger')
 
+RDS_RECORD_FIELDS = list(RDSDetectionRecord.model_fields)
+
 class RDSController:
     """Controller for handling RDS detection operations."""
 
@@ -49,7 +53,25 @@ class RDSController:
             raise ElasticsearchError(f"Error saving detection: {str(e)}")
 
     @staticmethod
-    async def get_detections(start_time: datetime, end_time: datetime, account: str = None) -> RDSGetResponse:
+    async def enqueue_detection(detection: RDSDetectionRequest, owner: Optional[str] = None) -> IngestBatch:
+        """
+        Queue RDS detection events on the write-behind queue.
+
+        Args:
+            detection (RDSDetectionRequest): The detection request containing events to save
+            owner (str, optional): Username that submitted the batch
+
+        Returns:
+            IngestBatch: Batch tracking the outcome of the queued events
+        """
+        if detection.method != "rds_detection":
+            raise ValueError("Invalid method type. Must be 'rds_detection'")
+        index_name = await create_index_with_mapping()
+        actions = [RDSModel(detection, event).to_bulk_action(index_name) for event in detection.event]
+        return ingest_queue.submit(actions, owner)
+
+    @staticmethod
+    async def get_detections(start_time: datetime, end_time: datetime, account: str = None) -> Dict:
         """
         Retrieve RDS detection events from the database.
         
@@ -59,7 +81,7 @@ class RDSController:
             account (str, optional): Account identifier to filter records
             
         Returns:
-            RDSGetResponse: Response containing the list of detection records
+            Dict: RDSGetResponse-shaped content with the list of detection records
             
         Raises:
             ElasticsearchError: If there's an error retrieving from the database
@@ -68,33 +90,20 @@ class RDSController:
             # Get detections from database
             detections = await RDSModel.get_detections(start_time, end_time, account)
             
-            # Convert to RDSDetectionRecord objects
+            # Shape the trusted documents like RDSDetectionRecord without building a model per record
             records = [
-                RDSDetectionRecord(
-                    timestamp=datetime.fromisoformat(det["timestamp"].replace("Z", "+00:00")),
-                    account=det["account"],
-                    edge_name=det["edge_name"],
-                    edge_ip=det["edge_ip"],
-                    edge_mac=det["edge_mac"],
-                    edge_os=det["edge_os"],
-                    edge_ssid=det["edge_ssid"],
-                    edge_dns_gateway=det["edge_dns_gateway"],
-                    tag_id=det["tag_id"],
-                    tag=det["tag"],
-                    file_hash=det["file_hash"],
-                    file_name=det["file_name"],
-                    file_path=det["file_path"],
-                    score=det["score"],
-                    data_type=det["data_type"]
-                )
+                {
+                    field: datetime.fromisoformat(det["timestamp"].replace("Z", "+00:00")) if field == "timestamp" else det[field]
+                    for field in RDS_RECORD_FIELDS
+                }
                 for det in detections
             ]
             
-            return RDSGetResponse(
-                success=True,
-                total=len(records),
-                records=records
-            )
+            return {
+                "success": True,
+                "total": len(records),
+                "records": records
+            }
 
         except ElasticsearchError as e:
             logger.error(f"Database error in get_detections: {str(e)}")
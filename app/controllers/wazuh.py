@@ -1,16 +1,20 @@
-from typing import List, Dict, Optional
-from collections import defaultdict, Counter
+from typing import AsyncIterator, List, Dict, Optional
+from collections import defaultdict
 from functools import wraps
-from app.models.wazuh_db import AgentModel, EventModel
-from app.models.user_db import UserModel
-from app.schemas.wazuh import Agent as AgentSchema, WazuhEvent, PieChartData, PieChartItem
-from app.schemas.wazuh import AgentSummary, AgentMessagesResponse, AgentMessage, LineChartResponse, LineData, AgentDetailResponse, AgentDetailsAPIResponse
-from app.ext.error import ElasticsearchError, UnauthorizedError, PermissionError, HTTPError, UserNotFoundError
+from app.models.wazuh_db import AgentModel, EventModel, get_index_name
+from app.models.ingest_queue import ingest_queue, IngestBatch
+from app.models.alert_feed import alert_feed
+from app.models.user_db import UserModel, AuthContext
+from app.schemas.wazuh import Agent as AgentSchema, WazuhEvent, PieChartData, PieChartItem, AgentInfoRequest
+from app.schemas.wazuh import AgentSummary, AgentMessagesResponse, AgentMessage, LineChartResponse, LineData
+from app.ext.error import ElasticsearchError, UnauthorizedError, PermissionError, HTTPError, UserNotFoundError, BadRequestError, ServiceUnavailableError
 from datetime import datetime
-from dateutil.parser import parse
 from dateutil.tz import tzutc
 from logging import getLogger
 from datetime import timezone   
+import csv
+import io
+import json
 
 # Get the centralized logger
 logger = getLogger('app_logger')
@@ -29,6 +33,8 @@ def handle_exceptions(func):
             raise UnauthorizedError("Authentication required")
         except PermissionError:
             raise PermissionError("Permission denied")
+        except (BadRequestError, ServiceUnavailableError):
+            raise
         except ElasticsearchError as e:
             raise ElasticsearchError("Database error")
         except Exception as e:
@@ -47,7 +53,7 @@ class AgentController:
             raise PermissionError("User account is disabled")
         if user.user_role == 'admin':
             return
-        has_permission = UserModel.check_user_group(user.id, group_name)
+        has_permission = await UserModel.check_user_group(user.id, group_name)
         if not has_permission:
             raise PermissionError("Permission denied")
         
@@ -58,7 +64,7 @@ class AgentController:
         Save agent information to Elasticsearch.
         """
         agent_model = AgentModel(agent)
-        result = AgentModel.save_to_elasticsearch(agent_model)
+        result = await AgentModel.save_to_elasticsearch(agent_model)
         
     @staticmethod
     @handle_exceptions
@@ -74,17 +80,16 @@ class AgentController:
 
     @staticmethod
     @handle_exceptions
-    async def get_group_agents_and_events(user: UserModel, start_time: datetime, end_time: datetime) -> Dict[str, List[Dict]]:
+    async def get_group_agents_and_events(auth: AuthContext, start_time: datetime, end_time: datetime) -> Dict[str, List[Dict]]:
         """
         Retrieve agents and events for a user's groups within a specific time range.
         """
         try:
-            if user.user_role == 'admin':
+            if auth.is_admin:
                 agents = await AgentModel.load_all_agents()
                 events = await EventModel.load_all_events_from_elasticsearch(start_time, end_time)
             else:
-                user_groups = UserModel.get_user_groups(user.username)
-                group_names = [group['group_name'] for group in user_groups]
+                group_names = auth.group_names
                 agents = await AgentModel.load_agents_by_groups(group_names)
                 events = await EventModel.load_group_events_from_elasticsearch(group_names, start_time, end_time)
                         
@@ -94,90 +99,38 @@ class AgentController:
             logger.error(f"Error in get_group_agents_and_events: {str(e)}")
             raise
 
-    @staticmethod
-    def determine_os(os_name: str) -> str:
-        os_name = os_name.lower()
-        if any(keyword in os_name for keyword in ['windows', 'microsoft']):
-            return 'windows'
-        elif any(keyword in os_name for keyword in ['linux', 'ubuntu', 'centos', 'redhat', 'debian']):
-            return 'linux'
-        elif any(keyword in os_name for keyword in ['mac', 'darwin']):
-            return 'macos'
-        else:
-            return 'other'
-
     @staticmethod
     @handle_exceptions
-    async def get_agent_summary(user: UserModel, start_time: datetime, end_time: datetime) -> List[AgentSummary]:
+    async def get_agent_summary(auth: AuthContext, start_time: datetime, end_time: datetime) -> List[AgentSummary]:
         
-        if user.user_role == 'admin':
-            group_names = None  
-        else:
-            group_names = UserModel.get_user_groups(user.id)  # Remove await here
-            if not group_names:
-                return []
+        group_names = auth.group_names  # None for admins, who see all groups
+        if not auth.is_admin and not group_names:
+            return []
 
-        agents = await AgentModel.load_agents(start_time, end_time, group_names)
-        logger.info(f"agents: {agents}")
-
-        summary = AgentController.calculate_agent_summary(agents)
-        return summary
+        counts = await AgentModel.load_agent_summary_counts(start_time, end_time, group_names)
+        return AgentController.build_agent_summary(counts)
 
     @staticmethod
-    def calculate_agent_summary(agents: List[Dict]) -> List[AgentSummary]:
-        total_agents = len(agents)
-        active_agents = 0
-        windows_agents = 0
-        active_windows_agents = 0
-        linux_agents = 0
-        active_linux_agents = 0
-        macos_agents = 0
-        active_macos_agents = 0
-
-        for idx, agent in enumerate(agents, 1):
-            
-            is_active = agent.get('agent_status', '').lower() == 'active'
-            os_type = AgentController.determine_os(agent.get('os', ''))
-
-            if is_active:
-                active_agents += 1
-
-            if os_type == 'windows':
-                windows_agents += 1
-                if is_active:
-                    active_windows_agents += 1
-            elif os_type == 'linux':
-                linux_agents += 1
-                if is_active:
-                    active_linux_agents += 1
-            elif os_type == 'macos':
-                macos_agents += 1
-                if is_active:
-                    active_macos_agents += 1
-
+    def build_agent_summary(counts: Dict[str, int]) -> List[AgentSummary]:
         return [
-            AgentSummary(id=1, agent_name="Active agents", data=active_agents),
-            AgentSummary(id=2, agent_name="Total agents", data=total_agents),
-            AgentSummary(id=3, agent_name="Active Windows agents", data=active_windows_agents),
-            AgentSummary(id=4, agent_name="Windows agents", data=windows_agents),
-            AgentSummary(id=5, agent_name="Active Linux agents", data=active_linux_agents),
-            AgentSummary(id=6, agent_name="Linux agents", data=linux_agents),
-            AgentSummary(id=7, agent_name="Active MacOS agents", data=active_macos_agents),
-            AgentSummary(id=8, agent_name="MacOS agents", data=macos_agents),
+            AgentSummary(id=1, agent_name="Active agents", data=counts.get("active", 0)),
+            AgentSummary(id=2, agent_name="Total agents", data=counts.get("total", 0)),
+            AgentSummary(id=3, agent_name="Active Windows agents", data=counts.get("active_windows", 0)),
+            AgentSummary(id=4, agent_name="Windows agents", data=counts.get("windows", 0)),
+            AgentSummary(id=5, agent_name="Active Linux agents", data=counts.get("active_linux", 0)),
+            AgentSummary(id=6, agent_name="Linux agents", data=counts.get("linux", 0)),
+            AgentSummary(id=7, agent_name="Active MacOS agents", data=counts.get("active_macos", 0)),
+            AgentSummary(id=8, agent_name="MacOS agents", data=counts.get("macos", 0)),
         ]
     
     @staticmethod
     @handle_exceptions
-    async def get_agent_details(user: UserModel) -> List[AgentDetailResponse]:
-        if user.user_role == 'admin':
-            group_names = None  # Admin can see all groups
-        else:
-            group_names = UserModel.get_user_groups(user.id)
-            logger.info(f"group_names: {group_names}")
-            if not group_names:
-                return []
+    async def get_agent_details(auth: AuthContext) -> List[Dict]:
+        group_names = auth.group_names  # None for admins, who see all groups
+        if not auth.is_admin and not group_names:
+            return []
 
-        agent_data = AgentModel.get_latest_agent_details(group_names)
+        agent_data = await AgentModel.get_latest_agent_details(group_names)
         # 使用字典來存儲每個 agent_name 的最新記錄
         latest_agents = {}
         now = datetime.now(timezone.utc)
@@ -200,16 +153,16 @@ class AgentController:
                     'last_keep_alive': last_keep_alive,
                     'registration_time': registration_time
                 }
-        # 將字典轉換為 AgentDetailResponse 列表
+        # 將字典轉換為 AgentDetailResponse 格式的列表
         agent_details = [
-            AgentDetailResponse(
-                agent_name=agent_name,
-                ip=data['ip'],
-                os=data['os'],
-                agent_status=data['agent_status'],
-                last_keep_alive=data['last_keep_alive'],
-                registration_time=data['registration_time']
-            ) for agent_name, data in latest_agents.items()
+            {
+                "agent_name": agent_name,
+                "ip": data['ip'],
+                "os": data['os'],
+                "agent_status": data['agent_status'],
+                "last_keep_alive": data['last_keep_alive'],
+                "registration_time": data['registration_time']
+            } for agent_name, data in latest_agents.items()
         ]
 
         return agent_details
@@ -218,20 +171,24 @@ class AgentController:
 
     @staticmethod
     @handle_exceptions
-    async def get_messages(user: UserModel, start_time: datetime, end_time: datetime, limit: int = 100) -> AgentMessagesResponse:
+    async def get_messages(auth: AuthContext, start_time: datetime, end_time: datetime, limit: int = 100,
+                           page_size: Optional[int] = None, cursor: Optional[str] = None) -> AgentMessagesResponse:
         """
         Retrieve high-level messages (rule_level > 8) for all agents the user has access to within the specified time range.
+        With `page_size` or `cursor` the messages are paged through a point-in-time and `next_cursor` is returned.
         """
         
         # Check user permissions
-        if user.user_role != 'admin':
-            group_names = UserModel.get_user_groups(user.id)
-            if not group_names:
-                return AgentMessagesResponse(total=0, datas=[])
-        else:
-            group_names = None  # Admin can see all groups
+        group_names = auth.group_names  # None for admins, who see all groups
+        if not auth.is_admin and not group_names:
+            return AgentMessagesResponse(total=0, datas=[])
 
-        messages, total_count = await EventModel.load_messages(start_time, end_time, group_names, limit)
+        next_cursor = None
+        if page_size or cursor:
+            page = await EventModel.load_messages_page(start_time, end_time, group_names, page_size or limit, cursor)
+            messages, total_count, next_cursor = page.hits, page.total or 0, page.next_cursor
+        else:
+            messages, total_count = await EventModel.load_messages(start_time, end_time, group_names, limit)
         
         # Convert to AgentMessage schema
         agent_messages = []
@@ -251,105 +208,147 @@ class AgentController:
                 logger.error(f"Error processing message: {e}")
                 continue
         logger.info(f"Processed {len(agent_messages)} out of {len(messages)} messages")
-        return AgentMessagesResponse(total=total_count, datas=agent_messages)
+        return AgentMessagesResponse(total=total_count, datas=agent_messages, next_cursor=next_cursor)
     
     @staticmethod
-    async def get_line_chart_data(current_user: UserModel, start_time: datetime, end_time: datetime) -> LineChartResponse:
+    @handle_exceptions
+    async def export_events(auth: AuthContext, start_time: datetime, end_time: datetime, export_format: str = "ndjson") -> AsyncIterator[str]:
+        """
+        Export every event the user has access to within the time range as NDJSON or CSV.
+        The first page is fetched here so query errors still turn into an error response; the
+        remaining pages are only read as fast as the client consumes the returned stream.
+        """
+        group_names = auth.require_groups()
+
+        pages = EventModel.iter_event_pages(start_time, end_time, group_names)
+        first_page = await anext(pages, [])
+        return AgentController.render_export(first_page, pages, export_format)
+
+    @staticmethod
+    @handle_exceptions
+    async def stream_alerts(auth: AuthContext, groups: Optional[List[str]] = None, min_level: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Subscribe the user to newly ingested high-level events of the requested groups, limited to
+        the groups the user has access to, and return the server-sent event stream.
+        """
+        allowed = auth.require_groups()
+        if groups and not all(auth.can_read(group) for group in groups):
+            raise PermissionError("Permission denied")
+        group_names = groups or allowed  # None for admins without a selection: every group
+
+        subscription = alert_feed.subscribe(group_names, min_level)
+        if subscription is None:
+            raise ServiceUnavailableError("Too many alert stream subscribers")
+        return alert_feed.stream(subscription)
+
+    @staticmethod
+    async def render_export(first_page: List[Dict], pages: AsyncIterator[List[Dict]], export_format: str) -> AsyncIterator[str]:
+        """Format the export one page per chunk, so only a single page is held in memory."""
+        try:
+            if export_format == "csv":
+                yield ",".join(EventModel.EXPORT_FIELDS) + "\r\n"
+            yield AgentController.format_export_page(first_page, export_format)
+            async for events in pages:
+                yield AgentController.format_export_page(events, export_format)
+        except Exception as e:
+            # Headers are already sent; abort the response so the client sees a truncated download
+            logger.error(f"Event export aborted: {e}")
+            raise
+        finally:
+            await pages.aclose()
+
+    @staticmethod
+    def format_export_page(events: List[Dict], export_format: str) -> str:
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=EventModel.EXPORT_FIELDS, extrasaction='ignore')
+            writer.writerows(events)
+            return buffer.getvalue()
+        return "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+
+    @staticmethod
+    async def get_line_chart_data(auth: AuthContext, start_time: datetime, end_time: datetime) -> LineChartResponse:
         start_time = start_time.replace(tzinfo=tzutc())
         end_time = end_time.replace(tzinfo=tzutc())
-        
-        events = await EventModel.get_events_in_timerange(current_user, start_time, end_time)
-        
-        rule_counts = defaultdict(lambda: defaultdict(int))
-        time_range = end_time - start_time
-        interval = time_range / 4
-        
-        for event in events:
-            event_data = event['_source']
-            rule_description = event_data.get('rule_description', 'Unknown')
-            event_time = parse(event_data['timestamp']).replace(tzinfo=tzutc())
-            
-            interval_index = min(4, int((event_time - start_time) / interval))
-            interval_start = start_time + interval * interval_index
-            
-            rule_counts[rule_description][interval_start] += 1
-        
-        top_rules = sorted(rule_counts.items(), key=lambda x: sum(x[1].values()), reverse=True)[:10]
-        
+
+        group_names = auth.group_names  # None for admins, who see all groups
+        if not auth.is_admin and not group_names:
+            return LineChartResponse(label=[], datas=[])
+
+        interval = (end_time - start_time) / 4
+        interval_starts = [start_time + interval * i for i in range(5)]
+        rule_buckets = await EventModel.get_line_chart_aggregations(start_time, end_time, interval_starts, group_names)
+
         line_datas = []
-        for rule, counts in top_rules:
+        for rule_bucket in rule_buckets:
+            name = str(rule_bucket['key'])
+            if not name or name.lower() == 'unknown':
+                continue
+            intervals = rule_bucket['intervals']['buckets']
             data_points = [
-                (start_time + interval * i, counts.get(start_time + interval * i, 0))
-                for i in range(5)
+                (interval_start, intervals.get(str(i), {}).get('doc_count', 0))
+                for i, interval_start in enumerate(interval_starts)
             ]
-            line_data = LineData(name=rule, data=data_points)
-            line_datas.append(line_data)
+            line_datas.append(LineData(name=name, data=data_points))
         
         return LineChartResponse(label=[data.name for data in line_datas], datas=line_datas)
     
     @staticmethod
-    async def get_total_event_count(current_user: UserModel, start_time: datetime, end_time: datetime) -> str:
-        count = await EventModel.get_high_level_event_count(current_user, start_time, end_time)
+    async def get_total_event_count(auth: AuthContext, start_time: datetime, end_time: datetime) -> str:
+        count = await EventModel.get_high_level_event_count(auth, start_time, end_time)
         return f"{count:,}" 
     
     @staticmethod
-    async def get_pie_chart_data(current_user: UserModel, start_time: datetime, end_time: datetime) -> PieChartData:
-        events = await EventModel.get_events_for_pie_chart(current_user, start_time, end_time)
-        
-        agents_counter = Counter()
-        mitre_counter = Counter()
-        events_counter = Counter()
-        agent_event_counter = Counter()
-
-        for event in events:
-            event_data = event['_source']
-            agent_id = event_data.get('agent_id', '')
-            rule_description = event_data.get('rule_description', '')
-            mitre_technique = event_data.get('rule_mitre_technique', '')
-
-            if agent_id:
-                agents_counter[agent_id] += 1
-            if mitre_technique:
-                mitre_counter[mitre_technique] += 1
-            if rule_description:
-                events_counter[rule_description] += 1
-        # Identify the top 5 events based on rule_description count
-        top_5_events = events_counter.most_common(5)
+    async def get_pie_chart_data(auth: AuthContext, start_time: datetime, end_time: datetime) -> PieChartData:
+        group_names = auth.group_names  # None for admins, who see all groups
+        if not auth.is_admin and not group_names:
+            return PieChartData(top_agents=[], top_mitre=[], top_events=[], top_event_counts=[])
 
-        # Find the agent IDs associated with these top 5 events
-        for event in events:
-            event_data = event['_source']
-            agent_id = event_data.get('agent_id', '')
-            rule_description = event_data.get('rule_description', '')
+        buckets = await EventModel.get_pie_chart_aggregations(start_time, end_time, group_names)
 
-            if rule_description in dict(top_5_events) and agent_id:
-                agent_event_counter[agent_id] += 1
-
-        def get_top_5(counter):
+        def get_top_5(terms_buckets):
             items = []
-            for name, count in counter.most_common():
+            for bucket in terms_buckets:
+                name = str(bucket['key'])
                 if name and name.lower() != 'unknown' and len(items) < 5:
-                    items.append(PieChartItem(value=count, name=name))
+                    items.append(PieChartItem(value=bucket['doc_count'], name=name))
             return items
 
         return PieChartData(
-            top_agents=get_top_5(agents_counter),
-            top_mitre=get_top_5(mitre_counter),
-            top_events=get_top_5(events_counter),
-            top_event_counts=get_top_5(agent_event_counter)
+            top_agents=get_top_5(buckets["top_agents"]),
+            top_mitre=get_top_5(buckets["top_mitre"]),
+            top_events=get_top_5(buckets["top_events"]),
+            top_event_counts=get_top_5(buckets["top_event_counts"])
         )
         
     @staticmethod
     @handle_exceptions
-    async def save_events(events: List[WazuhEvent]) -> int:
+    async def save_events(events: List[WazuhEvent]) -> Dict[str, int]:
         """
-        Save multiple events to Elasticsearch and return the count of successfully saved events.
+        Save multiple events to Elasticsearch in bulk and return the count of successfully saved events per agent_id.
         """
-        saved_count = 0
-        for event in events:
-            event_model = EventModel(event)
-            result = EventModel.save_to_elasticsearch(event_model)
-            if result:  # Assuming save_to_elasticsearch returns True on success
-                saved_count += 1
-        return saved_count
-        
+        saved_counts: Dict[str, int] = defaultdict(int)
+        if not events:
+            return saved_counts
+        event_models = [EventModel(event) for event in events]
+        result = await EventModel.bulk_save_to_elasticsearch(event_models)
+        for event_model, ok in zip(event_models, result.items):
+            if ok:
+                saved_counts[event_model.agent_id] += 1
+        if result.failed:
+            logger.warning(f"{result.failed} of {len(event_models)} events failed to save")
+        return saved_counts
+
+    @staticmethod
+    async def enqueue_agent_info(agent_info: AgentInfoRequest, owner: Optional[str] = None) -> IngestBatch:
+        """
+        Queue agent information and events on the write-behind queue instead of indexing them inline.
+        """
+        index_name = await get_index_name()
+        agent_ids = {agent.agent_id for agent in agent_info.agent}
+        actions = [AgentModel(agent).to_bulk_action(index_name) for agent in agent_info.agent]
+        actions.extend(
+            EventModel(event).to_bulk_action(index_name)
+            for event in agent_info.events if event.agent_id in agent_ids
+        )
+        return ingest_queue.submit(actions, owner)
@@ -62,6 +62,17 @@ class InternalServerError(HTTPError):
     """500 Internal Server Error"""
     def __init__(self, message: str = "Internal Server Error"):
         super().__init__(message, 500)
+
+class TooManyRequestsError(HTTPError):
+    """429 Too Many Requests"""
+    def __init__(self, message: str = "Too Many Requests", retry_after: float = 1):
+        super().__init__(message, 429)
+        self.retry_after = max(int(retry_after + 0.999), 1)
+
+class ServiceUnavailableError(HTTPError):
+    """503 Service Unavailable"""
+    def __init__(self, message: str = "Service Unavailable"):
+        super().__init__(message, 503)
         
 class CustomElasticsearchError(HTTPError):
     """500 Internal Server Error"""
@@ -134,4 +145,12 @@ class PermissionError(BaseCustomError):
 class UnauthorizedError(BaseCustomError):
     """Raised when a user attempts to access or modify data they're not authorized for"""
     def __init__(self, message: str = "Unauthorized access", status_code: int = 403):
-        super().__init__(message, status_code)
\ No newline at end of file
+        super().__init__(message, status_code)
+
+# Conditional Requests
+
+class NotModified(Exception):
+    """Raised by conditional GET endpoints when the client's cached response is still current"""
+    def __init__(self, etag: str):
+        self.etag = etag
+        super().__init__(etag)
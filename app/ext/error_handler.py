@@ -1,5 +1,5 @@
 from fastapi import Request, FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
 from .error import * 
@@ -15,7 +15,9 @@ ERROR_CLASS_MAP: dict[int, Type[BaseCustomError]] = {
     409: ConflictError,
     415: UnsupportedMediaTypeError,
     422: UnprocessableEntityError,
+    429: TooManyRequestsError,
     500: InternalServerError,
+    503: ServiceUnavailableError,
 }
 
 def get_error_class(status_code: int) -> Type[BaseCustomError]:
@@ -46,8 +48,20 @@ async def validation_exception_handler(request: Request, exc: Union[RequestValid
         content=UnprocessableEntityError("Unprocessable Entity").to_dict()
     )
 
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers={"ETag": exc.etag, "Cache-Control": "private, no-cache"})
+
+async def too_many_requests_handler(request: Request, exc: TooManyRequestsError):
+    return JSONResponse(
+        status_code=429,
+        content=exc.to_dict(),
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 def add_error_handlers(app: FastAPI):
     app.add_exception_handler(HTTPException, http_exception_handler)
+    app.add_exception_handler(NotModified, not_modified_handler)
+    app.add_exception_handler(TooManyRequestsError, too_many_requests_handler)
     app.add_exception_handler(RequestValidationError, validation_exception_handler)
     app.add_exception_handler(ValidationError, validation_exception_handler)
     app.add_exception_handler(Exception, custom_error_handler)
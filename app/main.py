@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
@@ -15,7 +16,17 @@ from app.routes.agent_detail import router as agent_detail_router
 from app.routes.modbus_events import router as modbus_events_router
 from app.routes.dashboard import router as dashboard_router
 from app.routes.rds import router as rds_router
-from app.models.user_db import Base, engine
+from app.routes.ingest import router as ingest_router
+from app.models.user_db import init_db, close_db
+from app.models.ingest_queue import ingest_queue, INGEST_WRITE_BEHIND
+from app.models.index_manager import index_manager
+from app.models.agent_registry import agent_registry
+from app.models.rollup import event_rollups
+from app.models.retention import retention_compactor, RETENTION_ENABLED
+from app.models.alert_feed import alert_feed
+from app.models.data_version import data_versions
+from app.models.es_client import close_es
+from app.tools.hashing import password_hasher
 from app.ext.error_handler import add_error_handlers
 from fastapi.middleware.cors import CORSMiddleware  
 
@@ -42,6 +53,41 @@ def setup_logger(name, log_file, level=logging.INFO):
 app_logger = setup_logger('app_logger', './logs/app.log', level=logging.DEBUG)
 logging.getLogger('app_logger').addHandler(logging.StreamHandler())
 
+# Start the database, Elasticsearch and background components with the app and stop them on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app_logger.info("Initializing database...")
+    try:
+        await init_db()
+        app_logger.info("Database initialized successfully")
+    except Exception as e:
+        app_logger.error(f"Failed to initialize database: {str(e)}")
+    try:
+        await index_manager.start()
+    except Exception as e:
+        app_logger.error(f"Failed to start index manager: {str(e)}")
+    await agent_registry.start()
+    await event_rollups.start()
+    await data_versions.start()
+    if RETENTION_ENABLED:
+        await retention_compactor.start()
+    if INGEST_WRITE_BEHIND:
+        await ingest_queue.start()
+    yield
+    # End the open alert streams so the server does not wait for their clients
+    await alert_feed.close()
+    # Flush documents still waiting in the write-behind queue
+    await ingest_queue.stop()
+    await retention_compactor.stop()
+    # Write the rollup counters still held in memory
+    await event_rollups.stop()
+    await agent_registry.stop()
+    await data_versions.stop()
+    await index_manager.stop()
+    await close_es()
+    await close_db()
+    password_hasher.shutdown()
+
 app = FastAPI(
     title="AIXSOAR ATH API",
     description="API description",
@@ -49,18 +95,9 @@ app = FastAPI(
     openapi_url="/openapi.json",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
-# Initialize database on startup
-@app.on_event("startup")
-async def startup_event():
-    app_logger.info("Initializing database...")
-    try:
-        Base.metadata.create_all(bind=engine)
-        app_logger.info("Database initialized successfully")
-    except Exception as e:
-        app_logger.error(f"Failed to initialize database: {str(e)}")
-
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -79,6 +116,7 @@ app.include_router(agent_detail_router, prefix="/api/agent_detail")
 app.include_router(modbus_events_router, prefix="/api/modbus_events")
 app.include_router(dashboard_router, prefix="/api/dashboard")
 app.include_router(rds_router, prefix="/api/rds")
+app.include_router(ingest_router, prefix="/api/ingest")
 
 # Include error handlers
 add_error_handlers(app)
@@ -1,4 +1,3 @@
-from elasticsearch import AsyncElasticsearch
 from dotenv import load_dotenv, find_dotenv
 import os
 import json
@@ -6,6 +5,13 @@ from logging import getLogger
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 import re
+from app.models.index_manager import index_manager
+from app.models.single_flight import coalesced_search
+from app.models.agent_registry import agent_registry
+from app.models.pagination import SearchPage, search_page
+from app.models.query_builder import filter_query, groups, round_bounds, search_body, search_params, term, time_range
+from app.models.rollup import plan_window, normalize_counts, raw_window_start
+from app.tools.cache import cached_result
 
 # Get the centralized logger
 logger = getLogger('app_logger')
@@ -17,71 +23,38 @@ except Exception as e:
     logger.error(f"Error loading .env file: {str(e)}")
     raise
 
-# Create a single Elasticsearch instance
-es = AsyncElasticsearch(
-    [{'host': os.getenv('ES_HOST'), 'port': int(os.getenv('ES_PORT')), 'scheme': os.getenv('ES_SCHEME'), }],
-    http_auth=(os.getenv('ES_USER'), os.getenv('ES_PASSWORD'))
-)
 max_results = os.getenv('MAX_RESULTS')
-es_agent_index = os.getenv('ES_AGENT_INDEX')
-final_es_agent_index = f"{datetime.now().strftime('%Y_%m')}{es_agent_index}"
 
 class AgentDetailModel:
+    # Fields of the agent_info document returned by load_agent_info
+    AGENT_INFO_FIELDS = ["agent_id", "agent_name", "ip", "os", "os_version", "agent_status", "last_keep_alive", "registration_time"]
+
     @staticmethod
     async def load_agent_info(agent_name: str) -> Dict[str, Any]:
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"agent_name": agent_name}}
-                    ]
-                }
-            },
-            "_source": ["agent_id", "agent_name", "ip", "os", "os_version", "agent_status", "last_keep_alive", "registration_time"],
-            "size": 1,
-            "sort": [
-                {"last_keep_alive": "desc"}
-            ]
-        }
-        
-        try:
-            result = await es.search(index=final_es_agent_index, body=query)
-            hits = result['hits']['hits']
-            if hits:
-                return hits[0]['_source']
-            else:
-                return {}
-        except Exception as e:
-            logger.error(f"Error executing Elasticsearch query for agent info: {str(e)}")
-            raise
+        agent = await agent_registry.get_by_name(agent_name)
+        if agent is None:
+            return {}
+        return {field: agent[field] for field in AgentDetailModel.AGENT_INFO_FIELDS if field in agent}
 
     @staticmethod
+    @cached_result("agent_detail.alerts", 30)
     async def load_alerts(start_time: datetime, end_time: datetime, user_groups: List[str] = None, agent_name: str = None) -> Dict:
         """Get alerts by severity level"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        if user_groups:
-            must_conditions.append({"terms": {"group_name": user_groups}})
-        
-        if agent_name:
-            must_conditions.append({"term": {"agent_name": agent_name}})
-            
-        query = {
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "aggs": {
+        window = plan_window(start_time, end_time)
+        query = search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                window.time_filter(),
+                groups(user_groups),
+                term("agent_name", agent_name)
+            ),
+            aggs=window.counted({
                 "severity_levels": {
                     "terms": {"field": "rule_level"}
                 }
-            }
-        }
-        result = await es.search(index=final_es_agent_index, body=query)
+            })
+        )
+        result = normalize_counts(await coalesced_search(index=await window.indices(), body=query, **search_params(query)))
         severity_map = {
             "12-15": "critical_severity",
             "8-11": "high_severity",
@@ -98,39 +71,37 @@ class AgentDetailModel:
         return counts
     
     @staticmethod
+    @cached_result("agent_detail.tactic_linechart", 30)
     async def load_tactic_linechart(start_time: datetime, end_time: datetime, group_name: List[str]=None, agent_name: str = None) -> List[Dict]:
         """Get tactic timeline data"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
+        window = plan_window(start_time, end_time, "1h")
+        indices = await window.indices()
+        query = filter_query(
+            term("wazuh_data_type", "wazuh_events"),
             {"exists": {"field": "rule_mitre_tactic"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}},
-            {"bool": {"must_not": [
+            window.time_filter(),
+            groups(group_name),
+            term("agent_name", agent_name),
+            must_not=[
                 {"term": {"rule_mitre_tactic": ""}},
                 {"prefix": {"rule_mitre_tactic": "CVE-"}}
-            ]}}
-        ]
-        
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        if agent_name:
-            must_conditions.append({"term": {"agent_name": agent_name}})
+            ]
+        )
             
         # First get all tactics in the time range
-        tactic_query = {
-            "size": 0,
-            "query": {"bool": {"must": must_conditions}},
-            "aggs": {
+        tactic_query = search_body(
+            query,
+            aggs=window.counted({
                 "tactics": {
                     "terms": {
                         "field": "rule_mitre_tactic",
                         "size": 50
                     }
                 }
-            }
-        }
+            })
+        )
         
-        tactic_result = await es.search(index=final_es_agent_index, body=tactic_query)
+        tactic_result = normalize_counts(await coalesced_search(index=indices, body=tactic_query, **search_params(tactic_query)))
         tactics = [bucket['key'] for bucket in tactic_result['aggregations']['tactics']['buckets'] 
                   if bucket['key'].strip()]
         
@@ -138,18 +109,18 @@ class AgentDetailModel:
             return [{"label": [], "datas": []}]
         
         # Then get time series data for each tactic
-        time_query = {
-            "size": 0,
-            "query": {"bool": {"must": must_conditions}},
-            "aggs": {
+        bounds_start, bounds_end = round_bounds(start_time, end_time)
+        time_query = search_body(
+            query,
+            aggs=window.counted({
                 "by_time": {
                     "date_histogram": {
                         "field": "timestamp",
                         "fixed_interval": "1h",
                         "format": "yyyy-MM-dd'T'HH:mm:ss",
                         "extended_bounds": {
-                            "min": start_time.isoformat(),
-                            "max": end_time.isoformat()
+                            "min": bounds_start.isoformat(),
+                            "max": bounds_end.isoformat()
                         }
                     },
                     "aggs": {
@@ -161,10 +132,10 @@ class AgentDetailModel:
                         }
                     }
                 }
-            }
-        }
+            })
+        )
         
-        time_result = await es.search(index=final_es_agent_index, body=time_query)
+        time_result = normalize_counts(await coalesced_search(index=indices, body=time_query, **search_params(time_query)))
         
         # Create time buckets for all hours in range
         all_times = [bucket['key_as_string'] 
@@ -197,28 +168,19 @@ class AgentDetailModel:
         }]
     
     @staticmethod
+    @cached_result("agent_detail.cve_barchart", 30)
     async def load_cve_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None, agent_name: str = None) -> List[Dict]:
         """Get CVE statistics from rule_mitre_tactic"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}},
-            {"prefix": {"rule_mitre_tactic": "CVE-"}}
-        ]
-        
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        if agent_name:
-            must_conditions.append({"term": {"agent_name": agent_name}})
-        
-        query = {
-            "size": 0,
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "aggs": {
+        window = plan_window(start_time, end_time)
+        query = search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                window.time_filter(),
+                {"prefix": {"rule_mitre_tactic": "CVE-"}},
+                groups(group_name),
+                term("agent_name", agent_name)
+            ),
+            aggs=window.counted({
                 "cve_stats": {
                     "terms": {
                         "field": "rule_mitre_tactic",
@@ -226,10 +188,10 @@ class AgentDetailModel:
                         "order": {"_count": "desc"}
                     }
                 }
-            }
-        }
+            })
+        )
         
-        result = await es.search(index=final_es_agent_index, body=query)
+        result = normalize_counts(await coalesced_search(index=await window.indices(), body=query, **search_params(query)))
         
         return [
             {"cve_name": bucket["key"], "count": bucket["doc_count"]}
@@ -237,30 +199,23 @@ class AgentDetailModel:
         ]
 
     @staticmethod
+    @cached_result("agent_detail.malicious_file_barchart", 30)
     async def load_malicious_file_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None, agent_name: str = None) -> List[Dict]:
-        """Get malicious file statistics from rule_id 87105 and 100003"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"terms": {"rule_id": ["87105", "100003"]}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        if agent_name:
-            must_conditions.append({"term": {"agent_name": agent_name}})
-                
-        query = {
-            "size": 10000,
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            }
-        }
+        """Get malicious file statistics from rule_id 87105 and 100003; reads raw hits, so compacted days are left out"""
+        start_time = raw_window_start(start_time)
+        query = search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                {"terms": {"rule_id": ["87105", "100003"]}},
+                time_range(start_time, end_time),
+                groups(group_name),
+                term("agent_name", agent_name)
+            ),
+            size=10000,
+            source=["rule_description"]
+        )
         
-        result = await es.search(index=final_es_agent_index, body=query)
+        result = await coalesced_search(index=await index_manager.indices_for_range("agents", start_time, end_time), body=query, **search_params(query))
         
         def extract_filepath(description: str) -> str:
             """Extract file path from rule description"""
@@ -283,28 +238,19 @@ class AgentDetailModel:
         ]
 
     @staticmethod
+    @cached_result("agent_detail.authentication_piechart", 30)
     async def load_authentication_piechart(start_time: datetime, end_time: datetime, group_name: List[str]=None, agent_name: str = None) -> List[Dict]:
         """Get authentication failure techniques statistics"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"term": {"rule_id": "60204"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        if group_name and len(group_name) > 0:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        if agent_name:
-            must_conditions.append({"term": {"agent_name": agent_name}})
-
-        query = {
-            "size": 0,
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "aggs": {
+        window = plan_window(start_time, end_time)
+        query = search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                term("rule_id", "60204"),
+                window.time_filter(),
+                groups(group_name),
+                term("agent_name", agent_name)
+            ),
+            aggs=window.counted({
                 "by_technique": {
                     "terms": {
                         "field": "rule_mitre_technique",
@@ -312,10 +258,10 @@ class AgentDetailModel:
                         "min_doc_count": 1
                     }
                 }
-            }
-        }
+            })
+        )
 
-        result = await es.search(index=final_es_agent_index, body=query)
+        result = normalize_counts(await coalesced_search(index=await window.indices(), body=query, **search_params(query)))
         return [
             {
                 "tactic": bucket['key'],
@@ -326,30 +272,36 @@ class AgentDetailModel:
         ]
     
     @staticmethod
-    async def load_event_table(start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None, agent_name: Optional[str] = None) -> List[Dict]:
-        """Get event table data"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        if agent_name:
-            must_conditions.append({"term": {"agent_name": agent_name}})
-            
-        query = {
-            "size": 1000,
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "sort": [
+    def build_event_table_query(start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None, agent_name: Optional[str] = None) -> Dict:
+        """Raw events of every level, so the window starts after the compacted days"""
+        start_time = raw_window_start(start_time)
+        return search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                time_range(start_time, end_time),
+                groups(group_name),
+                term("agent_name", agent_name)
+            ),
+            size=1000,
+            sort=[
                 {"timestamp": {"order": "desc"}}
             ]
-        }
-        
-        result = await es.search(index=final_es_agent_index, body=query)
+        )
+
+    @staticmethod
+    @cached_result("agent_detail.event_table", 10)
+    async def load_event_table(start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None, agent_name: Optional[str] = None) -> List[Dict]:
+        """Get event table data"""
+        query = AgentDetailModel.build_event_table_query(start_time, end_time, group_name, agent_name)
+        result = await coalesced_search(index=await index_manager.indices_for_range("agents", start_time, end_time), body=query, **search_params(query))
         return [hit['_source'] for hit in result['hits']['hits']]
+
+    @staticmethod
+    async def load_event_table_page(start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None, agent_name: Optional[str] = None,
+                                    page_size: int = 100, cursor: Optional[str] = None) -> SearchPage:
+        """Get one page of event table data; pass the returned cursor to get the next page"""
+        query = AgentDetailModel.build_event_table_query(start_time, end_time, group_name, agent_name)
+        indices = await index_manager.indices_for_range("agents", start_time, end_time)
+        page = await search_page(indices, query["query"], query["sort"], page_size, cursor)
+        page.hits = [hit['_source'] for hit in page.hits]
+        return page
@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from elasticsearch import AsyncElasticsearch, NotFoundError
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.models.es_client import es
+from app.models.index_manager import index_manager
+from app.ext.error import ElasticsearchError
+import asyncio
+import os
+import time
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+def _recency(agent: Dict) -> tuple:
+    return (agent.get("last_keep_alive") or "", agent.get("timestamp") or "")
+
+class AgentRegistry:
+    """
+    In-memory map of agent_id to the latest agent_info document, warmed from Elasticsearch at startup
+    and updated by the agent ingest path, so agent lookups are dictionary reads.
+
+    Workers share a version counter document: writers bump it, batched into one increment every
+    `flush_interval` seconds, and readers compare it at most every `check_interval` seconds and then
+    re-read the agent_info documents reported since their last load. Every `max_staleness` seconds
+    the whole lookback window is re-read instead, which picks up documents that were queued for
+    indexing when the counter was bumped or whose report time lags behind.
+    """
+    VERSION_ID = "agents"
+
+    def __init__(self, es: AsyncElasticsearch, lookback: timedelta, version_index: str, check_interval: int = 5,
+                 max_staleness: int = 60, reload_overlap: timedelta = timedelta(minutes=2), flush_interval: int = 1):
+        self.es = es
+        self.lookback = lookback
+        self.version_index = version_index
+        self.check_interval = check_interval
+        self.max_staleness = max_staleness
+        self.reload_overlap = reload_overlap
+        self.flush_interval = flush_interval
+        self._agents: Dict[str, Dict] = {}
+        self._by_name: Dict[str, str] = {}
+        self._version: Optional[int] = None
+        self._loaded_at: Optional[datetime] = None
+        self._fully_loaded_at: Optional[datetime] = None
+        self._pending = 0
+        self._task: Optional[asyncio.Task] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Warm the registry and start flushing version bumps; failed warm-ups are retried on the first lookup."""
+        try:
+            await self._sync(force=True)
+            logger.info(f"Agent registry loaded {len(self._agents)} agents")
+        except Exception as e:
+            logger.error(f"Failed to warm agent registry: {str(e)}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def agents(self, group_names: Optional[List[str]] = None) -> List[Dict]:
+        """Latest state of every known agent, optionally limited to `group_names`."""
+        await self._sync()
+        groups = set(group_names) if group_names is not None else None
+        return [dict(agent) for agent in self._agents.values() if groups is None or agent.get("group_name") in groups]
+
+    async def get_by_name(self, agent_name: str) -> Optional[Dict]:
+        await self._sync()
+        agent = self._agents.get(self._by_name.get(agent_name))
+        if agent is None or agent.get("agent_name") != agent_name:
+            return None
+        return dict(agent)
+
+    def record(self, documents: List[Dict]) -> None:
+        """Apply freshly ingested agent_info documents; the shared version is bumped by the next flush."""
+        for document in documents:
+            self._apply(document)
+        if documents:
+            self._pending += 1
+
+    async def flush(self) -> None:
+        """Write the pending bumps to the shared version as one increment."""
+        if not self._pending:
+            return
+        bumps, self._pending = self._pending, 0
+        try:
+            response = await self.es.update(
+                index=self.version_index,
+                id=self.VERSION_ID,
+                script={"source": "ctx._source.version += params.bumps", "lang": "painless", "params": {"bumps": bumps}},
+                upsert={"version": bumps},
+                retry_on_conflict=5,
+                source=True
+            )
+            version = response["get"]["_source"]["version"]
+            # Nobody else wrote since our last sync, so there is nothing to reload
+            if self._version is not None and version == self._version + bumps:
+                self._version = version
+        except Exception as e:
+            self._pending += bumps
+            logger.warning(f"Could not bump agent registry version: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def invalidate(self) -> None:
+        """Force a version check on the next lookup."""
+        self._checked_at = 0.0
+
+    def _apply(self, agent: Dict) -> None:
+        agent_id = agent.get("agent_id")
+        if agent_id is None:
+            return
+        current = self._agents.get(agent_id)
+        if current is not None and _recency(agent) < _recency(current):
+            return
+        self._agents[agent_id] = agent
+        name = agent.get("agent_name")
+        holder = self._agents.get(self._by_name.get(name))
+        if holder is None or holder is agent or holder.get("agent_name") != name or _recency(agent) >= _recency(holder):
+            self._by_name[name] = agent_id
+
+    async def _sync(self, force: bool = False) -> None:
+        if not force and self._loaded_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if not force and self._loaded_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            try:
+                # Read the version first so a write racing the load triggers another one
+                version = await self._read_version()
+                if self._fully_loaded_at is None or (datetime.utcnow() - self._fully_loaded_at).total_seconds() >= self.max_staleness:
+                    # Report times are set by the agents, so only a full reload is sure to see every document
+                    await self._load(None)
+                elif version != self._version:
+                    await self._load(self._loaded_at - self.reload_overlap)
+                self._version = version
+            except Exception as e:
+                if self._loaded_at is None:
+                    logger.error(f"Error loading agent registry: {str(e)}")
+                    raise ElasticsearchError(f"Error loading agents: {str(e)}", 500)
+                logger.warning(f"Could not refresh agent registry, serving cached agents: {str(e)}")
+            self._checked_at = time.monotonic()
+
+    async def _read_version(self) -> int:
+        try:
+            response = await self.es.get(index=self.version_index, id=self.VERSION_ID)
+            return response["_source"]["version"]
+        except NotFoundError:
+            return 0
+
+    async def _load(self, since: Optional[datetime]) -> None:
+        """Read the latest agent_info document per agent written after `since` (default: the lookback window)."""
+        started = datetime.utcnow()
+        full = since is None
+        since = since or started - self.lookback
+        query = {
+            "size": 10000,
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"term": {"wazuh_data_type": "agent_info"}},
+                        {"range": {"timestamp": {"gte": since.isoformat()}}}
+                    ]
+                }
+            },
+            "sort": [{"last_keep_alive": {"order": "desc"}}],
+            "collapse": {"field": "agent_id"}
+        }
+        indices = await index_manager.indices_for_range("agents", since, started)
+        result = await self.es.search(index=indices, body=query, ignore_unavailable=True)
+        for hit in result['hits']['hits']:
+            self._apply(hit['_source'])
+        self._loaded_at = started
+        if full:
+            self._fully_loaded_at = started
+
+# Shared registry used by the agent lookups
+agent_registry = AgentRegistry(
+    es,
+    lookback=timedelta(days=int(os.getenv('AGENT_INFO_LOOKBACK_DAYS', 31))),
+    version_index=os.getenv('AGENT_REGISTRY_VERSION_INDEX', 'agent_registry_version'),
+    check_interval=int(os.getenv('AGENT_REGISTRY_CHECK_INTERVAL', 5)),
+    max_staleness=int(os.getenv('AGENT_REGISTRY_MAX_STALENESS', 60)),
+    flush_interval=int(os.getenv('AGENT_REGISTRY_FLUSH_INTERVAL', 1))
+)
@@ -0,0 +1,126 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+import asyncio
+import json
+import os
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+ALERT_FIELDS = ("timestamp", "agent_id", "agent_name", "rule_description", "rule_level", "rule_id",
+                "rule_mitre_id", "rule_mitre_tactic", "rule_mitre_technique", "group_name")
+
+class AlertSubscription:
+    """
+    One connected client. Alerts wait in a bounded buffer; when the client falls behind the
+    oldest alerts are dropped and the number dropped is reported with the next delivery.
+    """
+    def __init__(self, group_names: Optional[Set[str]], min_level: int, buffer_size: int):
+        self.group_names = group_names
+        self.min_level = min_level
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self.closed = False
+
+    def wants(self, alert: Dict) -> bool:
+        if (alert.get("rule_level") or 0) < self.min_level:
+            return False
+        return self.group_names is None or alert.get("group_name") in self.group_names
+
+    def offer(self, alert: Dict) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(alert)
+
+class AlertFeed:
+    """
+    Fans newly indexed high-level events out to the subscribed clients of this worker process.
+    Alerts are published by the ingest paths after indexing, so each worker pushes the events it
+    ingested itself; clients that need every alert across several workers still page /messages.
+    """
+    def __init__(self, min_level: int = 8, buffer_size: int = 256, max_subscribers: int = 1000, heartbeat: int = 15):
+        self.min_level = min_level
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self._subscriptions: Set[AlertSubscription] = set()
+        self._sequence = 0
+        self.published = 0
+
+    def subscribe(self, group_names: Optional[List[str]] = None, min_level: Optional[int] = None) -> Optional[AlertSubscription]:
+        """Register a client; returns None when the subscriber limit is reached."""
+        if len(self._subscriptions) >= self.max_subscribers:
+            return None
+        subscription = AlertSubscription(
+            set(group_names) if group_names is not None else None,
+            max(min_level or self.min_level, self.min_level),
+            self.buffer_size
+        )
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: AlertSubscription) -> None:
+        subscription.closed = True
+        self._subscriptions.discard(subscription)
+
+    def publish(self, documents: Iterable[Dict]) -> None:
+        """Called by the ingest paths with the documents that were indexed successfully."""
+        if not self._subscriptions:
+            return
+        for document in documents:
+            if document.get("wazuh_data_type") != "wazuh_events" or (document.get("rule_level") or 0) < self.min_level:
+                continue
+            self._sequence += 1
+            alert = {field: document.get(field) for field in ALERT_FIELDS}
+            alert["id"] = self._sequence
+            for subscription in self._subscriptions:
+                if subscription.wants(alert):
+                    subscription.offer(alert)
+            self.published += 1
+
+    async def close(self) -> None:
+        """End every open stream, so shutdown does not wait for clients to disconnect."""
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+            if subscription.queue.full():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(None)
+
+    async def stream(self, subscription: AlertSubscription) -> AsyncIterator[str]:
+        """Server-sent events of one subscription, with a comment line as heartbeat while idle."""
+        try:
+            yield f"retry: {self.heartbeat * 1000}\n\n"
+            while not subscription.closed:
+                try:
+                    alert = await asyncio.wait_for(subscription.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if alert is None:
+                    break
+                if subscription.dropped:
+                    yield f"event: dropped\ndata: {json.dumps({'dropped': subscription.dropped})}\n\n"
+                    subscription.dropped = 0
+                yield f"id: {alert['id']}\nevent: alert\ndata: {json.dumps(alert, ensure_ascii=False)}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict:
+        return {"subscribers": len(self._subscriptions), "published": self.published}
+
+# Shared feed fed by the event ingest paths
+alert_feed = AlertFeed(
+    min_level=int(os.getenv('ALERT_FEED_MIN_LEVEL', 8)),
+    buffer_size=int(os.getenv('ALERT_FEED_BUFFER_SIZE', 256)),
+    max_subscribers=int(os.getenv('ALERT_FEED_MAX_SUBSCRIBERS', 1000)),
+    heartbeat=int(os.getenv('ALERT_FEED_HEARTBEAT', 15))
+)
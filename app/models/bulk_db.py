@@ -0,0 +1,109 @@
+from typing import Dict, List, Optional
+from collections import Counter
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_streaming_bulk
+from logging import getLogger
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+class BulkResult:
+    """
+    Per-item outcome of a bulk request. `items` follows the order of the submitted documents,
+    so callers can map successes and failures back to their own records.
+    """
+    def __init__(self):
+        self.items: List[bool] = []
+        self.errors: List[Dict] = []
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for ok in self.items if ok)
+
+    @property
+    def failed(self) -> int:
+        return len(self.items) - self.succeeded
+
+    def errors_by_position(self) -> List[Optional[Dict]]:
+        """Align errors with `items`: None for documents that were indexed."""
+        errors = iter(self.errors)
+        return [None if ok else next(errors) for ok in self.items]
+
+class BulkIngestEngine:
+    """
+    Index documents through the Elasticsearch `_bulk` API in bounded chunks.
+    Large batches temporarily disable index refresh so the shards are not refreshed mid-batch.
+    """
+    def __init__(self, es: AsyncElasticsearch, chunk_size: int = 500, max_chunk_bytes: int = 10 * 1024 * 1024,
+                 refresh_threshold: int = 1000, max_retries: int = 2):
+        self.es = es
+        self.chunk_size = chunk_size
+        self.max_chunk_bytes = max_chunk_bytes
+        self.refresh_threshold = refresh_threshold
+        self.max_retries = max_retries
+        self._deferred: Dict[str, int] = {}
+
+    async def index(self, index_name: str, documents: List[Dict], ids: Optional[List[str]] = None) -> BulkResult:
+        """Index `documents` into `index_name`, optionally with explicit document ids."""
+        actions = []
+        for position, document in enumerate(documents):
+            action = {"_op_type": "index", "_index": index_name, "_source": document}
+            if ids and ids[position]:
+                action["_id"] = ids[position]
+            actions.append(action)
+        return await self.bulk(actions)
+
+    async def bulk(self, actions: List[Dict]) -> BulkResult:
+        """Execute prebuilt bulk actions, which may target several indices."""
+        result = BulkResult()
+        if not actions:
+            return result
+
+        index_counts = Counter(action["_index"] for action in actions)
+        deferred = [index_name for index_name, count in index_counts.items() if count >= self.refresh_threshold]
+        for index_name in deferred:
+            await self._defer_refresh(index_name)
+        try:
+            async for ok, item in async_streaming_bulk(
+                self.es,
+                actions,
+                chunk_size=self.chunk_size,
+                max_chunk_bytes=self.max_chunk_bytes,
+                max_retries=self.max_retries,
+                raise_on_error=False,
+                raise_on_exception=False,
+            ):
+                result.items.append(ok)
+                if not ok:
+                    result.errors.append(item)
+        finally:
+            for index_name in deferred:
+                await self._restore_refresh(index_name)
+
+        target = ", ".join(index_counts)
+        if result.errors:
+            logger.error(f"Bulk indexing into {target}: {result.failed} of {len(actions)} documents failed. First error: {result.errors[0]}")
+        else:
+            logger.info(f"Bulk indexed {len(actions)} documents into {target}")
+        return result
+
+    async def _defer_refresh(self, index_name: str) -> None:
+        # Reference counts are updated before any await, so concurrent batches on the loop agree
+        self._deferred[index_name] = self._deferred.get(index_name, 0) + 1
+        if self._deferred[index_name] > 1:
+            return
+        try:
+            await self.es.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "-1"}})
+        except Exception as e:
+            logger.warning(f"Could not defer refresh on {index_name}: {str(e)}")
+
+    async def _restore_refresh(self, index_name: str) -> None:
+        self._deferred[index_name] -= 1
+        if self._deferred[index_name] > 0:
+            return
+        del self._deferred[index_name]
+        try:
+            # Resetting to null restores the index default refresh interval
+            await self.es.indices.put_settings(index=index_name, body={"index": {"refresh_interval": None}})
+        except Exception as e:
+            logger.warning(f"Could not restore refresh on {index_name}: {str(e)}")
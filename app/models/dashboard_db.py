@@ -1,4 +1,3 @@
-from elasticsearch import AsyncElasticsearch
 from dotenv import load_dotenv, find_dotenv
 import os
 import json
@@ -6,6 +5,13 @@ from logging import getLogger
 from datetime import datetime
 from typing import Dict, List, Optional
 import re
+from app.models.index_manager import index_manager
+from app.models.single_flight import coalesced_search, coalesced_msearch
+from app.models.pagination import SearchPage, search_page
+from app.models.rollup import plan_window, normalize_counts, raw_window_start
+from app.models.query_builder import filter_query, groups, search_body, search_params, term, time_range
+from app.tools.cache import cached_result
+from app.ext.error import ElasticsearchError
 
 # Get the centralized logger
 logger = getLogger('app_logger')
@@ -17,99 +23,132 @@ except Exception as e:
     logger.error(f"Error loading .env file: {str(e)}")
     raise
 
-# Create a single Elasticsearch instance
-es = AsyncElasticsearch(
-    [{'host': os.getenv('ES_HOST'), 'port': int(os.getenv('ES_PORT')), 'scheme': os.getenv('ES_SCHEME'), }],
-    http_auth=(os.getenv('ES_USER'), os.getenv('ES_PASSWORD'))
-)
 max_results = os.getenv('MAX_RESULTS')
-es_agent_index = os.getenv('ES_AGENT_INDEX')
-final_es_agent_index = f"{datetime.now().strftime('%Y_%m')}{es_agent_index}"
 
 class DashboardModel:
+    """
+    Dashboard widgets. Each widget has a `build_*_query` returning its search body and a `parse_*`
+    turning the search response into widget data, so a widget can be searched on its own (`load_*`)
+    or together with all the others in one `_msearch` (`load_snapshot`).
+    """
+    WIDGETS = (
+        "agent_summary",
+        "agent_os",
+        "alerts",
+        "cve_barchart",
+        "tactic_linechart",
+        "malicious_file_barchart",
+        "authentication_piechart",
+        "agent_events",
+        "event_table",
+    )
+
+    # Widgets that only count events can be answered from rollups, up to the given interval
+    ROLLUP_WIDGETS = {
+        "alerts": "1d",
+        "cve_barchart": "1d",
+        "tactic_linechart": "1h",
+        "authentication_piechart": "1d",
+        "agent_events": "1d",
+    }
+
     @staticmethod
-    async def load_agent_summary(start_time: datetime, end_time: datetime, group_name: List[str] = None) -> Dict:
-        """Get connected and disconnected agents count"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "agent_info"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        # 只有在提供 group_name 時才添加群組過濾
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        query = {
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "aggs": {
+    def _window(widget: str, start_time: datetime, end_time: datetime):
+        return plan_window(start_time, end_time, DashboardModel.ROLLUP_WIDGETS.get(widget))
+
+    @staticmethod
+    async def _search(widget: str, start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None):
+        query = getattr(DashboardModel, f"build_{widget}_query")(start_time, end_time, group_name)
+        indices = await DashboardModel._window(widget, start_time, end_time).indices()
+        result = await coalesced_search(index=indices, body=query, **search_params(query))
+        return getattr(DashboardModel, f"parse_{widget}")(normalize_counts(result))
+
+    @staticmethod
+    @cached_result("dashboard.snapshot", 10)
+    async def load_snapshot(start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None) -> Dict:
+        """Run every widget query in a single `_msearch` and return the parsed data keyed by widget name"""
+        searches = []
+        for widget in DashboardModel.WIDGETS:
+            indices = await DashboardModel._window(widget, start_time, end_time).indices()
+            query = getattr(DashboardModel, f"build_{widget}_query")(start_time, end_time, group_name)
+            searches.append({"index": ",".join(indices), **search_params(query)})
+            searches.append(query)
+
+        result = await coalesced_msearch(searches=searches)
+        snapshot = {}
+        for widget, response in zip(DashboardModel.WIDGETS, result['responses']):
+            if 'error' in response:
+                logger.error(f"Dashboard snapshot query {widget} failed: {response['error']}")
+                raise ElasticsearchError(f"Error loading {widget}: {response['error']}")
+            snapshot[widget] = getattr(DashboardModel, f"parse_{widget}")(normalize_counts(response))
+        return snapshot
+
+    @staticmethod
+    def build_agent_summary_query(start_time: datetime, end_time: datetime, group_name: List[str] = None) -> Dict:
+        return search_body(
+            filter_query(
+                term("wazuh_data_type", "agent_info"),
+                time_range(start_time, end_time),
+                # 只有在提供 group_name 時才添加群組過濾
+                groups(group_name)
+            ),
+            aggs={
                 "status_count": {
                     "terms": {"field": "agent_status"}
                 }
             }
-        }
-        result = await es.search(index=final_es_agent_index, body=query)
+        )
+
+    @staticmethod
+    def parse_agent_summary(result: Dict) -> Dict:
         buckets = result['aggregations']['status_count']['buckets']
-        
         return {
             "connected": next((b['doc_count'] for b in buckets if b['key'] == 'active'), 0),
             "disconnected": next((b['doc_count'] for b in buckets if b['key'] == 'disconnected'), 0)
         }
 
     @staticmethod
-    async def load_agent_os(start_time: datetime, end_time: datetime, group_name: List[str] = None) -> List[Dict]:
-        """Get OS distribution"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "agent_info"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        query = {
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "aggs": {
+    @cached_result("dashboard.agent_summary", 30)
+    async def load_agent_summary(start_time: datetime, end_time: datetime, group_name: List[str] = None) -> Dict:
+        """Get connected and disconnected agents count"""
+        return await DashboardModel._search("agent_summary", start_time, end_time, group_name)
+
+    @staticmethod
+    def build_agent_os_query(start_time: datetime, end_time: datetime, group_name: List[str] = None) -> Dict:
+        return search_body(
+            filter_query(term("wazuh_data_type", "agent_info"), time_range(start_time, end_time), groups(group_name)),
+            aggs={
                 "os_distribution": {
                     "terms": {"field": "os"}
                 }
             }
-        }
-        result = await es.search(index=final_es_agent_index, body=query)
-        return [{"os": bucket["key"], "count": bucket["doc_count"]} 
+        )
+
+    @staticmethod
+    def parse_agent_os(result: Dict) -> List[Dict]:
+        return [{"os": bucket["key"], "count": bucket["doc_count"]}
                 for bucket in result['aggregations']['os_distribution']['buckets']]
 
     @staticmethod
-    async def load_alerts(start_time: datetime, end_time: datetime, user_groups: List[str] = None) -> Dict:
-        """Get alerts by severity level"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        if user_groups:
-            must_conditions.append({"terms": {"group_name": user_groups}})
-            
-        query = {
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "aggs": {
+    @cached_result("dashboard.agent_os", 30)
+    async def load_agent_os(start_time: datetime, end_time: datetime, group_name: List[str] = None) -> List[Dict]:
+        """Get OS distribution"""
+        return await DashboardModel._search("agent_os", start_time, end_time, group_name)
+
+    @staticmethod
+    def build_alerts_query(start_time: datetime, end_time: datetime, user_groups: List[str] = None) -> Dict:
+        window = DashboardModel._window("alerts", start_time, end_time)
+        return search_body(
+            filter_query(term("wazuh_data_type", "wazuh_events"), window.time_filter(), groups(user_groups)),
+            aggs=window.counted({
                 "severity_levels": {
                     "terms": {"field": "rule_level"}
                 }
-            }
-        }
-        result = await es.search(index=final_es_agent_index, body=query)
+            })
+        )
+
+    @staticmethod
+    def parse_alerts(result: Dict) -> Dict:
         severity_map = {
             "12-15": "critical_severity",
             "8-11": "high_severity",
@@ -126,25 +165,22 @@ class DashboardModel:
         return counts
 
     @staticmethod
-    async def load_cve_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
-        """Get CVE statistics from rule_mitre_tactic"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}},
-            {"prefix": {"rule_mitre_tactic": "CVE-"}}
-        ]
-        
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-        
-        query = {
-            "size": 0,
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "aggs": {
+    @cached_result("dashboard.alerts", 30)
+    async def load_alerts(start_time: datetime, end_time: datetime, user_groups: List[str] = None) -> Dict:
+        """Get alerts by severity level"""
+        return await DashboardModel._search("alerts", start_time, end_time, user_groups)
+
+    @staticmethod
+    def build_cve_barchart_query(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        window = DashboardModel._window("cve_barchart", start_time, end_time)
+        return search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                window.time_filter(),
+                {"prefix": {"rule_mitre_tactic": "CVE-"}},
+                groups(group_name)
+            ),
+            aggs=window.counted({
                 "cve_stats": {
                     "terms": {
                         "field": "rule_mitre_tactic",
@@ -152,122 +188,122 @@ class DashboardModel:
                         "order": {"_count": "desc"}
                     }
                 }
-            }
-        }
-        
-        result = await es.search(index=final_es_agent_index, body=query)
-        
+            })
+        )
+
+    @staticmethod
+    def parse_cve_barchart(result: Dict) -> List[Dict]:
         return [
             {"cve_name": bucket["key"], "count": bucket["doc_count"]}
             for bucket in result["aggregations"]["cve_stats"]["buckets"]
         ]
 
     @staticmethod
-    async def load_tactic_linechart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
-        """Get tactic timeline data"""
+    @cached_result("dashboard.cve_barchart", 30)
+    async def load_cve_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
+        """Get CVE statistics from rule_mitre_tactic"""
+        return await DashboardModel._search("cve_barchart", start_time, end_time, group_name)
+
+    @staticmethod
+    def build_tactic_linechart_query(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        window = DashboardModel._window("tactic_linechart", start_time, end_time)
         # 建立基本查詢條件
-        must_conditions = [
+        query = filter_query(
             {"exists": {"field": "rule_mitre_tactic"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}},
-            {"bool": {"must_not": {"term": {"rule_mitre_tactic": ""}}}}
-        ]
-        
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        # 執行 ES 查詢
-        result = await es.search(
-            index=final_es_agent_index,
-            body={
-                "size": 0,
-                "query": {"bool": {"must": must_conditions}},
-                "aggs": {
-                    "by_tactic": {
-                        "terms": {
-                            "field": "rule_mitre_tactic",
-                            "size": 10,
-                            "min_doc_count": 1
-                        },
-                        "aggs": {
-                            "by_time": {
-                                "date_histogram": {
-                                    "field": "timestamp",
-                                    "fixed_interval": "1h",
-                                    "format": "yyyy-MM-dd HH:mm:ss"
-                                }
+            window.time_filter(),
+            groups(group_name),
+            must_not=[{"term": {"rule_mitre_tactic": ""}}]
+        )
+        return search_body(
+            query,
+            aggs=window.counted({
+                "by_tactic": {
+                    "terms": {
+                        "field": "rule_mitre_tactic",
+                        "size": 10,
+                        "min_doc_count": 1
+                    },
+                    "aggs": {
+                        "by_time": {
+                            "date_histogram": {
+                                "field": "timestamp",
+                                "fixed_interval": "1h",
+                                "format": "yyyy-MM-dd HH:mm:ss"
                             }
                         }
                     }
                 }
-            }
+            })
         )
-        
+
+    @staticmethod
+    def parse_tactic_linechart(result: Dict) -> List[Dict]:
         # 過濾並處理資料
-        tactics = [tactic['key'] for tactic in result['aggregations']['by_tactic']['buckets'] 
+        tactics = [tactic['key'] for tactic in result['aggregations']['by_tactic']['buckets']
                 if tactic['key'].strip() and 'CVE' not in tactic['key']]  # 在這裡過濾掉含 CVE 的 tactic
-                
+
         if not tactics:
             return [{"label": [], "datas": []}]
-            
+
         # 收集時間點並建立資料結構
         all_times = {time_bucket['key_as_string']
                     for tactic in result['aggregations']['by_tactic']['buckets']
                     if tactic['key'] in tactics
                     for time_bucket in tactic['by_time']['buckets']}
         all_times = sorted(all_times)
-        
+
         # 格式化資料
         tactic_series = []
         for tactic in tactics:
             bucket = next(b for b in result['aggregations']['by_tactic']['buckets'] if b['key'] == tactic)
             time_data = {b['key_as_string']: b['doc_count'] for b in bucket['by_time']['buckets']}
-            
+
             tactic_series.append({
                 "name": tactic,
                 "type": "line",
                 "data": [{"time": time, "value": time_data.get(time, 0)} for time in all_times]
             })
-        
+
         return [{
             "label": [{"label": tactic} for tactic in tactics],
             "datas": tactic_series
         }]
-    
+
     @staticmethod
-    async def load_malicious_file_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
-        """Get malicious file statistics from rule_id 87105 and 100003"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"terms": {"rule_id": ["87105", "100003"]}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-                
-        query = {
-            "size": 10000,
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            }
-        }
-        
-        result = await es.search(index=final_es_agent_index, body=query)
-        
+    @cached_result("dashboard.tactic_linechart", 30)
+    async def load_tactic_linechart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
+        """Get tactic timeline data"""
+        return await DashboardModel._search("tactic_linechart", start_time, end_time, group_name)
+
+    @staticmethod
+    def build_malicious_file_barchart_query(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        # Reads raw hits, so the compacted days are left out
+        start_time = raw_window_start(start_time)
+        return search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                {"terms": {"rule_id": ["87105", "100003"]}},
+                time_range(start_time, end_time),
+                groups(group_name)
+            ),
+            size=10000,
+            source=["rule_description"]
+        )
+
+    @staticmethod
+    def parse_malicious_file_barchart(result: Dict) -> List[Dict]:
         def extract_filepath(description: str) -> str:
             """Extract file path from rule description"""
             pattern = r'[a-zA-Z]:\\(?:[^\\/:*?"<>|\r\n]+\\)*[^\\/:*?"<>|\r\n]*\.(?:zip|exe|bat|cmd|ps1|vbs|js)'
             match = re.search(pattern, description)
             return match.group(0) if match else description
-        
+
         file_counts = {}
         for hit in result['hits']['hits']:
             description = hit['_source']['rule_description']
             filepath = extract_filepath(description)
             file_counts[filepath] = file_counts.get(filepath, 0) + 1
-        
+
         return [
             {
                 "malicious_file": filepath,
@@ -277,25 +313,22 @@ class DashboardModel:
         ]
 
     @staticmethod
-    async def load_authentication_piechart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
-        """Get authentication failure techniques statistics"""
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"term": {"rule_id": "60204"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        if group_name and len(group_name) > 0:
-            must_conditions.append({"terms": {"group_name": group_name}})
-
-        query = {
-            "size": 0,
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "aggs": {
+    @cached_result("dashboard.malicious_file_barchart", 30)
+    async def load_malicious_file_barchart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
+        """Get malicious file statistics from rule_id 87105 and 100003"""
+        return await DashboardModel._search("malicious_file_barchart", start_time, end_time, group_name)
+
+    @staticmethod
+    def build_authentication_piechart_query(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        window = DashboardModel._window("authentication_piechart", start_time, end_time)
+        return search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                term("rule_id", "60204"),
+                window.time_filter(),
+                groups(group_name)
+            ),
+            aggs=window.counted({
                 "by_technique": {
                     "terms": {
                         "field": "rule_mitre_technique",
@@ -303,10 +336,11 @@ class DashboardModel:
                         "min_doc_count": 1
                     }
                 }
-            }
-        }
+            })
+        )
 
-        result = await es.search(index=final_es_agent_index, body=query)
+    @staticmethod
+    def parse_authentication_piechart(result: Dict) -> List[Dict]:
         return [
             {
                 "tactic": bucket['key'],
@@ -317,72 +351,88 @@ class DashboardModel:
         ]
 
     @staticmethod
-    async def load_agent_events(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
-        """Get agent event statistics"""
-        must_conditions = [
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}}
-        ]
-        
-        if group_name:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        query = {
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "aggs": {
+    @cached_result("dashboard.authentication_piechart", 30)
+    async def load_authentication_piechart(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
+        """Get authentication failure techniques statistics"""
+        return await DashboardModel._search("authentication_piechart", start_time, end_time, group_name)
+
+    @staticmethod
+    def build_agent_events_query(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> Dict:
+        window = DashboardModel._window("agent_events", start_time, end_time)
+        return search_body(
+            filter_query(window.time_filter(), groups(group_name)),
+            aggs=window.counted({
                 "by_agent": {
                     "terms": {"field": "agent_name"}
                 }
-            }
-        }
-        result = await es.search(index=final_es_agent_index, body=query)
+            })
+        )
+
+    @staticmethod
+    def parse_agent_events(result: Dict) -> List[Dict]:
         return [
             {"agent_name": bucket['key'], "event_count": bucket['doc_count']}
             for bucket in result['aggregations']['by_agent']['buckets']
         ]
 
     @staticmethod
-    async def load_event_table(start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None) -> List[Dict]:
-        """Get event details"""
-        # 構建基礎的 must 條件
-        must_conditions = [
-            {"term": {"wazuh_data_type": "wazuh_events"}},
-            {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}},
-            {"range": {"rule_level": {"gte": 8}}} 
+    @cached_result("dashboard.agent_events", 30)
+    async def load_agent_events(start_time: datetime, end_time: datetime, group_name: List[str]=None) -> List[Dict]:
+        """Get agent event statistics"""
+        return await DashboardModel._search("agent_events", start_time, end_time, group_name)
+
+    # Fields read by parse_event_table
+    EVENT_TABLE_FIELDS = ["timestamp", "agent_name", "rule_description", "rule_mitre_tactic", "rule_mitre_id", "rule_level"]
+
+    @staticmethod
+    def build_event_table_query(start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None) -> Dict:
+        # Compaction keeps high-level events, so compacted days are only left out if it keeps fewer
+        start_time = raw_window_start(start_time, min_level=8)
+        query = search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                time_range(start_time, end_time),
+                {"range": {"rule_level": {"gte": 8}}},
+                # 如果提供了 group_name，添加群組過濾
+                groups(group_name)
+            ),
+            size=int(max_results),
+            sort=[{"timestamp": "desc"}],
+            source=DashboardModel.EVENT_TABLE_FIELDS
+        )
+        logger.debug(f"Event table query: {json.dumps(query, indent=2)}")
+        return query
+
+    @staticmethod
+    def parse_event_table(result: Dict) -> List[Dict]:
+        return [
+            {
+                "timestamp": hit['_source']['timestamp'],
+                "agent_name": hit['_source']['agent_name'],
+                "rule_description": hit['_source'].get('rule_description', ''),
+                "rule_mitre_tactic": hit['_source'].get('rule_mitre_tactic', ''),
+                "rule_mitre_id": hit['_source'].get('rule_mitre_id', ''),
+                "rule_level": hit['_source'].get('rule_level', 0)
+            }
+            for hit in result['hits']['hits']
         ]
-        
-        # 如果提供了 group_name，添加群組過濾
-        if group_name and len(group_name) > 0:
-            must_conditions.append({"terms": {"group_name": group_name}})
-            
-        query = {
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "sort": [{"timestamp": "desc"}],
-            "size": int(max_results)
-        }
 
+    @staticmethod
+    @cached_result("dashboard.event_table", 10)
+    async def load_event_table(start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None) -> List[Dict]:
+        """Get event details"""
         try:
-            result = await es.search(index=final_es_agent_index, body=query)
-            logger.debug(f"Event table query: {json.dumps(query, indent=2)}") 
-            
-            return [
-                {
-                    "timestamp": hit['_source']['timestamp'],
-                    "agent_name": hit['_source']['agent_name'],
-                    "rule_description": hit['_source'].get('rule_description', ''),
-                    "rule_mitre_tactic": hit['_source'].get('rule_mitre_tactic', ''),
-                    "rule_mitre_id": hit['_source'].get('rule_mitre_id', ''),
-                    "rule_level": hit['_source'].get('rule_level', 0)
-                }
-                for hit in result['hits']['hits']
-            ]
+            return await DashboardModel._search("event_table", start_time, end_time, group_name)
         except Exception as e:
             logger.error(f"Error in load_event_table: {str(e)}")
             raise
+
+    @staticmethod
+    async def load_event_table_page(start_time: datetime, end_time: datetime, group_name: Optional[List[str]] = None,
+                                    page_size: int = 100, cursor: Optional[str] = None) -> SearchPage:
+        """Get one page of event details; pass the returned cursor to get the next page"""
+        query = DashboardModel.build_event_table_query(start_time, end_time, group_name)
+        indices = await index_manager.indices_for_range("agents", start_time, end_time)
+        page = await search_page(indices, query["query"], query["sort"], page_size, cursor, DashboardModel.EVENT_TABLE_FIELDS)
+        page.hits = DashboardModel.parse_event_table({"hits": {"hits": page.hits}})
+        return page
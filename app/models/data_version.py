@@ -0,0 +1,145 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+from elasticsearch import AsyncElasticsearch, NotFoundError
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.models.es_client import es
+from app.models.index_manager import index_manager
+import asyncio
+import os
+import time
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+# Bumped with every scope, read by admins who see every group
+ALL_SCOPES = "_all"
+# Bumped by changes that are not tied to one group, such as retention compaction
+GLOBAL_SCOPE = "_global"
+
+BUMP_SCRIPT = """
+for (entry in params.bumps.entrySet()) {
+    def current = ctx._source.versions.get(entry.getKey());
+    ctx._source.versions.put(entry.getKey(), (current == null ? 0 : current) + entry.getValue());
+}
+"""
+
+def document_scope(index_name: str, document: Dict) -> Optional[str]:
+    """Scope of an ingested document: its group for Wazuh data, else its index family."""
+    return document.get("group_name") or index_manager.family_of(index_name)
+
+class DataVersions:
+    """
+    Monotonic data version per scope (a group_name, or an index family such as "rds" for data
+    without groups), kept in one shared document. The ingest paths bump the scopes and indices they
+    wrote; every `flush_interval` seconds those indices are refreshed and then the bumps are written
+    in one batch, so a version is only handed out once its data is searchable. The shared
+    versions are re-read at most every `check_interval` seconds. Only versions read back from the
+    shared document are handed out, so every worker reports the same version for the same data
+    and a tag built from them means the same thing whichever worker answers.
+    """
+    VERSION_ID = "data"
+
+    def __init__(self, es: AsyncElasticsearch, version_index: str, check_interval: int = 5, flush_interval: int = 1):
+        self.es = es
+        self.version_index = version_index
+        self.check_interval = check_interval
+        self.flush_interval = flush_interval
+        self._shared: Dict[str, int] = {}
+        self._pending: Counter = Counter()
+        self._pending_indices: Set[str] = set()
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def bump(self, scopes: Iterable[Optional[str]], indices: Iterable[str] = ()) -> None:
+        """Bump `scopes` once the `indices` they were written to have been refreshed."""
+        bumped = {scope for scope in scopes if scope}
+        if not bumped:
+            return
+        bumped.add(ALL_SCOPES)
+        self._pending.update(bumped)
+        self._pending_indices.update(indices)
+
+    def bump_documents(self, documents: Iterable[tuple]) -> None:
+        """Bump the scopes of (index_name, document) pairs that were indexed."""
+        documents = list(documents)
+        self.bump((document_scope(index_name, document) for index_name, document in documents),
+                  {index_name for index_name, _ in documents})
+
+    async def current(self, scopes: List[str]) -> Dict[str, int]:
+        await self._sync()
+        return {scope: self._shared.get(scope, 0) for scope in scopes}
+
+    async def _sync(self) -> None:
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return
+            try:
+                response = await self.es.get(index=self.version_index, id=self.VERSION_ID)
+                self._shared.update(response["_source"].get("versions", {}))
+            except NotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Could not read data versions, using the last ones read: {str(e)}")
+            self._checked_at = time.monotonic()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        bumps, self._pending = dict(self._pending), Counter()
+        indices, self._pending_indices = self._pending_indices, set()
+        try:
+            if indices:
+                # Documents indexed without a refresh are not searchable yet
+                await self.es.indices.refresh(index=sorted(indices), ignore_unavailable=True)
+            response = await self.es.update(
+                index=self.version_index,
+                id=self.VERSION_ID,
+                script={"source": BUMP_SCRIPT, "lang": "painless", "params": {"bumps": bumps}},
+                upsert={"versions": bumps},
+                retry_on_conflict=5,
+                source=True
+            )
+            # Our own writes show up as soon as they are flushed, without waiting for the next check
+            self._shared.update(response["get"]["_source"].get("versions", {}))
+        except Exception as e:
+            self._pending.update(bumps)
+            self._pending_indices.update(indices)
+            logger.warning(f"Could not write data versions: {str(e)}")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+# Shared versions bumped by the ingest paths and read by the conditional GET endpoints
+data_versions = DataVersions(
+    es,
+    version_index=os.getenv('DATA_VERSION_INDEX', 'data_versions'),
+    check_interval=int(os.getenv('DATA_VERSION_CHECK_INTERVAL', 5)),
+    flush_interval=int(os.getenv('DATA_VERSION_FLUSH_INTERVAL', 1))
+)
@@ -0,0 +1,38 @@
+from elasticsearch import AsyncElasticsearch
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+import os
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+def _retry_statuses():
+    return tuple(int(status) for status in os.getenv('ES_RETRY_ON_STATUS', '429,502,503,504').split(',') if status.strip())
+
+# Single pooled client shared by every model. Connections are opened lazily on the first
+# request inside the running event loop and released by close_es() on shutdown.
+es = AsyncElasticsearch(
+    [{'host': os.getenv('ES_HOST'), 'port': int(os.getenv('ES_PORT')), 'scheme': os.getenv('ES_SCHEME')}],
+    basic_auth=(os.getenv('ES_USER'), os.getenv('ES_PASSWORD')),
+    node_class='aiohttp',
+    connections_per_node=int(os.getenv('ES_CONNECTIONS_PER_NODE', 25)),
+    http_compress=os.getenv('ES_HTTP_COMPRESS', 'true').lower() == 'true',
+    request_timeout=float(os.getenv('ES_REQUEST_TIMEOUT', 30)),
+    max_retries=int(os.getenv('ES_MAX_RETRIES', 3)),
+    retry_on_timeout=os.getenv('ES_RETRY_ON_TIMEOUT', 'true').lower() == 'true',
+    retry_on_status=_retry_statuses()
+)
+
+async def close_es() -> None:
+    """Close the pooled connections of the shared client."""
+    try:
+        await es.close()
+    except Exception as e:
+        logger.error(f"Error closing Elasticsearch client: {str(e)}")
@@ -0,0 +1,262 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from elasticsearch import AsyncElasticsearch
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.models.es_client import es
+import asyncio
+import fnmatch
+import os
+import time
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+# Longer rule descriptions get no rule_description.keyword, so they are left out of the description
+# aggregations; events carrying one are flagged with rule_description_overlength instead
+RULE_DESCRIPTION_KEYWORD_MAX = 1024
+
+AGENTS_DATA_MAPPING = {
+    "properties": {
+        "agent_name": {"type": "keyword"},
+        "agent_id": {"type": "keyword"},
+        "ip": {"type": "ip"},
+        "agent_status": {"type": "keyword"},
+        "status_code": {"type": "integer"},
+        "last_keep_alive": {"type": "date"},
+        "os": {"type": "keyword"},
+        "os_version": {"type": "keyword"},
+        "os_family": {"type": "keyword"},
+        "group_name": {"type": "keyword"},
+        "wazuh_data_type": {"type": "keyword"},
+        "timestamp": {"type": "date"},
+        # Event specific fields
+        "rule_description": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": RULE_DESCRIPTION_KEYWORD_MAX}}},
+        "rule_description_overlength": {"type": "boolean"},
+        "rule_level": {"type": "integer"},
+        "rule_id": {"type": "keyword"},
+        "rule_mitre_id": {"type": "keyword"},
+        "rule_mitre_tactic": {"type": "keyword"},
+        "rule_mitre_technique": {"type": "keyword"},
+        "agent_ip": {"type": "ip"}
+    }
+}
+
+RDS_DATA_MAPPING = {
+    "properties": {
+        "timestamp": {"type": "date"},
+        "account": {"type": "keyword"},
+        "edge_name": {"type": "keyword"},
+        "edge_ip": {"type": "ip"},
+        "edge_mac": {"type": "keyword"},
+        "edge_os": {"type": "keyword"},
+        "edge_ssid": {"type": "keyword"},
+        "edge_dns_gateway": {"type": "ip"},
+        "tag_id": {"type": "keyword"},
+        "tag": {"type": "keyword"},
+        "file_hash": {"type": "keyword"},
+        "file_name": {"type": "keyword"},
+        "file_path": {"type": "keyword"},
+        "score": {"type": "keyword"},
+        "data_type": {"type": "keyword"}
+    }
+}
+
+EVENT_ROLLUP_MAPPING = {
+    "properties": {
+        "timestamp": {"type": "date"},
+        "rollup_interval": {"type": "keyword"},
+        "event_count": {"type": "long"},
+        "wazuh_data_type": {"type": "keyword"},
+        "group_name": {"type": "keyword"},
+        "agent_id": {"type": "keyword"},
+        "agent_name": {"type": "keyword"},
+        "rule_id": {"type": "keyword"},
+        "rule_level": {"type": "integer"},
+        "rule_description": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": RULE_DESCRIPTION_KEYWORD_MAX}}},
+        "rule_mitre_id": {"type": "keyword"},
+        "rule_mitre_tactic": {"type": "keyword"},
+        "rule_mitre_technique": {"type": "keyword"}
+    }
+}
+
+class IndexFamily:
+    """A set of monthly indices sharing a naming scheme and, optionally, a mapping."""
+    def __init__(self, name_format: str, pattern: str, mappings: Optional[Dict] = None):
+        self.name_format = name_format
+        self.pattern = pattern
+        self.mappings = mappings
+
+    def index_name(self, when: datetime) -> str:
+        return self.name_format.format(when)
+
+INDEX_FAMILIES: Dict[str, IndexFamily] = {
+    "agents": IndexFamily("{:%Y_%m}_agents_data", "*_agents_data", AGENTS_DATA_MAPPING),
+    "rds": IndexFamily("{:%Y_%m}_rds_data", "*_rds_data", RDS_DATA_MAPPING),
+    "rollups": IndexFamily("{:%Y_%m}_event_rollups", "*_event_rollups", EVENT_ROLLUP_MAPPING),
+    "modbus": IndexFamily("modbus_events_{:%Y%m}", "modbus_events_*"),
+    "syslog": IndexFamily("syslog_events_{:%Y%m}", "syslog_events_*"),
+}
+
+def next_month(when: datetime) -> datetime:
+    if when.month == 12:
+        return when.replace(year=when.year + 1, month=1, day=1)
+    return when.replace(month=when.month + 1, day=1)
+
+class IndexManager:
+    """
+    Resolves monthly index names for every model and remembers which indices exist,
+    so the hot path does not pay an `indices.exists` round-trip per request.
+    A background task installs index templates and creates next month's indices ahead of rollover.
+    """
+    def __init__(self, es: AsyncElasticsearch, families: Dict[str, IndexFamily], check_interval: int = 3600,
+                 listing_ttl: int = 60, range_padding: timedelta = timedelta(days=1)):
+        self.es = es
+        self.families = families
+        self.check_interval = check_interval
+        self.listing_ttl = listing_ttl
+        self.range_padding = range_padding
+        self._existing: Set[str] = set()
+        self._listings: Dict[str, tuple] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def index_name(self, family: str, when: Optional[datetime] = None) -> str:
+        """Name of the monthly index of `family` covering `when` (default: now)."""
+        return self.families[family].index_name(when or datetime.now())
+
+    def family_of(self, index_name: str) -> Optional[str]:
+        """Name of the family whose pattern matches `index_name`."""
+        for family, index_family in self.families.items():
+            if fnmatch.fnmatchcase(index_name, index_family.pattern):
+                return family
+        return None
+
+    async def ensure(self, family: str, when: Optional[datetime] = None) -> str:
+        """Resolve the monthly index name and create the index once if it is not known to exist."""
+        index_name = self.index_name(family, when)
+        if index_name in self._existing:
+            return index_name
+        async with self._lock:
+            if index_name in self._existing:
+                return index_name
+            await self._create(family, index_name)
+            self._existing.add(index_name)
+        return index_name
+
+    async def indices_for_range(self, family: str, start_time: datetime, end_time: datetime) -> List[str]:
+        """
+        Monthly indices of `family` overlapping [start_time, end_time] that exist.
+        Documents land in the index of the month they were written, so the window is padded
+        to pick up events written shortly after a rollover. Query with ignore_unavailable=True.
+        """
+        definition = self.families[family]
+        names = []
+        month = start_time.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        last = end_time.replace(tzinfo=None) + self.range_padding
+        while month <= last:
+            names.append(definition.index_name(month))
+            month = next_month(month)
+
+        existing = await self._list_existing(family)
+        resolved = [name for name in names if name in existing or name in self._existing]
+        # Nothing exists yet: keep the computed names so the search returns no hits instead of
+        # falling back to every index in the cluster
+        return resolved or names
+
+    async def _list_existing(self, family: str) -> Set[str]:
+        listed_at, names = self._listings.get(family, (0.0, set()))
+        if time.monotonic() - listed_at < self.listing_ttl:
+            return names
+        try:
+            response = await self.es.indices.get_alias(index=self.families[family].pattern, allow_no_indices=True)
+            names = set(response.keys())
+        except Exception as e:
+            logger.warning(f"Could not list {family} indices: {str(e)}")
+        self._listings[family] = (time.monotonic(), names)
+        return names
+
+    def invalidate(self, index_name: Optional[str] = None) -> None:
+        """Forget cached existence, e.g. after an index was deleted."""
+        self._listings.clear()
+        if index_name is None:
+            self._existing.clear()
+        else:
+            self._existing.discard(index_name)
+
+    async def _create(self, family: str, index_name: str) -> None:
+        mappings = self.families[family].mappings
+        body = {"mappings": mappings} if mappings else {}
+        # 400 resource_already_exists_exception means another worker won the race
+        response = await self.es.options(ignore_status=400).indices.create(index=index_name, body=body)
+        error = response.get("error")
+        if error and error.get("type") != "resource_already_exists_exception":
+            logger.error(f"Error creating index {index_name}: {error}")
+            raise RuntimeError(f"Error creating index {index_name}: {error.get('reason')}")
+        if not error:
+            logger.info(f"Created index {index_name}")
+
+    async def install_templates(self) -> None:
+        """Register an index template per family so auto-created indices get the right mapping."""
+        for family, definition in self.families.items():
+            if not definition.mappings:
+                continue
+            try:
+                await self.es.indices.put_index_template(
+                    name=f"{family}_monthly",
+                    body={"index_patterns": [definition.pattern], "template": {"mappings": definition.mappings}}
+                )
+            except Exception as e:
+                logger.warning(f"Could not install index template for {family}: {str(e)}")
+            try:
+                # Carry additive mapping changes (e.g. new multi-fields) over to indices that already exist
+                await self.es.indices.put_mapping(index=definition.pattern, body=definition.mappings, allow_no_indices=True)
+            except Exception as e:
+                logger.warning(f"Could not update mappings of existing {family} indices: {str(e)}")
+
+    async def precreate(self, when: Optional[datetime] = None) -> None:
+        """Make sure this month's and next month's indices exist for every family with a mapping."""
+        when = when or datetime.now()
+        for family, definition in self.families.items():
+            if not definition.mappings:
+                continue
+            for month in (when, next_month(when)):
+                try:
+                    await self.ensure(family, month)
+                except Exception as e:
+                    logger.warning(f"Could not pre-create {family} index for {month:%Y-%m}: {str(e)}")
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self.install_templates()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.precreate()
+            await asyncio.sleep(self.check_interval)
+
+# Shared resolver used by all models
+index_manager = IndexManager(
+    es,
+    INDEX_FAMILIES,
+    check_interval=int(os.getenv('INDEX_PRECREATE_INTERVAL', 3600)),
+    listing_ttl=int(os.getenv('INDEX_LISTING_TTL', 60)),
+    range_padding=timedelta(hours=int(os.getenv('INDEX_RANGE_PADDING_HOURS', 24)))
+)
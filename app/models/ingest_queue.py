@@ -0,0 +1,194 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from collections import OrderedDict
+from logging import getLogger
+import asyncio
+import os
+import uuid
+from dotenv import load_dotenv, find_dotenv
+from app.models.bulk_db import BulkIngestEngine
+from app.models.wazuh_db import bulk_engine
+from app.models.rollup import event_rollups
+from app.models.alert_feed import alert_feed
+from app.models.data_version import data_versions
+from app.models.agent_registry import agent_registry
+from app.ext.error import ServiceUnavailableError
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+class IngestBatch:
+    """Tracks the outcome of one accepted upload while its documents wait in the queue."""
+    def __init__(self, total: int, owner: Optional[str] = None):
+        self.batch_id = uuid.uuid4().hex
+        self.owner = owner
+        self.total = total
+        self.succeeded = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+        self.created_at = datetime.utcnow()
+        self.completed_at: Optional[datetime] = None
+
+    @property
+    def status(self) -> str:
+        if self.succeeded + self.failed < self.total:
+            return "pending"
+        if self.failed == 0:
+            return "completed"
+        return "failed" if self.succeeded == 0 else "partial"
+
+    def to_dict(self) -> Dict:
+        return {
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "errors": self.errors,
+            "created_at": self.created_at.isoformat(),
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
+        }
+
+class WriteBehindQueue:
+    """
+    In-process write-behind buffer for ingest endpoints. Documents from many uploads are merged
+    and flushed through the bulk engine once `max_documents` are pending or the oldest pending
+    document has waited `max_delay_ms`, whichever comes first.
+    """
+    MAX_ERRORS_PER_BATCH = 20
+
+    def __init__(self, engine: BulkIngestEngine, max_documents: int = 1000, max_delay_ms: int = 500,
+                 max_pending: int = 100000, max_tracked_batches: int = 10000,
+                 on_indexed: Optional[Callable[[List[Dict]], None]] = None):
+        self.engine = engine
+        self.on_indexed = on_indexed
+        self.max_documents = max_documents
+        self.max_delay = max_delay_ms / 1000
+        self.max_pending = max_pending
+        self.max_tracked_batches = max_tracked_batches
+        self._pending: List[tuple] = []
+        self._oldest_pending: Optional[float] = None
+        self._batches: "OrderedDict[str, IngestBatch]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Write-behind ingest queue started (max_documents={self.max_documents}, max_delay={self.max_delay}s)")
+
+    async def stop(self) -> None:
+        """Flush everything still pending and stop the background flusher."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        logger.info("Write-behind ingest queue stopped")
+
+    def submit(self, actions: List[Dict], owner: Optional[str] = None) -> IngestBatch:
+        """Queue bulk actions and return the batch that will report their outcome."""
+        if self._task is None or self._closing:
+            raise ServiceUnavailableError("Ingest queue is not running")
+        if len(self._pending) + len(actions) > self.max_pending:
+            raise ServiceUnavailableError("Ingest queue is full, retry later")
+
+        batch = IngestBatch(len(actions), owner)
+        self._track(batch)
+        if not actions:
+            batch.completed_at = datetime.utcnow()
+            return batch
+
+        if not self._pending:
+            self._oldest_pending = asyncio.get_running_loop().time()
+        self._pending.extend((batch, action) for action in actions)
+        self._wakeup.set()
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[IngestBatch]:
+        return self._batches.get(batch_id)
+
+    def _track(self, batch: IngestBatch) -> None:
+        self._batches[batch.batch_id] = batch
+        while len(self._batches) > self.max_tracked_batches:
+            self._batches.popitem(last=False)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            remaining = self._oldest_pending + self.max_delay - loop.time()
+            if len(self._pending) < self.max_documents and remaining > 0 and not self._closing:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._flush()
+
+    async def _flush(self) -> None:
+        chunk = self._pending[:self.max_documents]
+        self._pending = self._pending[self.max_documents:]
+        self._oldest_pending = asyncio.get_running_loop().time() if self._pending else None
+
+        actions = [action for _, action in chunk]
+        try:
+            result = await self.engine.bulk(actions)
+            outcomes = list(zip(result.items, result.errors_by_position()))
+        except Exception as e:
+            logger.error(f"Write-behind flush of {len(actions)} documents failed: {str(e)}")
+            outcomes = [(False, {"error": str(e)})] * len(actions)
+
+        if self.on_indexed is not None:
+            indexed = [action for action, (ok, _) in zip(actions, outcomes) if ok and "_source" in action]
+            try:
+                self.on_indexed(indexed)
+            except Exception as e:
+                logger.error(f"Write-behind on_indexed hook failed: {str(e)}")
+
+        for (batch, _), (ok, error) in zip(chunk, outcomes):
+            if ok:
+                batch.succeeded += 1
+            else:
+                batch.failed += 1
+                if len(batch.errors) < self.MAX_ERRORS_PER_BATCH:
+                    batch.errors.append(error)
+            if batch.completed_at is None and batch.status != "pending":
+                batch.completed_at = datetime.utcnow()
+
+def _on_indexed(actions: List[Dict]) -> None:
+    documents = [action["_source"] for action in actions]
+    agent_registry.record([document for document in documents if document.get("wazuh_data_type") == "agent_info"])
+    event_rollups.add(documents)
+    alert_feed.publish(documents)
+    data_versions.bump_documents((action["_index"], action["_source"]) for action in actions)
+
+# Shared queue fed by the ingest endpoints, enabled with INGEST_WRITE_BEHIND=true
+INGEST_WRITE_BEHIND = os.getenv('INGEST_WRITE_BEHIND', 'false').lower() == 'true'
+
+ingest_queue = WriteBehindQueue(
+    bulk_engine,
+    max_documents=int(os.getenv('INGEST_QUEUE_MAX_DOCUMENTS', 1000)),
+    max_delay_ms=int(os.getenv('INGEST_QUEUE_MAX_DELAY_MS', 500)),
+    max_pending=int(os.getenv('INGEST_QUEUE_MAX_PENDING', 100000)),
+    on_indexed=_on_indexed
+)
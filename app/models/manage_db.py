@@ -1,26 +1,29 @@
 from sqlalchemy import func, select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user_db import GroupSignup, UserSignup, SessionLocal
 from app.models.wazuh_db import AgentModel
 from app.schemas.manage import UserInfo
 from app.tools.email import EmailNotification
+from app.tools.cache import invalidate_principal, invalidate_groups
+from app.tools.membership import membership_versions
 from logging import getLogger
 from typing import List
+import threading
 
 logger = getLogger('app_logger')
 
 class ManageModel:
 
     @staticmethod
-    def toggle_disabled_status(user_id: int) -> bool:
+    async def toggle_disabled_status(user_id: int) -> bool:
         """
         Toggle the disabled status of a user and update group_signup.
         Only create group_signup entry when enabling a user (disabled -> enabled).
         Returns the new disabled status.
         """
-        with SessionLocal() as session:
+        async with SessionLocal() as session:
             try:
-                user = session.query(UserSignup).filter(UserSignup.id == user_id).first()
+                user = await session.get(UserSignup, user_id)
                 if user:
                     was_disabled = bool(user.disabled)
                     user.disabled = not user.disabled
@@ -33,66 +36,70 @@ class ManageModel:
                             user_signup_id=user.id
                         )
                         
-                        existing_group = session.query(GroupSignup).filter(
+                        existing_group = (await session.execute(select(GroupSignup).where(
                             GroupSignup.group_name == user.username,
                             GroupSignup.user_signup_id == user.id
-                        ).first()
+                        ))).scalars().first()
                         
                         if not existing_group:
                             session.add(group_signup)
-                        
-                        # Send approval notification email
-                        EmailNotification.send_approval_notification(
-                            username=user.username,
-                            company_name=user.company_name,
-                            to_email=user.email
-                        )
                     
-                    session.commit()
+                    await session.commit()
+                    if was_disabled and not user.disabled:
+                        # Send approval notification email in background, once the change is committed
+                        threading.Thread(
+                            target=EmailNotification.send_approval_notification,
+                            args=(user.username, user.company_name, user.email),
+                            daemon=True
+                        ).start()
+                    invalidate_principal(user.username)
+                    invalidate_groups(user.id)
+                    # Outdates the group claims of the user's tokens
+                    await membership_versions.bump(user.id)
                     return user.disabled
                 return None
                 
             except Exception as e:
                 logger.error(f"Error in toggle_disabled_status: {str(e)}")
-                session.rollback()
+                await session.rollback()
                 raise
 
     @staticmethod
-    def update_license_amount(user_id: int, license_amount: int):
-        with SessionLocal() as session:
-            user = session.query(UserSignup).filter(UserSignup.id == user_id).first()
+    async def update_license_amount(user_id: int, license_amount: int):
+        async with SessionLocal() as session:
+            user = await session.get(UserSignup, user_id)
             if user:
                 user.license_amount = license_amount
                 user.update_date = func.now()
-                session.commit()
+                await session.commit()
+                invalidate_principal(user.username)
                 return True
             return False
 
     @staticmethod
-    def get_user_groups(user_id: int) -> List[str]:
-        with SessionLocal() as session:
-            user = session.query(UserSignup).filter(UserSignup.id == user_id).first()
-            if user:
-                return [group.group_name for group in user.groups]
-            return []
+    async def get_user_groups(user_id: int) -> List[str]:
+        async with SessionLocal() as session:
+            # Selected explicitly: lazy relationship loads are not available on async sessions
+            result = await session.execute(select(GroupSignup.group_name).where(GroupSignup.user_signup_id == user_id))
+            return list(result.scalars())
 
     @staticmethod
-    def get_user_license(user_id: int) -> int:
-        with SessionLocal() as session:
-            user = session.query(UserSignup).filter(UserSignup.id == user_id).first()
+    async def get_user_license(user_id: int) -> int:
+        async with SessionLocal() as session:
+            user = await session.get(UserSignup, user_id)
             return user.license_amount if user else 0
 
     @staticmethod
-    def get_total_license() -> int:
-        with SessionLocal() as session:
-            result = session.execute(
+    async def get_total_license() -> int:
+        async with SessionLocal() as session:
+            result = (await session.execute(
                 select(func.sum(UserSignup.license_amount))
-            ).scalar()
+            )).scalar()
             return result or 0
 
     @staticmethod
-    def get_all_users(db: Session):
-        users = db.query(UserSignup).filter(UserSignup.user_role != 'admin').all()
+    async def get_all_users(db: AsyncSession):
+        users = (await db.execute(select(UserSignup).where(UserSignup.user_role != 'admin'))).scalars().all()
         return [
             UserInfo(
                 user_id=user.id,
@@ -107,14 +114,14 @@ class ManageModel:
         ]
     
     @staticmethod
-    def get_next_agent_name(username: str, group_names: List[str]) -> str:
+    async def get_next_agent_name(username: str, group_names: List[str]) -> str:
         """
         Get the next available agent name based on existing agents
         Returns format like '{username}_001', '{username}_002', etc.
         """
         try:
             # Get existing agent names from latest agent details
-            agent_details = AgentModel.get_latest_agent_details(group_names)
+            agent_details = await AgentModel.get_latest_agent_details(group_names)
             existing_names = [agent['agent_name'] for agent in agent_details]
             
             # Find the highest number for this username
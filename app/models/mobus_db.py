@@ -1,9 +1,13 @@
-from elasticsearch import Elasticsearch
-import os
+import uuid
 from logging import getLogger
+from app.models.index_manager import index_manager
+from app.models.es_client import es
+from app.models.data_version import data_versions
+from app.models.query_builder import filter_query, search_body, search_params, time_range
 from app.schemas.mobus import ModbusEventCreate, ModbusEventResponse, SyslogEventCreate, SyslogEventResponse
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Type
+from pydantic import BaseModel
 
 logger = getLogger('app_logger')
 
@@ -11,16 +15,7 @@ class ModbusEventModel:
     def __init__(self):
         self.modbus_index_prefix = "modbus_events"
         self.syslog_index_prefix = "syslog_events"
-        es_host = os.getenv('ES_HOST', 'localhost')
-        es_port = int(os.getenv('ES_PORT', 9200))
-        es_scheme = os.getenv('ES_SCHEME', 'http')
-        es_user = os.getenv('ES_USER')
-        es_password = os.getenv('ES_PASSWORD')
-        
-        self.es = Elasticsearch(
-            [{'host': es_host, 'port': es_port, 'scheme': es_scheme}],
-            http_auth=(es_user, es_password) if es_user and es_password else None
-        )
+        self.es = es
 
     def to_dict(self, event_data: ModbusEventCreate) -> Dict:
         return {
@@ -54,60 +49,50 @@ class ModbusEventModel:
             }
         }
 
-    def create_event(self, event_data: ModbusEventCreate) -> str:
-        index_name = f"{self.modbus_index_prefix}_{datetime.now().strftime('%Y%m').lower()}"
+    def modbus_index_name(self) -> str:
+        return index_manager.index_name("modbus")
+
+    def syslog_index_name(self) -> str:
+        return index_manager.index_name("syslog")
+
+    async def create_event(self, event_data: ModbusEventCreate) -> str:
+        index_name = self.modbus_index_name()
         document = self.to_dict(event_data)
-        return self.save_to_elasticsearch(index_name, document)
+        return await self.save_to_elasticsearch(index_name, document)
 
-    def create_syslog_event(self, event_data: SyslogEventCreate) -> str:
-        index_name = f"{self.syslog_index_prefix}_{datetime.now().strftime('%Y%m').lower()}"
+    async def create_syslog_event(self, event_data: SyslogEventCreate) -> str:
+        index_name = self.syslog_index_name()
         document = self.syslog_to_dict(event_data)
-        return self.save_to_elasticsearch(index_name, document)
+        return await self.save_to_elasticsearch(index_name, document)
 
-    def save_to_elasticsearch(self, index_name: str, document: Dict) -> str:
-        result = self.es.index(index=index_name, document=document)
-        return result['_id']
+    def event_bulk_action(self, event_data: ModbusEventCreate) -> Dict:
+        """Build a `_bulk` action with a pre-assigned id so the event id is known before it is indexed."""
+        return {"_op_type": "index", "_index": self.modbus_index_name(), "_id": uuid.uuid4().hex, "_source": self.to_dict(event_data)}
 
-    def get_events(self, start_time: datetime, end_time: datetime) -> List[ModbusEventResponse]:
-        index_pattern = f"{self.modbus_index_prefix}_*"
-        query = {
-            "query": {
-                "range": {
-                    "timestamp": {
-                        "gte": start_time.isoformat(),
-                        "lte": end_time.isoformat()
-                    }
-                }
-            },
-            "sort": [{"timestamp": "asc"}]
-        }
+    def syslog_bulk_action(self, event_data: SyslogEventCreate) -> Dict:
+        return {"_op_type": "index", "_index": self.syslog_index_name(), "_id": uuid.uuid4().hex, "_source": self.syslog_to_dict(event_data)}
 
-        results = self.es.search(index=index_pattern, body=query, size=10000)
-        events = []
-        for hit in results['hits']['hits']:
-            event_data = hit['_source']
-            event_data['event_id'] = hit['_id']
-            events.append(ModbusEventResponse(**event_data))
-        return events
+    async def save_to_elasticsearch(self, index_name: str, document: Dict) -> str:
+        result = await self.es.index(index=index_name, document=document)
+        data_versions.bump([index_manager.family_of(index_name)], [index_name])
+        return result['_id']
 
-    def get_syslog_events(self, start_time: datetime, end_time: datetime) -> List[SyslogEventResponse]:
-        index_pattern = f"{self.syslog_index_prefix}_*"
-        query = {
-            "query": {
-                "range": {
-                    "timestamp": {
-                        "gte": start_time.isoformat(),
-                        "lte": end_time.isoformat()
-                    }
-                }
-            },
-            "sort": [{"timestamp": "asc"}]
-        }
+    async def get_events(self, start_time: datetime, end_time: datetime) -> List[Dict]:
+        indices = await index_manager.indices_for_range("modbus", start_time, end_time)
+        return await self._search_events(indices, filter_query(time_range(start_time, end_time)), ModbusEventResponse)
+
+    async def get_syslog_events(self, start_time: datetime, end_time: datetime) -> List[Dict]:
+        indices = await index_manager.indices_for_range("syslog", start_time, end_time)
+        return await self._search_events(indices, filter_query(time_range(start_time, end_time)), SyslogEventResponse)
 
-        results = self.es.search(index=index_pattern, body=query, size=10000)
+    async def _search_events(self, indices: List[str], query: Dict, response_model: Type[BaseModel]) -> List[Dict]:
+        """Rows shaped like `response_model`; only its fields are read from the stored documents."""
+        fields = [field for field in response_model.model_fields if field != "event_id"]
+        body = search_body(query, size=10000, sort=[{"timestamp": "asc"}], source=fields)
+        results = await self.es.search(index=indices, body=body, **search_params(body))
         events = []
         for hit in results['hits']['hits']:
             event_data = hit['_source']
             event_data['event_id'] = hit['_id']
-            events.append(SyslogEventResponse(**event_data))
+            events.append(event_data)
         return events
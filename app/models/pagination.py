@@ -0,0 +1,109 @@
+from typing import AsyncIterator, Dict, List, Optional
+from elasticsearch import NotFoundError as ESNotFoundError
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.models.es_client import es
+from app.ext.error import BadRequestError
+import base64
+import json
+import os
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+# How long a point-in-time stays open between two page requests
+PIT_KEEP_ALIVE = os.getenv('ES_PIT_KEEP_ALIVE', '2m')
+
+class SearchPage:
+    """One page of hits. `next_cursor` is None once the last page has been returned."""
+    def __init__(self, hits: List[Dict], next_cursor: Optional[str] = None, total: Optional[int] = None):
+        self.hits = hits
+        self.next_cursor = next_cursor
+        self.total = total
+
+def encode_cursor(pit_id: str, search_after: List, total: Optional[int] = None) -> str:
+    payload = json.dumps({"pit": pit_id, "after": search_after, "total": total}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(payload, dict) or "pit" not in payload or not isinstance(payload.get("after"), list):
+            raise ValueError("missing fields")
+        return payload
+    except Exception:
+        raise BadRequestError("Invalid cursor")
+
+async def search_page(indices: List[str], query: Dict, sort: List[Dict], page_size: int, cursor: Optional[str] = None,
+                      source: Optional[List[str]] = None) -> SearchPage:
+    """
+    Page through `query` with a point-in-time and `search_after`. Without a cursor a new point-in-time
+    is opened over `indices` and the total hit count is computed; with a cursor the next page of the
+    same snapshot is returned. The query is sent on every page, so access filters are always applied.
+    """
+    total = None
+    if cursor:
+        state = decode_cursor(cursor)
+        pit_id, search_after, total = state["pit"], state["after"], state.get("total")
+    else:
+        response = await es.open_point_in_time(index=indices, keep_alive=PIT_KEEP_ALIVE, ignore_unavailable=True)
+        pit_id, search_after = response["id"], None
+
+    body = {
+        "query": query,
+        # _shard_doc breaks ties between equal sort values so no hit is skipped or repeated
+        "sort": sort + [{"_shard_doc": "asc"}],
+        "size": page_size,
+        "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+        "track_total_hits": search_after is None
+    }
+    if search_after is not None:
+        body["search_after"] = search_after
+    if source is not None:
+        body["_source"] = source
+
+    try:
+        result = await es.search(body=body)
+    except ESNotFoundError:
+        raise BadRequestError("Cursor has expired, request the first page again")
+
+    hits = result["hits"]["hits"]
+    pit_id = result.get("pit_id", pit_id)
+    if search_after is None:
+        total = result["hits"]["total"]["value"]
+    if len(hits) < page_size:
+        await close_point_in_time(pit_id)
+        return SearchPage(hits, None, total)
+    return SearchPage(hits, encode_cursor(pit_id, hits[-1]["sort"], total), total)
+
+async def iterate_pages(indices: List[str], query: Dict, sort: List[Dict], page_size: int,
+                        source: Optional[List[str]] = None) -> AsyncIterator[List[Dict]]:
+    """
+    Yield every page of hits of `query` from one point-in-time. Only one page is held at a time;
+    the point-in-time is closed when the caller stops iterating early.
+    """
+    cursor = None
+    try:
+        while True:
+            page = await search_page(indices, query, sort, page_size, cursor, source)
+            cursor = page.next_cursor
+            if page.hits:
+                yield page.hits
+            if cursor is None:
+                return
+    finally:
+        if cursor is not None:
+            await close_point_in_time(decode_cursor(cursor)["pit"])
+
+async def close_point_in_time(pit_id: str) -> None:
+    try:
+        await es.close_point_in_time(id=pit_id)
+    except Exception as e:
+        logger.warning(f"Could not close point-in-time: {str(e)}")
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+import os
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+# Time bounds are widened to this many seconds (a divisor of a day) so repeated polls send identical
+# queries, which the shard request cache can answer
+QUERY_ROUNDING_SECONDS = int(os.getenv('ES_QUERY_ROUNDING_SECONDS', 60))
+# Search-side timeout; below the client's ES_REQUEST_TIMEOUT so Elasticsearch stops work nobody waits for
+QUERY_TIMEOUT = os.getenv('ES_QUERY_TIMEOUT', '25s')
+
+def _floor(value: datetime, seconds: int) -> datetime:
+    elapsed = value.hour * 3600 + value.minute * 60 + value.second
+    return value.replace(microsecond=0) - timedelta(seconds=elapsed % seconds)
+
+def round_bounds(start_time: datetime, end_time: datetime, seconds: int = QUERY_ROUNDING_SECONDS) -> Tuple[datetime, datetime]:
+    """Round the start down and the end up to `seconds`, so the rounded range covers the requested one."""
+    if seconds <= 1:
+        return start_time, end_time
+    end_floor = _floor(end_time, seconds)
+    return _floor(start_time, seconds), end_floor if end_floor == end_time else end_floor + timedelta(seconds=seconds)
+
+def time_range(start_time: datetime, end_time: datetime, field: str = "timestamp", inclusive_end: bool = True) -> Dict:
+    start_time, end_time = round_bounds(start_time, end_time)
+    return {"range": {field: {"gte": start_time.isoformat(), "lte" if inclusive_end else "lt": end_time.isoformat()}}}
+
+def term(field: str, value) -> Optional[Dict]:
+    """Term filter, or None (no restriction) when `value` is None or empty."""
+    return None if value is None or value == "" else {"term": {field: value}}
+
+def groups(group_names: Optional[Iterable[str]]) -> Optional[Dict]:
+    """
+    Group filter: None (all groups) only for None, as admins pass; an empty list matches nothing.
+    Sorted so equal sets give equal queries.
+    """
+    if group_names is None:
+        return None
+    group_names = sorted(group_names)
+    return {"terms": {"group_name": group_names}} if group_names else {"match_none": {}}
+
+def filter_query(*clauses: Optional[Dict], must_not: Optional[List[Dict]] = None) -> Dict:
+    """Bool query with every clause in filter context: no scoring, and cacheable by the node query cache."""
+    query = {"bool": {"filter": [clause for clause in clauses if clause]}}
+    if must_not:
+        query["bool"]["must_not"] = must_not
+    return query
+
+def search_body(query: Dict, aggs: Optional[Dict] = None, size: int = 0, sort: Optional[List[Dict]] = None,
+                source: Optional[List[str]] = None, track_total_hits: bool = False) -> Dict:
+    """
+    Search body with the shared policies: no hits unless `size` is given, totals only when asked for,
+    `_source` limited to `source`, and the search timeout.
+    """
+    body = {"size": size, "query": query, "track_total_hits": track_total_hits, "timeout": QUERY_TIMEOUT}
+    if aggs is not None:
+        body["aggs"] = aggs
+    if sort is not None:
+        body["sort"] = sort
+    if source is not None:
+        body["_source"] = source
+    return body
+
+def search_params(body: Dict) -> Dict:
+    """Request parameters for `body`; aggregation-only searches ask for the shard request cache."""
+    params = {"ignore_unavailable": True}
+    if body.get("size") == 0:
+        params["request_cache"] = True
+    return params
@@ -1,8 +1,11 @@
 from datetime import datetime
 from typing import Dict, List
-from elasticsearch import Elasticsearch
 from app.schemas.rds import RDSEvent, RDSDetectionRequest
 from app.ext.error import ElasticsearchError
+from app.models.index_manager import index_manager
+from app.models.es_client import es
+from app.models.data_version import data_versions
+from app.models.query_builder import filter_query, search_body, search_params, term, time_range
 from logging import getLogger
 from functools import wraps
 import os
@@ -18,47 +21,17 @@ except Exception as e:
     logger.error(f"Error loading .env file: {str(e)}")
     raise
 
-# Create Elasticsearch instance
-es = Elasticsearch(
-    [{'host': os.getenv('ES_HOST'), 'port': int(os.getenv('ES_PORT')), 'scheme': os.getenv('ES_SCHEME')}],
-    http_auth=(os.getenv('ES_USER'), os.getenv('ES_PASSWORD'))
-)
-
 def get_index_name():
     """Get the index name for the current month."""
-    return f"{datetime.now().strftime('%Y_%m')}_rds_data"
+    return index_manager.index_name("rds")
 
-def create_index_with_mapping():
-    """Create an Elasticsearch index with the appropriate mapping for RDS data."""
-    index_name = get_index_name()
-    if not es.indices.exists(index=index_name):
-        mapping = {
-            "mappings": {
-                "properties": {
-                    "timestamp": {"type": "date"},
-                    "account": {"type": "keyword"},
-                    "edge_name": {"type": "keyword"},
-                    "edge_ip": {"type": "ip"},
-                    "edge_mac": {"type": "keyword"},
-                    "edge_os": {"type": "keyword"},
-                    "edge_ssid": {"type": "keyword"},
-                    "edge_dns_gateway": {"type": "ip"},
-                    "tag_id": {"type": "keyword"},
-                    "tag": {"type": "keyword"},
-                    "file_hash": {"type": "keyword"},
-                    "file_name": {"type": "keyword"},
-                    "file_path": {"type": "keyword"},
-                    "score": {"type": "keyword"},
-                    "data_type": {"type": "keyword"}
-                }
-            }
-        }
-        try:
-            es.indices.create(index=index_name, body=mapping)
-        except Exception as e:
-            logger.error(f"Error creating index {index_name}: {str(e)}")
-            raise ElasticsearchError(f"Error creating index: {str(e)}")
-    return index_name
+async def create_index_with_mapping():
+    """Return the current month's RDS index, creating it with the RDS mapping on first use."""
+    try:
+        return await index_manager.ensure("rds")
+    except Exception as e:
+        logger.error(f"Error creating RDS index: {str(e)}")
+        raise ElasticsearchError(f"Error creating index: {str(e)}")
 
 def handle_es_exceptions(func):
     """Decorator to handle Elasticsearch exceptions."""
@@ -111,6 +84,10 @@ class RDSModel:
             "data_type": [self.data_type]
         }
 
+    def to_bulk_action(self, index_name: str) -> Dict:
+        """Build a `_bulk` index action for this detection."""
+        return {"_op_type": "index", "_index": index_name, "_source": self.to_dict()}
+
     @staticmethod
     def format_es_doc(doc: Dict) -> Dict:
         """Format Elasticsearch document by taking first value from arrays."""
@@ -136,14 +113,16 @@ class RDSModel:
     @handle_es_exceptions
     async def save_detection(detection: RDSDetectionRequest) -> int:
         """Save RDS detection events to Elasticsearch."""
-        index_name = create_index_with_mapping()
+        index_name = await create_index_with_mapping()
         events_saved = 0
 
         try:
             for event in detection.event:
                 rds_model = RDSModel(detection, event)
-                es.index(index=index_name, body=rds_model.to_dict())
+                await es.index(index=index_name, body=rds_model.to_dict())
                 events_saved += 1
+            if events_saved:
+                data_versions.bump(["rds"], [index_name])
             
             logger.info(f"Successfully saved {events_saved} RDS detection events")
             return events_saved
@@ -155,41 +134,21 @@ class RDSModel:
     @handle_es_exceptions
     async def get_detections(start_time: datetime, end_time: datetime, account: str = None) -> List[Dict]:
         """Retrieve RDS detections within a time range, optionally filtered by account."""
-        query = {
-            "bool": {
-                "must": [
-                    {
-                        "terms": {
-                            "data_type": ["rds_detection"]
-                        }
-                    },
-                    {
-                        "range": {
-                            "timestamp": {
-                                "gte": start_time.isoformat(),
-                                "lte": end_time.isoformat()
-                            }
-                        }
-                    }
-                ]
-            }
-        }
-
-        if account:
-            query["bool"]["must"].append({
-                "terms": {
-                    "account": [account]
-                }
-            })
+        body = search_body(
+            filter_query(
+                {"terms": {"data_type": ["rds_detection"]}},
+                time_range(start_time, end_time),
+                term("account", account)
+            ),
+            size=10000,
+            sort=[{"timestamp": {"order": "desc"}}]
+        )
 
         try:
-            result = es.search(
-                index=get_index_name(),
-                body={
-                    "query": query,
-                    "sort": [{"timestamp": {"order": "desc"}}],
-                    "size": 10000
-                }
+            result = await es.search(
+                index=await index_manager.indices_for_range("rds", start_time, end_time),
+                body=body,
+                **search_params(body)
             )
             # Format the documents to handle array values
             return [RDSModel.format_es_doc(hit["_source"]) for hit in result["hits"]["hits"]]
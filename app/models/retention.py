@@ -0,0 +1,215 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from elasticsearch import AsyncElasticsearch
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.models.es_client import es
+from app.models.index_manager import index_manager
+from app.models.bulk_db import BulkIngestEngine
+from app.models.rollup import EventRollups, ROLLUP_DIMENSIONS, event_rollups, floor_to
+from app.models.data_version import data_versions, GLOBAL_SCOPE
+from app.tools.backfill_rule_description import MISSING_RULE_DESCRIPTION_KEYWORD_QUERY
+import asyncio
+import os
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+RAW_EVENTS_QUERY = {"term": {"wazuh_data_type": "wazuh_events"}}
+
+class RetentionCompactor:
+    """
+    Downsamples old raw events. Day by day up to `raw_days` ago, hourly and daily rollups are rebuilt
+    from the raw events, the day is recorded as compacted so queries read it from rollups, and raw
+    events below `keep_min_level` are deleted. High-level events stay verbatim for the event tables.
+    A day whose events still lack rule_description.keyword is not compacted, since its rollups would
+    lose the description; over-length descriptions, which never get the subfield, are flagged at
+    ingest or by the backfill and are rolled up without a description. Every step can be re-run; raw events are deleted for the days compacted in
+    the run plus the `delete_catch_up_days` before them, so a run interrupted between recording and
+    deleting is finished by the next one.
+    """
+    def __init__(self, es: AsyncElasticsearch, rollups: EventRollups, engine: BulkIngestEngine, raw_days: int = 90,
+                 keep_min_level: int = 8, interval: int = 86400, page_size: int = 1000, delete_catch_up_days: int = 3):
+        self.es = es
+        self.rollups = rollups
+        self.engine = engine
+        self.raw_days = raw_days
+        self.keep_min_level = keep_min_level
+        self.interval = interval
+        self.page_size = page_size
+        self.delete_catch_up_days = delete_catch_up_days
+        self._task: Optional[asyncio.Task] = None
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        return floor_to((now or datetime.utcnow()) - timedelta(days=self.raw_days), "1d")
+
+    async def run_once(self, now: Optional[datetime] = None, dry_run: bool = False) -> Dict:
+        """Compact every whole day older than the cutoff that is not compacted yet, then delete raw events."""
+        await self.rollups.load_state()
+        cutoff = self.cutoff(now)
+        day = self.rollups.compacted_until or await self._oldest_event_day()
+        summary = {"cutoff": cutoff.isoformat(), "days": 0, "rollups": 0, "deleted": 0}
+        if day is None:
+            return summary
+
+        compacted_from = self.rollups.compacted_from or day
+        delete_from = max(compacted_from, day - timedelta(days=self.delete_catch_up_days))
+        while day < cutoff:
+            next_day = day + timedelta(days=1)
+            missing = await self._count_missing_keyword(day, next_day)
+            if missing:
+                # Days are compacted in order, so later days wait as well
+                logger.warning(f"Not compacting {day:%Y-%m-%d} onwards: {missing} events lack rule_description.keyword, "
+                               f"run python -m app.tools.backfill_rule_description")
+                summary["blocked"] = day.isoformat()
+                break
+            if dry_run:
+                logger.info(f"Would compact {day:%Y-%m-%d}")
+            else:
+                summary["rollups"] += await self._rebuild_rollups(day, next_day)
+                await self.rollups.record_compaction(compacted_from, next_day, self.keep_min_level)
+                logger.info(f"Compacted events of {day:%Y-%m-%d} into rollups")
+            summary["days"] += 1
+            day = next_day
+
+        if not dry_run and self.rollups.compacted_until is not None and delete_from < self.rollups.compacted_until:
+            summary["deleted"] = await self._delete_raw(delete_from, self.rollups.compacted_until)
+        if summary["days"] and not dry_run:
+            data_versions.bump([GLOBAL_SCOPE])
+        return summary
+
+    async def _oldest_event_day(self) -> Optional[datetime]:
+        result = await self.es.search(
+            index=index_manager.families["agents"].pattern,
+            body={"size": 0, "query": RAW_EVENTS_QUERY, "aggs": {"oldest": {"min": {"field": "timestamp"}}}},
+            ignore_unavailable=True
+        )
+        oldest = result['aggregations']['oldest'].get('value_as_string')
+        if not oldest:
+            return None
+        return floor_to(datetime.fromisoformat(oldest.replace("Z", "+00:00")).replace(tzinfo=None), "1d")
+
+    async def _count_missing_keyword(self, start: datetime, end: datetime) -> int:
+        """Raw events of [start, end) indexed before rule_description.keyword was mapped and not backfilled yet (over-length ones excluded)."""
+        query = {
+            "bool": {
+                "filter": [MISSING_RULE_DESCRIPTION_KEYWORD_QUERY,
+                           {"range": {"timestamp": {"gte": start.isoformat(), "lt": end.isoformat()}}}]
+            }
+        }
+        indices = await index_manager.indices_for_range("agents", start, end)
+        result = await self.es.count(index=indices, query=query, ignore_unavailable=True)
+        return result["count"]
+
+    async def _rebuild_rollups(self, start: datetime, end: datetime) -> int:
+        """Overwrite the hourly and daily rollups of [start, end) with counts from the raw events."""
+        query = {
+            "bool": {
+                "filter": [RAW_EVENTS_QUERY, {"range": {"timestamp": {"gte": start.isoformat(), "lt": end.isoformat()}}}],
+                "must_not": [{"exists": {"field": "rollup_interval"}}]
+            }
+        }
+        indices = await index_manager.indices_for_range("agents", start, end)
+        rollup_index = await index_manager.ensure("rollups", start)
+        written = 0
+        for interval in ("1h", "1d"):
+            sources = [{"bucket": {"date_histogram": {"field": "timestamp", "fixed_interval": interval}}}]
+            sources += [
+                {dimension: {"terms": {"field": "rule_description.keyword" if dimension == "rule_description" else dimension,
+                                       "missing_bucket": True}}}
+                for dimension in ROLLUP_DIMENSIONS
+            ]
+            after_key = None
+            while True:
+                composite = {"size": self.page_size, "sources": sources}
+                if after_key:
+                    composite["after"] = after_key
+                result = await self.es.search(index=indices, body={"size": 0, "query": query, "aggs": {"rollup": {"composite": composite}}},
+                                              ignore_unavailable=True)
+                rollup = result['aggregations']['rollup']
+                actions = []
+                for bucket in rollup['buckets']:
+                    key = bucket['key']
+                    bucket_start = datetime.fromtimestamp(key['bucket'] / 1000, tz=timezone.utc).replace(tzinfo=None)
+                    dimensions = tuple(key[dimension] for dimension in ROLLUP_DIMENSIONS)
+                    doc_id, document = EventRollups.rollup_document(interval, bucket_start, dimensions, bucket['doc_count'])
+                    actions.append({"_op_type": "index", "_index": rollup_index, "_id": doc_id, "_source": document})
+                bulk_result = await self.engine.bulk(actions)
+                if bulk_result.failed:
+                    # Stop before the day is recorded as compacted and its raw events are deleted
+                    raise RuntimeError(f"{bulk_result.failed} rollup documents of {start:%Y-%m-%d} failed to index")
+                written += len(actions)
+                after_key = rollup.get('after_key')
+                if not after_key or len(rollup['buckets']) < self.page_size:
+                    break
+        return written
+
+    async def _delete_raw(self, start: datetime, end: datetime) -> int:
+        """Delete compacted raw events below the kept level and expunge them from the affected indices."""
+        query = {
+            "bool": {
+                "filter": [
+                    RAW_EVENTS_QUERY,
+                    {"range": {"timestamp": {"gte": start.isoformat(), "lt": end.isoformat()}}},
+                    {"range": {"rule_level": {"lt": self.keep_min_level}}}
+                ]
+            }
+        }
+        deleted = 0
+        for index_name in await index_manager.indices_for_range("agents", start, end):
+            result = await self.es.options(request_timeout=3600, ignore_status=404).delete_by_query(
+                index=index_name, query=query, conflicts="proceed", slices="auto"
+            )
+            if not result.get("deleted"):
+                continue
+            deleted += result["deleted"]
+            logger.info(f"Deleted {result['deleted']} compacted raw events from {index_name}")
+            try:
+                # Only indices that lost events are refreshed and merged
+                await self.es.indices.refresh(index=index_name)
+                await self.es.options(request_timeout=3600).indices.forcemerge(index=index_name, only_expunge_deletes=True)
+            except Exception as e:
+                logger.warning(f"Could not expunge deleted events from {index_name}: {str(e)}")
+        return deleted
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                summary = await self.run_once()
+                logger.info(f"Retention compaction finished: {summary}")
+            except Exception as e:
+                logger.error(f"Retention compaction failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+# Background compaction, enabled with RETENTION_ENABLED=true; also runnable with app/tools/compact_events.py
+RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'false').lower() == 'true'
+
+retention_compactor = RetentionCompactor(
+    es,
+    event_rollups,
+    BulkIngestEngine(es, chunk_size=int(os.getenv('ES_BULK_CHUNK_SIZE', 500))),
+    raw_days=int(os.getenv('RETENTION_RAW_DAYS', 90)),
+    keep_min_level=int(os.getenv('RETENTION_KEEP_MIN_LEVEL', 8)),
+    interval=int(os.getenv('RETENTION_INTERVAL', 86400)),
+    delete_catch_up_days=int(os.getenv('RETENTION_DELETE_CATCH_UP_DAYS', 3))
+)
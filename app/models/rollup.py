@@ -0,0 +1,374 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import defaultdict
+from elasticsearch import AsyncElasticsearch, ConflictError, NotFoundError
+from elastic_transport import ObjectApiResponse
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.models.es_client import es
+from app.models.index_manager import index_manager
+from app.models.bulk_db import BulkIngestEngine
+from app.models.data_version import data_versions
+from app.models.query_builder import round_bounds
+import asyncio
+import hashlib
+import json
+import os
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+# Event fields a rollup document is keyed by; agent_name, rule_description and rule_mitre_id follow
+# from agent_id and rule_id and are kept so the widgets can aggregate rollups like raw events
+ROLLUP_DIMENSIONS = (
+    "group_name", "agent_id", "agent_name", "rule_id", "rule_level", "rule_description",
+    "rule_mitre_id", "rule_mitre_tactic", "rule_mitre_technique"
+)
+
+ROLLUP_INTERVALS = {"1h": timedelta(hours=1), "1d": timedelta(days=1)}
+
+ROLLUP_ENABLED = os.getenv('ROLLUP_ENABLED', 'true').lower() == 'true'
+# Windows shorter than this are always answered from raw events
+ROLLUP_MIN_WINDOW = timedelta(hours=int(os.getenv('ROLLUP_MIN_WINDOW_HOURS', 6)))
+
+def to_utc(when: datetime) -> datetime:
+    """Naive UTC datetime; naive input is taken as UTC like Elasticsearch does."""
+    if when.tzinfo is not None:
+        return when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+def floor_to(when: datetime, interval: str) -> datetime:
+    when = when.replace(minute=0, second=0, microsecond=0)
+    return when.replace(hour=0) if interval == "1d" else when
+
+def ceil_to(when: datetime, interval: str) -> datetime:
+    floored = floor_to(when, interval)
+    return floored if floored == when else floored + ROLLUP_INTERVALS[interval]
+
+class EventRollups:
+    """
+    Per-hour and per-day event counters keyed by ROLLUP_DIMENSIONS. Ingested events are counted in
+    memory and flushed every `flush_interval` seconds as scripted upserts into the monthly rollup index,
+    so ingest does not pay a write per event. Rollups cover events ingested from `covered_since` on,
+    which is recorded in Elasticsearch the first time any worker starts, and the range the retention
+    job has compacted (`compacted_from` to `compacted_until`), where raw events below the kept level are gone.
+    """
+    STATE_ID = "coverage"
+
+    def __init__(self, es: AsyncElasticsearch, engine: BulkIngestEngine, state_index: str, enabled: bool = True,
+                 flush_interval: int = 10, max_pending_keys: int = 50000):
+        self.es = es
+        self.engine = engine
+        self.state_index = state_index
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_pending_keys = max_pending_keys
+        self.covered_since: Optional[datetime] = None
+        self.compacted_from: Optional[datetime] = None
+        self.compacted_until: Optional[datetime] = None
+        # Raw events at or above this level are kept in the compacted range
+        self.compacted_min_level: Optional[int] = None
+        self._pending: Dict[Tuple, int] = defaultdict(int)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, documents: Iterable[Dict]) -> None:
+        """Count indexed event documents; other document types are ignored."""
+        if not self.enabled:
+            return
+        for document in documents:
+            if document.get("wazuh_data_type") != "wazuh_events" or "rollup_interval" in document:
+                continue
+            try:
+                timestamp = to_utc(datetime.fromisoformat(str(document["timestamp"]).replace("Z", "+00:00")))
+            except (KeyError, ValueError):
+                continue
+            key = tuple(document.get(dimension) for dimension in ROLLUP_DIMENSIONS)
+            if document.get("rule_description_overlength"):
+                # Counted without a description, as rollups rebuilt from raw events are: those aggregate rule_description.keyword
+                key = tuple(None if dimension == "rule_description" else value for dimension, value in zip(ROLLUP_DIMENSIONS, key))
+            for interval in ROLLUP_INTERVALS:
+                self._pending[(interval, floor_to(timestamp, interval), key)] += 1
+        if len(self._pending) >= self.max_pending_keys and self._wakeup is not None:
+            self._wakeup.set()
+
+    def regions(self) -> List[Tuple[datetime, datetime, bool]]:
+        """Ranges answerable from rollups as (start, end, raw events still complete)."""
+        regions = []
+        if self.compacted_from is not None and self.compacted_until is not None:
+            regions.append((self.compacted_from, self.compacted_until, False))
+        if self.enabled and self.covered_since is not None:
+            # Hours that may still have counters in another worker's memory are read raw
+            settled = datetime.utcnow() - timedelta(seconds=2 * self.flush_interval)
+            regions.append((max(self.covered_since, self.compacted_until or self.covered_since), settled, True))
+        return regions
+
+    async def start(self) -> None:
+        await self.load_state()
+        if not self.enabled or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write the counters still in memory."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Also picks up ranges compacted by the retention job in another process
+            await self.load_state()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        counters, self._pending = self._pending, defaultdict(int)
+        entries = list(counters.items())
+        try:
+            for month in {bucket.replace(day=1, hour=0) for (_, bucket, _), _ in entries}:
+                await index_manager.ensure("rollups", month)
+            actions = [self._to_action(*entry) for entry in entries]
+            result = await self.engine.bulk(actions)
+            failed = [entry for entry, ok in zip(entries, result.items) if not ok]
+            # Rollup-backed widgets change when the counters land, not when the events were indexed
+            data_versions.bump((dimensions[0] for ((_, _, dimensions), _), ok in zip(entries, result.items) if ok),
+                               {action["_index"] for action in actions})
+        except Exception as e:
+            logger.error(f"Flushing {len(entries)} rollup counters failed: {str(e)}")
+            failed = entries
+        # Failed upserts were not applied; merge them back so the next flush retries them
+        for (key, count) in failed:
+            self._pending[key] += count
+
+    @staticmethod
+    def rollup_document(interval: str, bucket: datetime, dimensions: Tuple, count: int) -> Tuple[str, Dict]:
+        """Deterministic id and source of the rollup document for one counter."""
+        document = dict(zip(ROLLUP_DIMENSIONS, dimensions))
+        document.update({
+            "timestamp": bucket.isoformat(),
+            "rollup_interval": interval,
+            "wazuh_data_type": "wazuh_events",
+            "event_count": count
+        })
+        doc_id = hashlib.sha1(json.dumps([interval, bucket.isoformat(), list(dimensions)]).encode()).hexdigest()
+        return doc_id, document
+
+    @staticmethod
+    def _to_action(key: Tuple, count: int) -> Dict:
+        interval, bucket, dimensions = key
+        doc_id, document = EventRollups.rollup_document(interval, bucket, dimensions, count)
+        return {
+            "_op_type": "update",
+            "_index": index_manager.index_name("rollups", bucket),
+            "_id": doc_id,
+            "retry_on_conflict": 5,
+            "script": {"source": "ctx._source.event_count += params.count", "lang": "painless", "params": {"count": count}},
+            "upsert": document
+        }
+
+    async def load_state(self) -> None:
+        try:
+            try:
+                response = await self.es.get(index=self.state_index, id=self.STATE_ID)
+            except NotFoundError:
+                if not self.enabled:
+                    return
+                # Counting starts now, so only the next full hour is complete
+                since = ceil_to(datetime.utcnow(), "1h")
+                try:
+                    await self.es.create(index=self.state_index, id=self.STATE_ID, document={"since": since.isoformat()})
+                except ConflictError:
+                    pass
+                response = await self.es.get(index=self.state_index, id=self.STATE_ID)
+            state = response["_source"]
+            self.covered_since = datetime.fromisoformat(state["since"]) if state.get("since") else None
+            if state.get("compacted_from") and state.get("compacted_until"):
+                self.compacted_from = datetime.fromisoformat(state["compacted_from"])
+                self.compacted_until = datetime.fromisoformat(state["compacted_until"])
+                self.compacted_min_level = state.get("compacted_min_level")
+        except Exception as e:
+            logger.warning(f"Could not load rollup state: {str(e)}")
+
+    async def record_compaction(self, compacted_from: datetime, compacted_until: datetime, min_level: int) -> None:
+        """Mark [compacted_from, compacted_until) as answerable from rollups only, with raw events kept from `min_level` up."""
+        await self.es.update(
+            index=self.state_index,
+            id=self.STATE_ID,
+            doc={"compacted_from": compacted_from.isoformat(), "compacted_until": compacted_until.isoformat(),
+                 "compacted_min_level": min_level},
+            doc_as_upsert=True,
+            refresh=True
+        )
+        self.compacted_from, self.compacted_until = compacted_from, compacted_until
+        self.compacted_min_level = min_level
+
+class RollupWindow:
+    """
+    Query plan for a time window: sub-hour edges are read from raw events and the aligned middle
+    from hourly or daily rollups, in one search. Counting aggregations sum `event_count` with raw
+    events counting as 1, and `normalize_counts` folds the sums back into `doc_count`.
+    """
+    def __init__(self, start_time: datetime, end_time: datetime, segments: Optional[List[Tuple]] = None):
+        self.start_time = start_time
+        self.end_time = end_time
+        self.segments = segments or []
+
+    @property
+    def uses_rollups(self) -> bool:
+        return any(interval for interval, _, _ in self.segments)
+
+    def time_filter(self, inclusive_end: bool = True) -> Dict:
+        end_operator = "lte" if inclusive_end else "lt"
+        if not self.uses_rollups:
+            return {"range": {"timestamp": {"gte": self.start_time.isoformat(), end_operator: self.end_time.isoformat()}}}
+        segments = list(self.segments)
+        last_interval, _, last_end = segments[-1]
+        if inclusive_end and last_interval:
+            # A rollup bucket starting at the end would cover time after it; read that instant raw
+            segments.append((None, last_end, last_end))
+        should = []
+        for position, (interval, start, end) in enumerate(segments):
+            operator = end_operator if position == len(segments) - 1 and not interval else "lt"
+            time_range = {"range": {"timestamp": {"gte": start.isoformat(), operator: end.isoformat()}}}
+            if interval:
+                should.append({"bool": {"filter": [{"term": {"rollup_interval": interval}}, time_range]}})
+            else:
+                should.append({"bool": {"filter": [time_range], "must_not": [{"exists": {"field": "rollup_interval"}}]}})
+        return {"bool": {"should": should, "minimum_should_match": 1}}
+
+    def counted(self, aggs: Dict) -> Dict:
+        """Add an `events` sum to every bucket aggregation in `aggs` and order terms by it."""
+        if not self.uses_rollups:
+            return aggs
+        counted_aggs = {}
+        for name, agg in aggs.items():
+            agg = dict(agg)
+            if "terms" in agg:
+                terms = dict(agg["terms"])
+                if terms.get("order", {"_count": "desc"}) == {"_count": "desc"}:
+                    terms["order"] = {"events": "desc"}
+                agg["terms"] = terms
+            if any(kind in agg for kind in ("terms", "date_histogram", "date_range", "filter", "filters")):
+                sub_aggs = self.counted(agg.get("aggs", {}))
+                sub_aggs["events"] = {"sum": {"field": "event_count", "missing": 1}}
+                agg["aggs"] = sub_aggs
+            counted_aggs[name] = agg
+        return counted_aggs
+
+    async def indices(self, family: str = "agents") -> List[str]:
+        indices = await index_manager.indices_for_range(family, self.start_time, self.end_time)
+        if self.uses_rollups:
+            indices += await index_manager.indices_for_range("rollups", self.start_time, self.end_time)
+        return indices
+
+def normalize_counts(node):
+    """Replace `doc_count` by the `events` sum wherever a rollup-aware aggregation added one."""
+    if isinstance(node, ObjectApiResponse):
+        # Search responses wrap their body, which is what holds the aggregations
+        normalize_counts(node.body)
+    elif isinstance(node, dict):
+        if "events" in node and "doc_count" in node:
+            node["doc_count"] = int(node["events"]["value"] or 0)
+        for value in node.values():
+            normalize_counts(value)
+    elif isinstance(node, list):
+        for value in node:
+            normalize_counts(value)
+    return node
+
+# Shared counters fed by the event ingest paths
+event_rollups = EventRollups(
+    es,
+    BulkIngestEngine(es, chunk_size=int(os.getenv('ES_BULK_CHUNK_SIZE', 500)), refresh_threshold=10 ** 9),
+    state_index=os.getenv('ROLLUP_STATE_INDEX', 'event_rollup_state'),
+    enabled=ROLLUP_ENABLED,
+    flush_interval=int(os.getenv('ROLLUP_FLUSH_INTERVAL', 10)),
+    max_pending_keys=int(os.getenv('ROLLUP_MAX_PENDING_KEYS', 50000))
+)
+
+def _split_days(start: datetime, end: datetime, finest: str) -> List[Tuple]:
+    """Cover an hour-aligned range with hourly rollups, using daily ones for whole days when allowed."""
+    days_start, days_end = ceil_to(start, "1d"), floor_to(end, "1d")
+    if finest != "1d" or days_end <= days_start:
+        return [("1h", start, end)]
+    segments = []
+    if start < days_start:
+        segments.append(("1h", start, days_start))
+    segments.append(("1d", days_start, days_end))
+    if days_end < end:
+        segments.append(("1h", days_end, end))
+    return segments
+
+def raw_window_start(start_time: datetime, min_level: Optional[int] = None) -> datetime:
+    """
+    Start of the part of a window whose raw events are all still there, for widgets that read raw
+    hits and so cannot use rollups. In the compacted range only events from the kept level up remain,
+    so unless the widget only reads events from `min_level` up, its window starts after that range.
+    """
+    compacted_until = event_rollups.compacted_until
+    if compacted_until is None or to_utc(start_time) >= compacted_until:
+        return start_time
+    kept_level = event_rollups.compacted_min_level
+    if min_level is not None and kept_level is not None and min_level >= kept_level:
+        return start_time
+    return compacted_until.replace(tzinfo=timezone.utc) if start_time.tzinfo is not None else compacted_until
+
+def plan_window(start_time: datetime, end_time: datetime, finest: Optional[str] = "1d") -> RollupWindow:
+    """
+    Decide how to answer a window. `finest` is the coarsest rollup interval the widget can use
+    ("1d", "1h" or None for raw only). In the compacted range rollups are always used and the window
+    edges are widened to whole hours; elsewhere windows shorter than ROLLUP_MIN_WINDOW stay raw and
+    only the whole hours inside the window are read from rollups. The window is rounded like every
+    other query (see query_builder.round_bounds).
+    """
+    start_time, end_time = round_bounds(start_time, end_time)
+    raw = RollupWindow(start_time, end_time)
+    if finest is None:
+        return raw
+
+    start, end = to_utc(start_time), to_utc(end_time)
+    segments = []
+    cursor = start
+    for region_start, region_end, exact in event_rollups.regions():
+        if region_end <= cursor or region_start >= end:
+            continue
+        if exact:
+            if end - start < ROLLUP_MIN_WINDOW:
+                continue
+            rollup_start = ceil_to(max(cursor, region_start), "1h")
+            rollup_end = floor_to(min(end, region_end), "1h")
+            if rollup_end - rollup_start < timedelta(hours=1):
+                continue
+        else:
+            rollup_start = floor_to(max(cursor, region_start), "1h")
+            rollup_end = min(ceil_to(min(end, region_end), "1h"), region_end)
+        if cursor < rollup_start:
+            segments.append((None, cursor, rollup_start))
+        segments.extend(_split_days(rollup_start, rollup_end, finest))
+        cursor = max(cursor, rollup_end)
+    if not segments:
+        return raw
+    if cursor < end:
+        segments.append((None, cursor, end))
+    return RollupWindow(start_time, end_time, segments)
@@ -0,0 +1,78 @@
+from typing import Any, Awaitable, Callable, Dict, List
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.models.es_client import es
+from app.tools.cache import response_versions
+import asyncio
+import hashlib
+import json
+import os
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in flight, later callers with the
+    same key await its result instead of starting their own. The call runs in its own task, so a caller
+    that is cancelled (e.g. a client disconnect) does not cancel it for the others. Results are shared
+    between the callers and must be treated as read-only.
+    """
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await call()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+            self.leaders += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {"enabled": self.enabled, "in_flight": len(self._inflight), "leaders": self.leaders, "shared": self.shared}
+
+def request_key(operation: str, index: Any, body: Any, params: Dict) -> str:
+    """Key of a read request; index order and dict key order do not matter."""
+    indices = sorted(index) if isinstance(index, (list, tuple)) else index
+    payload = json.dumps([operation, indices, body, params, response_versions.get()], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+# Shared by every read path of the dashboard, agent and wazuh models
+single_flight = SingleFlight(enabled=SINGLE_FLIGHT_ENABLED)
+
+async def coalesced_search(index: Any = None, body: Dict = None, **params):
+    return await single_flight.do(request_key("search", index, body, params),
+                                  lambda: es.search(index=index, body=body, **params))
+
+async def coalesced_count(index: Any = None, body: Dict = None, **params):
+    return await single_flight.do(request_key("count", index, body, params),
+                                  lambda: es.count(index=index, body=body, **params))
+
+async def coalesced_msearch(searches: List[Dict], **params):
+    return await single_flight.do(request_key("msearch", None, searches, params),
+                                  lambda: es.msearch(searches=searches, **params))
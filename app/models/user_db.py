@@ -1,14 +1,18 @@
 import os
-from sqlalchemy import create_engine, Column, String, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from app.ext.error import ElasticsearchError, UserExistedError, AuthControllerError
+from app.ext.error import ElasticsearchError, UserExistedError, AuthControllerError, PermissionError
 from app.tools.email import EmailNotification
+from app.tools.cache import invalidate_principal, group_cache, GROUP_CACHE_TTL
+from app.models import query_builder
 from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List, Optional
 from logging import getLogger
 from sqlalchemy import select
 import threading
@@ -20,10 +24,33 @@ logger = getLogger('app_logger')
 # Load environment variables from .env file
 load_dotenv()
 
+# Async drivers for the synchronous URLs DATABASE_URL may hold
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "mysql+pymysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(url: str) -> str:
+    """DATABASE_URL with its driver swapped for the async one, e.g. mysql+pymysql -> mysql+aiomysql."""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)).render_as_string(hide_password=False)
+
+def engine_options(url: str) -> Dict:
+    options = {
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    }
+    # SQLite (local testing) does not use a sized connection pool
+    if not make_url(url).drivername.startswith("sqlite"):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", 10)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 20)),
+            pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", 30)),
+        )
+    return options
+
 # Database setup
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(os.getenv("DATABASE_URL"))
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+# Objects stay readable after commit, since they are used after the session is closed
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 class UserSignup(Base):
@@ -49,7 +76,13 @@ class GroupSignup(Base):
     update_date = Column(DateTime, server_default=func.now(), onupdate=func.now())
     user = relationship("UserSignup", back_populates="groups")
 
-Base.metadata.create_all(bind=engine)
+async def init_db() -> None:
+    """Create the missing tables; run once at startup instead of at import."""
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+async def close_db() -> None:
+    await engine.dispose()
 
 class UserModel:
     
@@ -61,33 +94,32 @@ class UserModel:
         self.user_role = user_role
         
     @staticmethod
-    def get_user_groups(user_id: int) -> List[str]:
+    async def get_user_groups(user_id: int) -> List[str]:
+        """Group names of the user, from the group cache when possible."""
+        if GROUP_CACHE_TTL > 0:
+            hit, cached = group_cache.get("groups", user_id)
+            if hit:
+                return list(cached)
         try:
-            session = SessionLocal()
-            stmt = select(GroupSignup.group_name).join(UserSignup.groups).where(UserSignup.id == user_id)
-            result = session.execute(stmt)
-            groups = [row[0] for row in result]
-            session.close()
-            return groups
+            async with SessionLocal() as session:
+                stmt = select(GroupSignup.group_name).join(UserSignup.groups).where(UserSignup.id == user_id)
+                result = await session.execute(stmt)
+                groups = [row[0] for row in result]
         except Exception as e:
             logger.error(f"Error retrieving user groups: {e}")
             raise ElasticsearchError(f'Database error: {e}')
+        if GROUP_CACHE_TTL > 0:
+            group_cache.set(user_id, tuple(groups), GROUP_CACHE_TTL)
+        return groups
 
     @staticmethod
-    def check_user_group(user_id: int, group_name: str) -> bool:
-        try:
-            session = SessionLocal()
-            stmt = select(GroupSignup).join(UserSignup.groups).where(UserSignup.id == user_id, GroupSignup.group_name == group_name)
-            result = session.execute(stmt).first()
-            session.close()
-            has_permission = result is not None
-            logger.info(f"User {user_id} permission check for group {group_name}: {has_permission}")
-            return has_permission
-        except Exception as e:
-            raise 
+    async def check_user_group(user_id: int, group_name: str) -> bool:
+        has_permission = group_name in await UserModel.get_user_groups(user_id)
+        logger.info(f"User {user_id} permission check for group {group_name}: {has_permission}")
+        return has_permission
         
     @staticmethod
-    def create_user_signup(username: str, password: str, email: str, company_name: str, license_amount: int, disabled: bool = True):
+    async def create_user_signup(username: str, password: str, email: str, company_name: str, license_amount: int, disabled: bool = True):
         session = SessionLocal()
         try:
             new_user = UserSignup(
@@ -102,8 +134,10 @@ class UserModel:
                 update_date=func.now()
             )
             session.add(new_user)
-            session.commit()
-            session.refresh(new_user)
+            await session.commit()
+            await session.refresh(new_user)
+            # The username may be cached as unknown
+            invalidate_principal(username)
             
             # Send email notifications in background
             threading.Thread(
@@ -120,7 +154,7 @@ class UserModel:
             ).start()
             
         except IntegrityError as e:
-            session.rollback()
+            await session.rollback()
             if "unique_active_username" in str(e):
                 raise UserExistedError("An active user with this username already exists")
             elif "unique_active_email" in str(e):
@@ -128,39 +162,62 @@ class UserModel:
             else:
                 raise AuthControllerError("An error occurred while creating the user")
         except SQLAlchemyError as e:
-            session.rollback()
+            await session.rollback()
             raise AuthControllerError(f"Database error: {str(e)}")
         finally:
-            session.close()
+            await session.close()
 
     @staticmethod
-    def get_active_user(username: str, email: str):
-        session = SessionLocal()
-        try:
-            user = session.query(UserSignup).filter(
+    async def get_active_user(username: str, email: str):
+        async with SessionLocal() as session:
+            result = await session.execute(select(UserSignup).where(
                 ((UserSignup.username == username) | (UserSignup.email == email)) &
                 (UserSignup.disabled == 0)  
-            ).first()
-            return user
-        finally:
-            session.close()
+            ))
+            return result.scalars().first()
 
     @staticmethod
-    def get_any_user(username: str, email: str):
-        session = SessionLocal()
-        try:
-            user = session.query(UserSignup).filter(
+    async def get_any_user(username: str, email: str):
+        async with SessionLocal() as session:
+            result = await session.execute(select(UserSignup).where(
                 (UserSignup.username == username) | (UserSignup.email == email)
-            ).first()
-            return user
-        finally:
-            session.close()
+            ))
+            return result.scalars().first()
 
     @staticmethod
-    def get_user_by_username(username: str):
-        session = SessionLocal()
-        try:
-            user = session.query(UserSignup).filter(UserSignup.username == username).first()
-            return user
-        finally:
-            session.close()
+    async def get_user_by_username(username: str):
+        async with SessionLocal() as session:
+            result = await session.execute(select(UserSignup).where(UserSignup.username == username))
+            return result.scalars().first()
+
+
+class AuthContext:
+    """
+    Authorization of one request, resolved once by AuthController.get_auth_context: the user, their
+    role, the groups they may read and the matching Elasticsearch group filter. `group_names` and
+    `group_filter` are None for admins, who read every group.
+    """
+
+    def __init__(self, user, group_names: Optional[List[str]] = None):
+        self.user = user
+        self.user_id = user.id
+        self.username = user.username
+        self.role = user.user_role
+        self.is_admin = user.user_role == 'admin'
+        self.group_names: Optional[List[str]] = None if self.is_admin else sorted(group_names or [])
+        self.group_filter: Optional[Dict] = query_builder.groups(self.group_names)
+
+    @classmethod
+    async def resolve(cls, user) -> "AuthContext":
+        return cls(user, None if user.user_role == 'admin' else await UserModel.get_user_groups(user.id))
+
+    def require_groups(self) -> Optional[List[str]]:
+        """Groups to restrict queries to (None for admins); a user without groups may read nothing."""
+        if self.is_admin:
+            return None
+        if not self.group_names:
+            raise PermissionError("Permission denied")
+        return self.group_names
+
+    def can_read(self, group_name: str) -> bool:
+        return self.is_admin or group_name in self.group_names
@@ -1,16 +1,26 @@
 from datetime import datetime
-from typing import Optional, List, Dict, Tuple
-from elasticsearch import Elasticsearch
-from elasticsearch.exceptions import NotFoundError, RequestError
+from typing import AsyncIterator, Optional, List, Dict, Tuple
+from elasticsearch.exceptions import NotFoundError
 import os
 import json
 import logging
 from functools import wraps
 from dotenv import load_dotenv, find_dotenv
 from app.schemas.wazuh import Agent as AgentSchema, WazuhEvent
-from app.ext.error import ElasticsearchError, UserNotFoundError
+from app.ext.error import ElasticsearchError, UserNotFoundError, BadRequestError
 from logging import getLogger
-from app.models.user_db import UserModel
+from app.models.user_db import AuthContext
+from app.models.bulk_db import BulkIngestEngine, BulkResult
+from app.models.index_manager import index_manager, RULE_DESCRIPTION_KEYWORD_MAX
+from app.models.es_client import es
+from app.models.single_flight import coalesced_search, coalesced_count
+from app.models.query_builder import filter_query, groups, search_body, search_params, term, time_range
+from app.models.agent_registry import agent_registry
+from app.models.rollup import event_rollups, plan_window, normalize_counts
+from app.models.alert_feed import alert_feed
+from app.models.data_version import data_versions
+from app.models.pagination import SearchPage, search_page, iterate_pages
+from app.tools.cache import cached_result
 
 # Get the centralized logger
 logger = getLogger('app_logger')
@@ -22,56 +32,48 @@ except Exception as e:
     logger.error(f"Error loading .env file: {str(e)}")
     raise
 
-# Create a single Elasticsearch instance
-es = Elasticsearch(
-    [{'host': os.getenv('ES_HOST'), 'port': int(os.getenv('ES_PORT')), 'scheme': os.getenv('ES_SCHEME')}],
-    http_auth=(os.getenv('ES_USER'), os.getenv('ES_PASSWORD'))
-)
-
 # Maximum number of results to return from Elasticsearch queries
 MAX_RESULTS = 10000
 
-def create_index_with_mapping():
+# Substrings of the reported OS name that identify each OS family, checked in order
+OS_FAMILY_KEYWORDS = (
+    ("windows", ("windows", "microsoft")),
+    ("linux", ("linux", "ubuntu", "centos", "redhat", "debian")),
+    ("macos", ("mac", "darwin")),
+)
+
+def determine_os_family(os_name: Optional[str]) -> str:
+    os_name = (os_name or "").lower()
+    for family, keywords in OS_FAMILY_KEYWORDS:
+        if any(keyword in os_name for keyword in keywords):
+            return family
+    return "other"
+
+# Events fetched per point-in-time page while exporting
+EXPORT_PAGE_SIZE = int(os.getenv('EVENT_EXPORT_PAGE_SIZE', 2000))
+
+# Bulk engine used by the event ingest path
+bulk_engine = BulkIngestEngine(
+    es,
+    chunk_size=int(os.getenv('ES_BULK_CHUNK_SIZE', 500)),
+    max_chunk_bytes=int(os.getenv('ES_BULK_MAX_BYTES', 10 * 1024 * 1024)),
+    refresh_threshold=int(os.getenv('ES_BULK_REFRESH_THRESHOLD', 1000)),
+    max_retries=int(os.getenv('ES_BULK_MAX_RETRIES', 2))
+)
+
+async def create_index_with_mapping():
     """
-    Create an Elasticsearch index with the appropriate mapping for agent and event data.
-    The index name includes the current year and month.
+    Return the current month's index for agent and event data, creating it on first use.
+    Existence is cached by the index manager, so this costs no round-trip once the index is known.
     """
-    index_name = f"{datetime.now().strftime('%Y_%m')}_agents_data"
-    if not es.indices.exists(index=index_name):
-        mapping = {
-            "mappings": {
-                "properties": {
-                    "agent_name": {"type": "keyword"},
-                    "agent_id": {"type": "keyword"},
-                    "ip": {"type": "ip"},
-                    "agent_status": {"type": "keyword"},
-                    "status_code": {"type": "integer"},
-                    "last_keep_alive": {"type": "date"},
-                    "os": {"type": "keyword"},
-                    "os_version": {"type": "keyword"},
-                    "group_name": {"type": "keyword"},
-                    "wazuh_data_type": {"type": "keyword"},
-                    "timestamp": {"type": "date"},
-                    # Event specific fields
-                    "rule_description": {"type": "text"},
-                    "rule_level": {"type": "integer"},
-                    "rule_id": {"type": "keyword"},
-                    "rule_mitre_id": {"type": "keyword"},
-                    "rule_mitre_tactic": {"type": "keyword"},
-                    "rule_mitre_technique": {"type": "keyword"},
-                    "agent_ip": {"type": "ip"}
-                }
-            }
-        }
-        try:
-            es.indices.create(index=index_name, body=mapping)
-        except RequestError as e:
-                logger.error(f"Error creating index {index_name}: {str(e)}")
-                raise
-    return index_name
+    return await index_manager.ensure("agents")
+
+async def get_index_name():
+    return await create_index_with_mapping()
 
-def get_index_name():
-    return create_index_with_mapping()
+async def get_index_names(start_time: datetime, end_time: datetime) -> List[str]:
+    """Existing monthly indices overlapping the requested window, for read queries."""
+    return await index_manager.indices_for_range("agents", start_time, end_time)
 
 def handle_es_exceptions(func):
     @wraps(func)
@@ -99,6 +101,7 @@ class AgentModel:
         self.group_name = agent.group_name
         self.os = agent.os
         self.os_version = agent.os_version
+        self.os_family = determine_os_family(agent.os)
         self.wazuh_data_type = "agent_info"
         self.timestamp = datetime.utcnow() 
         self.registration_time = agent.registration_time
@@ -113,17 +116,23 @@ class AgentModel:
             "registration_time": self.registration_time.isoformat() if self.registration_time else None,
             "os": self.os,
             "os_version": self.os_version,
+            "os_family": self.os_family,
             "group_name": self.group_name, 
             "wazuh_data_type": self.wazuh_data_type,
             "timestamp": self.timestamp.isoformat()
         }
 
+    def to_bulk_action(self, index_name: str) -> Dict:
+        return {"_op_type": "index", "_index": index_name, "_id": f"agent_{self.agent_id}", "_source": self.to_dict()}
+
     @staticmethod
-    def save_to_elasticsearch(agent: 'AgentModel'):
+    async def save_to_elasticsearch(agent: 'AgentModel'):
         try:
-            index_name = get_index_name()
+            index_name = await get_index_name()
             agent_dict = agent.to_dict()
-            result = es.index(index=index_name, id=f"agent_{agent.agent_id}", body=agent_dict)
+            result = await es.index(index=index_name, id=f"agent_{agent.agent_id}", body=agent_dict)
+            agent_registry.record([agent_dict])
+            data_versions.bump([agent_dict.get("group_name")], [index_name])
             return result
         except Exception as e:
             logger.error(f"Error saving agent {agent.agent_id} to Elasticsearch: {str(e)}")
@@ -136,32 +145,13 @@ class AgentModel:
         Load agents from Elasticsearch within a specified time range, optionally filtered by group names.
         """
         try:
-            query = {
-                "query": {
-                    "bool": {
-                        "must": [
-                            {"term": {"wazuh_data_type": "agent_info"}},
-                            {
-                                "range": {
-                                    "timestamp": {
-                                        "gte": start_time.isoformat(),
-                                        "lte": end_time.isoformat(),
-                                        "format": "strict_date_optional_time"
-                                    }
-                                }
-                            }
-                        ]
-                    }
-                },
-                "sort": [{"timestamp": {"order": "desc"}}],
-                "size": MAX_RESULTS
-            }
-
-            if group_names:
-                query["query"]["bool"]["must"].append({"terms": {"group_name": group_names}})
+            query = search_body(
+                filter_query(term("wazuh_data_type", "agent_info"), time_range(start_time, end_time), groups(group_names)),
+                size=MAX_RESULTS,
+                sort=[{"timestamp": {"order": "desc"}}]
+            )
          
-            index_name = get_index_name()
-            response = es.search(index=index_name, body=query)
+            response = await coalesced_search(index=await get_index_names(start_time, end_time), body=query, **search_params(query))
             
             agents = [hit['_source'] for hit in response['hits']['hits']]
             return agents
@@ -170,67 +160,58 @@ class AgentModel:
             raise ElasticsearchError(f"Error loading agents: {str(e)}", 500)
     
     @staticmethod
-    def get_latest_agent_details(group_names: Optional[List[str]] = None) -> List[Dict]:
-        query = {
-            "size": 10000,
-            "_source": [
-                "agent_name",
-                "ip",
-                "os",
-                "agent_status",
-                "last_keep_alive",
-                "registration_time",
-                "group_name"
-            ],
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"wazuh_data_type": "agent_info"}},
-                        {
-                            "range": {
-                                "last_keep_alive": {
-                                    "gte": "2024-09-09T00:00:00" 
-                                }
-                            }
-                        }
-                    ]
+    def build_agent_summary_query(start_time: datetime, end_time: datetime, group_names: Optional[List[str]] = None) -> Dict:
+        distinct_agents = {"cardinality": {"field": "agent_id", "precision_threshold": 40000}}
+        active_agents = {"filter": {"term": {"agent_status": "active"}}, "aggs": {"agents": distinct_agents}}
+        return search_body(
+            filter_query(term("wazuh_data_type", "agent_info"), time_range(start_time, end_time), groups(group_names)),
+            aggs={
+                "agents": distinct_agents,
+                "active": active_agents,
+                "os_family": {
+                    "terms": {"field": "os_family", "size": len(OS_FAMILY_KEYWORDS) + 1},
+                    "aggs": {"agents": distinct_agents, "active": active_agents}
                 }
-            },
-            "sort": [
-                {"last_keep_alive": {"order": "desc"}}
-            ],
-            "collapse": {
-                "field": "agent_id"
             }
+        )
+
+    @staticmethod
+    @cached_result("wazuh.agent_summary", 30)
+    async def load_agent_summary_counts(start_time: datetime, end_time: datetime, group_names: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Count distinct agents reporting within the time range, in total and per OS family, and how many of
+        them were active. Keys are `total`, `active`, `<family>` and `active_<family>`.
+        """
+        query = AgentModel.build_agent_summary_query(start_time, end_time, group_names)
+        try:
+            result = await coalesced_search(index=await get_index_names(start_time, end_time), body=query, **search_params(query))
+        except Exception as e:
+            logger.error(f"Error loading agent summary: {str(e)}")
+            raise ElasticsearchError(f"Error loading agent summary: {str(e)}", 500)
+
+        aggregations = result['aggregations']
+        counts = {
+            "total": aggregations['agents']['value'],
+            "active": aggregations['active']['agents']['value']
         }
+        for bucket in aggregations['os_family']['buckets']:
+            counts[bucket['key']] = bucket['agents']['value']
+            counts[f"active_{bucket['key']}"] = bucket['active']['agents']['value']
+        return counts
 
-        if group_names:
-            query["query"]["bool"]["must"].append({"terms": {"group_name": group_names}})
+    @staticmethod
+    async def get_latest_agent_details(group_names: Optional[List[str]] = None) -> List[Dict]:
+        """Latest agent_info of every agent, read from the in-process agent registry."""
+        agent_details = []
+        default_registration = datetime(2024, 10, 31)
 
-        logger.info(f"Elasticsearch query: {json.dumps(query, indent=2)}")
+        for agent in await agent_registry.agents(group_names):
+            if not agent.get('registration_time'):
+                logger.warning(f"Missing registration_time for agent: {agent.get('agent_name', 'unknown')}, using default value")
+                agent['registration_time'] = default_registration.isoformat()
+            agent_details.append(agent)
 
-        try:
-            index_name = f"{datetime.now().strftime('%Y_%m')}_agents_data"
-            result = es.search(index=index_name, body=query)
-            
-            # Log relevant parts of the Elasticsearch response
-            logger.info(f"Total hits: {result['hits']['total']['value']}")
-            logger.info(f"Max score: {result['hits']['max_score']}")
-            
-            agent_details = []
-            default_registration = datetime(2024, 10, 31)
-            
-            for hit in result['hits']['hits']:
-                source = hit['_source']
-                if not source.get('registration_time'):
-                    logger.warning(f"Missing registration_time for agent: {source.get('agent_name', 'unknown')}, using default value")
-                    source['registration_time'] = default_registration.isoformat()
-                agent_details.append(source)
-                
-            return agent_details
-        except Exception as e:
-            logger.error(f"Error querying Elasticsearch: {str(e)}")
-            raise ElasticsearchError(f"Error loading agents: {str(e)}", 500)
+        return agent_details
         
 class EventModel:
     """
@@ -251,7 +232,7 @@ class EventModel:
         self.group_name = event.group_name
 
     def to_dict(self) -> Dict:
-        return {
+        document = {
             "timestamp": self.timestamp.isoformat(),
             "agent_id": self.agent_id,
             "agent_name": self.agent_name,
@@ -265,38 +246,57 @@ class EventModel:
             "group_name": self.group_name,
             "wazuh_data_type": self.wazuh_data_type
         }
+        if len(self.rule_description or "") > RULE_DESCRIPTION_KEYWORD_MAX:
+            document["rule_description_overlength"] = True
+        return document
+
+    def to_bulk_action(self, index_name: str) -> Dict:
+        return {"_op_type": "index", "_index": index_name, "_source": self.to_dict()}
     
     @staticmethod
-    def save_to_elasticsearch(event: 'EventModel'):
+    async def save_to_elasticsearch(event: 'EventModel'):
         try:
-            index_name = get_index_name()
+            index_name = await get_index_name()
             event_dict = event.to_dict()
             logging.info(f"Saving event: {event_dict}")
-            result = es.index(index=index_name, body=event_dict)
+            result = await es.index(index=index_name, body=event_dict)
             logging.info(f"Event for agent {event.agent_id} saved successfully. Result: {result}")
+            event_rollups.add([event_dict])
+            alert_feed.publish([event_dict])
+            data_versions.bump([event.group_name], [index_name])
             return result
                 
         except Exception as e:
             logging.error(f"Error saving event for agent {event.agent_id} to Elasticsearch: {str(e)}")
             raise ElasticsearchError(f"Error loading agents: {str(e)}", 500)
 
+    @staticmethod
+    async def bulk_save_to_elasticsearch(events: List['EventModel']) -> BulkResult:
+        """
+        Save events with the `_bulk` API. The returned result lists one success flag per event, in order.
+        """
+        try:
+            index_name = await get_index_name()
+            documents = [event.to_dict() for event in events]
+            result = await bulk_engine.index(index_name, documents)
+            indexed = [document for document, ok in zip(documents, result.items) if ok]
+            event_rollups.add(indexed)
+            alert_feed.publish(indexed)
+            data_versions.bump((document.get("group_name") for document in indexed), [index_name])
+            return result
+        except Exception as e:
+            logger.error(f"Error bulk saving {len(events)} events to Elasticsearch: {str(e)}")
+            raise ElasticsearchError(f"Error saving events: {str(e)}", 500)
+
     @staticmethod
     @handle_es_exceptions
     async def load_group_events_from_elasticsearch(group_names: List[str], start_time: datetime, end_time: datetime) -> List[Dict]:
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}},
-                        {"terms": {"group_name": group_names}},
-                        {"term": {"wazuh_data_type": "wazuh_events"}}
-                    ]
-                }
-            },
-            "size": MAX_RESULTS
-        }
+        query = search_body(
+            filter_query(time_range(start_time, end_time), groups(group_names), term("wazuh_data_type", "wazuh_events")),
+            size=MAX_RESULTS
+        )
         try:
-            response = es.search(index=get_index_name(), body=query)
+            response = await coalesced_search(index=await get_index_names(start_time, end_time), body=query, **search_params(query))
             return [hit['_source'] for hit in response['hits']['hits']]
         except Exception as e:
             raise ElasticsearchError(f"Error getting events: {str(e)}")
@@ -304,20 +304,12 @@ class EventModel:
     @staticmethod
     @handle_es_exceptions
     async def load_from_elasticsearch_with_time_range(agent_id: str, start_time: datetime, end_time: datetime) -> List[Dict]:
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}},
-                        {"term": {"agent_id": agent_id}},
-                        {"term": {"wazuh_data_type": "wazuh_events"}}
-                    ]
-                }
-            },
-            "size": MAX_RESULTS
-        }
+        query = search_body(
+            filter_query(time_range(start_time, end_time), term("agent_id", agent_id), term("wazuh_data_type", "wazuh_events")),
+            size=MAX_RESULTS
+        )
         try:
-            response = es.search(index=get_index_name(), body=query)
+            response = await coalesced_search(index=await get_index_names(start_time, end_time), body=query, **search_params(query))
             return [hit['_source'] for hit in response['hits']['hits']]
         except Exception as e:
             raise ElasticsearchError(f"Error getting events: {str(e)}")
@@ -325,178 +317,158 @@ class EventModel:
     @staticmethod
     @handle_es_exceptions
     async def load_all_events_from_elasticsearch(start_time: datetime, end_time: datetime) -> List[Dict]:
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"range": {"timestamp": {"gte": start_time.isoformat(), "lte": end_time.isoformat()}}},
-                        {"term": {"wazuh_data_type": "wazuh_events"}}
-                    ]
-                }
-            },
-            "size": MAX_RESULTS
-        }
+        query = search_body(
+            filter_query(time_range(start_time, end_time), term("wazuh_data_type", "wazuh_events")),
+            size=MAX_RESULTS
+        )
         try:
-            response = es.search(index=get_index_name(), body=query)
+            response = await coalesced_search(index=await get_index_names(start_time, end_time), body=query, **search_params(query))
             return [hit['_source'] for hit in response['hits']['hits']]
         except Exception as e:
             raise ElasticsearchError(f"Error getting events: {str(e)}")
         
+    # Exported event fields, also the CSV column order
+    EXPORT_FIELDS = [
+        "timestamp", "agent_id", "agent_name", "agent_ip", "group_name", "rule_id", "rule_level",
+        "rule_description", "rule_mitre_id", "rule_mitre_tactic", "rule_mitre_technique"
+    ]
+
+    @staticmethod
+    def build_events_query(start_time: datetime, end_time: datetime, group_names: Optional[List[str]] = None) -> Dict:
+        return filter_query(time_range(start_time, end_time), term("wazuh_data_type", "wazuh_events"), groups(group_names))
+
+    @staticmethod
+    async def iter_event_pages(start_time: datetime, end_time: datetime, group_names: Optional[List[str]] = None,
+                               page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[List[Dict]]:
+        """
+        Yield every event in the time range, oldest first, one page of `_source` dicts at a time.
+        Pages come from a single point-in-time, so memory use does not grow with the size of the range.
+        """
+        query = EventModel.build_events_query(start_time, end_time, group_names)
+        indices = await get_index_names(start_time, end_time)
+        pages = iterate_pages(indices, query, [{"timestamp": {"order": "asc"}}], page_size, EventModel.EXPORT_FIELDS)
+        try:
+            async for hits in pages:
+                yield [hit['_source'] for hit in hits]
+        except BadRequestError:
+            raise
+        except Exception as e:
+            raise ElasticsearchError(f"Error exporting events: {str(e)}")
+        finally:
+            await pages.aclose()
+
     @staticmethod
-    async def get_events_in_timerange(current_user: UserModel, start_time: datetime, end_time: datetime, size: int = 10000) -> List[Dict]:
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"wazuh_data_type": "wazuh_events"}},
-                        {
-                            "range": {
-                                "timestamp": {
-                                    "gte": start_time.isoformat(),
-                                    "lt": end_time.isoformat()
-                                }
-                            }
-                        }
-                    ]
+    @cached_result("wazuh.line_chart", 30)
+    async def get_line_chart_aggregations(start_time: datetime, end_time: datetime, interval_starts: List[datetime],
+                                          group_names: Optional[List[str]] = None, size: int = 10) -> List[Dict]:
+        """
+        Count events of the `size` most frequent rule descriptions per interval. Each interval runs from its start
+        to the next one; the last interval is open-ended. Returns terms buckets with an `intervals` range sub-aggregation.
+        Whole hours are read from rollups where they cover the window, so compacted days are counted too.
+        """
+
+        ranges = []
+        for position, interval_start in enumerate(interval_starts):
+            date_range = {"key": str(position), "from": interval_start.isoformat()}
+            if position + 1 < len(interval_starts):
+                date_range["to"] = interval_starts[position + 1].isoformat()
+            ranges.append(date_range)
+
+        window = plan_window(start_time, end_time, "1h")
+        body = search_body(
+            filter_query(
+                term("wazuh_data_type", "wazuh_events"),
+                window.time_filter(inclusive_end=False),
+                groups(group_names)
+            ),
+            aggs=window.counted({
+                "rules": {
+                    "terms": {"field": "rule_description.keyword", "size": size, "exclude": [""]},
+                    "aggs": {"intervals": {"date_range": {"field": "timestamp", "ranges": ranges, "keyed": True}}}
                 }
-            },
-            "size": size,
-            "sort": [
-                {"timestamp": "asc"}
-            ]
-        }
+            })
+        )
         try:
-            if current_user.user_role == 'admin':
-                result = es.search(index=get_index_name(), body=query)
-            else:
-                group_names = UserModel.get_user_groups(current_user.id)
-                permission_granted = UserModel.check_user_group(current_user.id, group_names)
-                if not permission_granted:
-                    return []
-                query["query"]["bool"]["must"].append({"terms": {"group_name": group_names}})
-                result = es.search(index=get_index_name(), body=query)
-            return result['hits']['hits']
+            result = normalize_counts(await coalesced_search(index=await window.indices(), body=body, **search_params(body)))
+            return result.get('aggregations', {}).get('rules', {}).get('buckets', [])
         except Exception as e:
             raise ElasticsearchError(f"Error getting events: {str(e)}")
     
     @staticmethod
-    async def get_high_level_event_count(current_user: UserModel, start_time: datetime, end_time: datetime) -> int:
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {
-                            "range": {
-                                "timestamp": {
-                                    "gte": start_time.isoformat(),
-                                    "lt": end_time.isoformat()
-                                }
-                            }
-                        },
-                        {
-                            "range": {
-                                "rule_level": {
-                                    "gte": 8,
-                                    "lte": 14
-                                }
-                            }
-                        }
-                    ]
-                }
-            }
-        }
+    async def get_high_level_event_count(auth: AuthContext, start_time: datetime, end_time: datetime) -> int:
+        if not auth.is_admin and not auth.group_names:
+            return 0
+        query = {"query": filter_query(
+            time_range(start_time, end_time, inclusive_end=False),
+            {"range": {"rule_level": {"gte": 8, "lte": 14}}},
+            auth.group_filter
+        )}
         try:
-            if current_user.user_role == 'admin':
-                result = es.count(index=get_index_name(), body=query)
-            else:
-                group_names = UserModel.get_user_groups(current_user.id)
-                permission_granted = UserModel.check_user_group(current_user.id, group_names)
-                if not permission_granted:
-                    return "0"
-                query["query"]["bool"]["must"].append({"terms": {"group_name": group_names}})
-                result = es.count(index=get_index_name(), body=query)
+            result = await coalesced_count(index=await get_index_names(start_time, end_time), body=query, ignore_unavailable=True)
             logger.info(f"High-level event count: {result['count']}")
             return result['count']
         except Exception as e:
             raise ElasticsearchError(f"Error getting high-level event count: {str(e)}")
         
     @staticmethod
-    async def get_events_for_pie_chart(current_user: UserModel, start_time: datetime, end_time: datetime, size: int = 10000) -> List[Dict]:
-        query = {
-            "query": {
-                "bool": {   
-                    "must": [
-                        {"term": {"wazuh_data_type": "wazuh_events"}},
-                        {
-                            "range": {
-                                "timestamp": {
-                                    "gte": start_time.isoformat(),
-                                    "lt": end_time.isoformat()
-                                }
-                            }
-                        }
-                    ]
-                }
-            },
-            "size": size,
-            "sort": [
-                {"timestamp": "asc"}
-            ]
-        }
+    @cached_result("wazuh.pie_chart", 30)
+    async def get_pie_chart_aggregations(start_time: datetime, end_time: datetime, group_names: Optional[List[str]] = None, size: int = 10) -> Dict[str, List[Dict]]:
+        """
+        Aggregate the pie chart breakdowns in Elasticsearch: top agents, MITRE techniques and rule descriptions,
+        plus event counts per agent restricted to the top 5 rule descriptions. Returns raw terms buckets.
+        Events indexed before rule_description.keyword was mapped are counted once app/tools/backfill_rule_description.py has run.
+        """
+        window = plan_window(start_time, end_time)
+        body = search_body(
+            filter_query(term("wazuh_data_type", "wazuh_events"), window.time_filter(inclusive_end=False), groups(group_names)),
+            aggs=window.counted({
+                "top_agents": {"terms": {"field": "agent_id", "size": size}},
+                "top_mitre": {"terms": {"field": "rule_mitre_technique", "size": size}},
+                "top_events": {"terms": {"field": "rule_description.keyword", "size": size, "exclude": [""]}}
+            })
+        )
         try:
-            if current_user.user_role == 'admin':
-                result = es.search(index=get_index_name(), body=query)
-            else:
-                group_names = UserModel.get_user_groups(current_user.id)
-                permission_granted = UserModel.check_user_group(current_user.id, group_names)
-                if not permission_granted:
-                    return []
-                query["query"]["bool"]["must"].append({"terms": {"group_name": group_names}})
-                result = es.search(index=get_index_name(), body=query)
-            return result['hits']['hits']
+            indices = await window.indices()
+            result = normalize_counts(await coalesced_search(index=indices, body=body, **search_params(body)))
+            aggregations = result.get('aggregations', {})
+            buckets = {name: aggregations.get(name, {}).get('buckets', []) for name in ("top_agents", "top_mitre", "top_events")}
+
+            # Agents behind the 5 most frequent rule descriptions, counted by a filtered aggregation
+            top_descriptions = [bucket['key'] for bucket in buckets["top_events"][:5]]
+            buckets["top_event_counts"] = []
+            if top_descriptions:
+                body["aggs"] = window.counted({
+                    "top_event_filter": {
+                        "filter": {"terms": {"rule_description.keyword": top_descriptions}},
+                        "aggs": {"agents": {"terms": {"field": "agent_id", "size": size}}}
+                    }
+                })
+                result = normalize_counts(await coalesced_search(index=indices, body=body, **search_params(body)))
+                buckets["top_event_counts"] = result['aggregations']['top_event_filter']['agents']['buckets']
+            return buckets
         except Exception as e:
             raise ElasticsearchError(f"Error getting events for pie chart: {str(e)}")
         
+    @staticmethod
+    def build_messages_query(start_time: datetime, end_time: datetime, group_names: Optional[List[str]] = None) -> Dict:
+        return filter_query(
+            time_range(start_time, end_time, inclusive_end=False),
+            {"range": {"rule_level": {"gte": 8}}},
+            groups(group_names)
+        )
+
     @staticmethod
     async def load_messages(start_time: datetime, end_time: datetime, group_names: Optional[List[str]] = None, limit: int = 100) -> Tuple[List[Dict], int]:
         """
         Load high-level messages (rule_level >=8) from Elasticsearch within a specified time range.
         """
-        query = {
-            "bool": {
-                "must": [
-                    {
-                        "range": {
-                            "timestamp": {
-                                "gte": start_time.isoformat(),
-                                "lt": end_time.isoformat()
-                            }
-                        }
-                    },
-                    {
-                        "range": {
-                            "rule_level": {
-                                "gte": 8
-                            }
-                        }
-                    }
-                ]
-            }
-        }
-        
-        if group_names:
-            query["bool"]["must"].append({"terms": {"group_name": group_names}})
-        
-        body = {
-            "query": query,
-            "sort": [{"timestamp": {"order": "desc"}}],
-            "size": limit,
-            }
+        query = EventModel.build_messages_query(start_time, end_time, group_names)
+        body = search_body(query, size=limit, sort=[{"timestamp": {"order": "desc"}}], track_total_hits=True)
         
         logger.info(f"Loading messages with query: {body}")
         
         try:
-            result = es.search(index=get_index_name(), body=body)
+            result = await coalesced_search(index=await get_index_names(start_time, end_time), body=body, **search_params(body))
             messages = [hit['_source'] for hit in result['hits']['hits']]
             total_count = result['hits']['total']['value']
             logger.info(f"Loaded {len(messages)} messages for {group_names} from {start_time} to {end_time}")
@@ -505,3 +477,20 @@ class EventModel:
             return messages, total_count
         except Exception as e:
             raise ElasticsearchError(f"Error loading high-level messages: {str(e)}")
+
+    @staticmethod
+    async def load_messages_page(start_time: datetime, end_time: datetime, group_names: Optional[List[str]] = None,
+                                 page_size: int = 100, cursor: Optional[str] = None) -> SearchPage:
+        """
+        Load one page of high-level messages, newest first. The first page carries the total count;
+        pass the returned cursor to continue from the same point-in-time.
+        """
+        query = EventModel.build_messages_query(start_time, end_time, group_names)
+        try:
+            page = await search_page(await get_index_names(start_time, end_time), query, [{"timestamp": {"order": "desc"}}], page_size, cursor)
+        except BadRequestError:
+            raise
+        except Exception as e:
+            raise ElasticsearchError(f"Error loading high-level messages: {str(e)}")
+        page.hits = [hit['_source'] for hit in page.hits]
+        return page
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, Query
 from datetime import datetime
+from typing import Optional
 from app.schemas.agent_schema import (AgentInfoResponse,
     AgentAlertsResponse, AgentTacticLinechartResponse, AgentCVEBarchartResponse,
     AgentMaliciousFileResponse, AgentAuthenticationResponse, AgentEventTableResponse
 )
 from app.controllers.auth import AuthController
-from app.models.user_db import UserModel
-from app.ext.error import UnauthorizedError, PermissionError, InternalServerError
+from app.routes.conditional import conditional_get
+from app.models.user_db import AuthContext
+from app.ext.error import UnauthorizedError, PermissionError, InternalServerError, BadRequestError
 from app.controllers.agent_detail_controller import AgentDetailController as ADController
-from app.controllers.wazuh import AgentController
 from logging import getLogger
 
 
@@ -16,10 +17,10 @@ logger = getLogger('app_logger')
 
 router = APIRouter()
 
-@router.get("/agent-info", response_model=AgentInfoResponse)
+@router.get("/agent-info", response_model=AgentInfoResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_info(
     agent_name: str,
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Endpoint to get the agent info.
@@ -47,15 +48,10 @@ async def get_agent_info(
     }
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin':
+        if auth.is_admin:
             agent_details = await ADController.get_agent_info(agent_name)
             return AgentInfoResponse(success=True, message="Agent info retrieved successfully", content=agent_details)
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         agent_details = await ADController.get_agent_info(agent_name)
         return AgentInfoResponse(success=True, message="Agent info retrieved successfully", content=agent_details)
     except UnauthorizedError:
@@ -66,18 +62,16 @@ async def get_agent_info(
         logger.error(f"Error in get_agent_info endpoint: {e}")
         raise InternalServerError()
 
-@router.get("/alerts", response_model=AgentAlertsResponse)
+@router.get("/alerts", response_model=AgentAlertsResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_alerts(
     agent_name: str = Query(..., description="Agent name to filter alerts"),
     start_time: datetime = Query(..., description="Start time for the alerts query"),
     end_time: datetime = Query(..., description="End time for the alerts query"),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """Get alerts for a specific agent"""
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin':
+        if auth.is_admin:
             alerts = await ADController.clean_alerts(
                 start_time=start_time,
                 end_time=end_time,
@@ -88,10 +82,7 @@ async def get_agent_alerts(
                 "content": alerts,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         alerts = await ADController.clean_alerts(
             start_time=start_time,
             end_time=end_time,
@@ -111,18 +102,16 @@ async def get_agent_alerts(
         logger.error(f"Error getting agent alerts: {e}")
         raise InternalServerError()
 
-@router.get("/tactic_linechart", response_model=AgentTacticLinechartResponse)
+@router.get("/tactic_linechart", response_model=AgentTacticLinechartResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_tactic_linechart(
     agent_name: str = Query(..., description="Agent name to filter tactic data"),
     start_time: datetime = Query(..., description="Start time for the tactic linechart query"),
     end_time: datetime = Query(..., description="End time for the tactic linechart query"),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """Get tactic linechart for a specific agent"""
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin':
+        if auth.is_admin:
             tactic_data = await ADController.clean_tactic_linechart(
                 start_time=start_time,
                 end_time=end_time,
@@ -133,10 +122,7 @@ async def get_agent_tactic_linechart(
                 "content": tactic_data,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         tactic_data = await ADController.clean_tactic_linechart(
             start_time=start_time,
             end_time=end_time,
@@ -156,18 +142,16 @@ async def get_agent_tactic_linechart(
         logger.error(f"Error getting agent tactic linechart: {e}")
         raise InternalServerError()
 
-@router.get("/cve_barchart", response_model=AgentCVEBarchartResponse)
+@router.get("/cve_barchart", response_model=AgentCVEBarchartResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_cve_barchart(
     agent_name: str = Query(..., description="Agent name to filter CVE data"),
     start_time: datetime = Query(..., description="Start time for the CVE barchart query"),
     end_time: datetime = Query(..., description="End time for the CVE barchart query"),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """Get CVE barchart for a specific agent"""
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin':
+        if auth.is_admin:
             cve_data = await ADController.clean_cve_barchart(
                 start_time=start_time,
                 end_time=end_time,
@@ -178,10 +162,7 @@ async def get_agent_cve_barchart(
                 "content": cve_data,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         cve_data = await ADController.clean_cve_barchart(
             start_time=start_time,
             end_time=end_time,
@@ -201,18 +182,16 @@ async def get_agent_cve_barchart(
         logger.error(f"Error getting agent CVE barchart: {e}")
         raise InternalServerError()
 
-@router.get("/malicious_file_barchart", response_model=AgentMaliciousFileResponse)
+@router.get("/malicious_file_barchart", response_model=AgentMaliciousFileResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_malicious_file_barchart(
     agent_name: str = Query(..., description="Agent name to filter malicious file data"),
     start_time: datetime = Query(..., description="Start time for the malicious file barchart query"),
     end_time: datetime = Query(..., description="End time for the malicious file barchart query"),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """Get malicious file barchart for a specific agent"""
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin':
+        if auth.is_admin:
             malicious_file_data = await ADController.clean_malicious_file_barchart(
                 start_time=start_time,
                 end_time=end_time,
@@ -223,10 +202,7 @@ async def get_agent_malicious_file_barchart(
                 "content": malicious_file_data,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         malicious_file_data = await ADController.clean_malicious_file_barchart(
             start_time=start_time,
             end_time=end_time,
@@ -246,18 +222,16 @@ async def get_agent_malicious_file_barchart(
         logger.error(f"Error getting agent malicious file barchart: {e}")
         raise InternalServerError()
 
-@router.get("/authentication_piechart", response_model=AgentAuthenticationResponse)
+@router.get("/authentication_piechart", response_model=AgentAuthenticationResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_authentication_piechart(
     agent_name: str = Query(..., description="Agent name to filter authentication data"),
     start_time: datetime = Query(..., description="Start time for the authentication piechart query"),
     end_time: datetime = Query(..., description="End time for the authentication piechart query"),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """Get authentication piechart for a specific agent"""
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin':
+        if auth.is_admin:
             authentication_data = await ADController.clean_authentication_piechart(
                 start_time=start_time,
                 end_time=end_time,
@@ -268,10 +242,7 @@ async def get_agent_authentication_piechart(
                 "content": authentication_data,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         authentication_data = await ADController.clean_authentication_piechart(
             start_time=start_time,
             end_time=end_time,
@@ -291,47 +262,51 @@ async def get_agent_authentication_piechart(
         logger.error(f"Error getting agent authentication piechart: {e}")
         raise InternalServerError()
 
-@router.get("/event_table", response_model=AgentEventTableResponse)
+@router.get("/event_table", response_model=AgentEventTableResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_event_table(
     agent_name: str = Query(..., description="Agent name to filter events"),
     start_time: datetime = Query(..., description="Start time for the event table query"),
     end_time: datetime = Query(..., description="End time for the event table query"),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Page through the events with this many per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
-    """Get event table for a specific agent"""
+    """
+    Get event table for a specific agent.
+    Pass page_size to page through the events; send next_cursor back as cursor until it is null.
+    """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin':
+        user_groups = auth.require_groups()
+        next_cursor = None
+        if page_size or cursor:
+            page = await ADController.page_event_table(
+                start_time=start_time,
+                end_time=end_time,
+                agent_name=agent_name,
+                group_name=user_groups,
+                page_size=page_size or 100,
+                cursor=cursor
+            )
+            event_data, next_cursor = page["events"], page["next_cursor"]
+        else:
             event_data = await ADController.clean_event_table(
                 start_time=start_time,
                 end_time=end_time,
-                agent_name=agent_name
+                agent_name=agent_name,
+                group_name=user_groups
             )
-            return {
-                "success": True,
-                "content": event_data,
-                "message": "Success"
-            }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
-        event_data = await ADController.clean_event_table(
-            start_time=start_time,
-            end_time=end_time,
-            agent_name=agent_name,
-            group_name=user_groups
-        )
         return {
             "success": True,
             "content": event_data,
-            "message": "Success"
+            "message": "Success",
+            "next_cursor": next_cursor
         }
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
     except PermissionError:
         raise PermissionError("Permission denied")
+    except BadRequestError:
+        raise
     except Exception as e:
         logger.error(f"Error getting agent event table: {e}")
         raise InternalServerError()
@@ -1,9 +1,10 @@
 from fastapi import Depends, APIRouter
-from fastapi import Depends, APIRouter, HTTPException
+from fastapi import Depends, APIRouter, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from app.controllers.auth import AuthController
 from app.schemas.user import UserSignup
 from app.ext.error import UserExistedError, UserNotFoundError, InvalidPasswordError, UserDisabledError, AuthControllerError
+from typing import Optional
 from logging import getLogger
 
 # Get the centralized logger
@@ -12,10 +13,19 @@ logger = getLogger('app_logger')
 
 router = APIRouter()
 
+def client_host(request: Request) -> Optional[str]:
+    """Client address, resolved from X-Forwarded-For by uvicorn when the request came through a trusted proxy."""
+    return request.client.host if request.client else None
+
 @router.post("/login")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    """
+    Exchange a username and password for an access token.
+    Repeated attempts from one IP, or repeated failures for one username, are answered with
+    429 and a Retry-After header.
+    """
     try:
-        jwt_token = AuthController.authenticate_user(form_data.username, form_data.password)
+        jwt_token = await AuthController.authenticate_user(form_data.username, form_data.password, client_host(request))
         return {
             "success": True,
             "content": jwt_token,
@@ -29,13 +39,10 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 @router.post("/refresh-token")
 async def refresh_access_token(current_user = Depends(AuthController.get_current_user)):
     try:
-        new_token = AuthController.create_access_token(data={"sub": current_user.username})
+        # Re-issued with the user's current role and groups when tokens carry group claims
         return {
             "success": True,
-            "content": {
-                "access_token": new_token,
-                "token_type": "bearer"
-            },
+            "content": await AuthController.issue_token(current_user),
             "message": "Token refreshed successfully"
         }
     except Exception as e:
@@ -43,7 +50,7 @@ async def refresh_access_token(current_user = Depends(AuthController.get_current
         raise HTTPException(status_code=401, detail="Could not refresh token")
   
 @router.post("/signup")
-async def signup_user(user: UserSignup):
+async def signup_user(user: UserSignup, request: Request):
     """
     Register a new user
     Request body:
@@ -58,12 +65,13 @@ async def signup_user(user: UserSignup):
     - message: str
     """
     try:
-        AuthController.create_user_signup(
+        await AuthController.create_user_signup(
             user.username,
             user.password,
             user.email,
             user.company_name,
-            user.license_amount
+            user.license_amount,
+            client_host(request)
         )
         return {
             "success": True,
@@ -0,0 +1,65 @@
+from typing import List, Optional
+from fastapi import Depends, Request, Response
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.controllers.auth import AuthController
+from app.models.user_db import AuthContext
+from app.models.data_version import data_versions, ALL_SCOPES, GLOBAL_SCOPE
+from app.tools.cache import response_versions
+from app.ext.error import NotModified
+import hashlib
+import json
+import os
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+CONDITIONAL_GET_ENABLED = os.getenv('CONDITIONAL_GET_ENABLED', 'true').lower() == 'true'
+
+def build_etag(request: Request, auth: AuthContext, versions: dict) -> str:
+    """Weak ETag over the shared data versions the response depends on and everything that selects it."""
+    payload = json.dumps(
+        [request.url.path, sorted(request.query_params.multi_items()), auth.user_id, auth.role, versions],
+        sort_keys=True, separators=(",", ":")
+    )
+    return f'W/"{hashlib.sha1(payload.encode()).hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in tags}
+
+def conditional_get(scope: Optional[str] = None):
+    """
+    Route dependency that tags the response with an ETag and answers 304 when the client already
+    has it. The tag changes when data of the user's groups is ingested (or of `scope`, for data
+    without groups), so unchanged polls are answered without querying Elasticsearch. The versions
+    are read before the route queries anything and are only bumped once the data is searchable, so
+    the body is never older than its tag.
+    """
+    async def check(request: Request, response: Response,
+                    auth: AuthContext = Depends(AuthController.get_auth_context)) -> None:
+        if not CONDITIONAL_GET_ENABLED:
+            return
+        if scope is not None:
+            scopes: List[str] = [scope]
+        elif auth.is_admin:
+            scopes = [ALL_SCOPES]
+        else:
+            scopes = list(auth.group_names)
+        versions = await data_versions.current(scopes + [GLOBAL_SCOPE])
+        etag = build_etag(request, auth, versions)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise NotModified(etag)
+        response_versions.set(tuple(sorted(versions.items())))
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+    return check
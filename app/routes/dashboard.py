@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from logging import getLogger
 
-from app.models.user_db import UserModel
+from app.models.user_db import AuthContext
 from app.controllers.auth import AuthController
-from app.controllers.wazuh import AgentController
+from app.routes.conditional import conditional_get
+from app.tools.fast_json import fast_json_response
 from app.controllers.dashboard_controller import DashboardController
-from app.ext.error import PermissionError, InternalServerError, UnauthorizedError
+from app.ext.error import PermissionError, InternalServerError, UnauthorizedError, BadRequestError
 from app.schemas.dashboard_schema import *
 
 
@@ -14,10 +15,10 @@ logger = getLogger('app_logger')
 
 router = APIRouter()
 
-@router.get("/agent_summary", response_model=AgentSummaryResponse)
+@router.get("/agent_summary", response_model=AgentSummaryResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_summary(
     request: AgentSummaryRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Get the agent connnection summary.
@@ -39,9 +40,7 @@ async def get_agent_summary(
     }
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin': 
+        if auth.is_admin: 
             agent_summary = await DashboardController.clean_agent_summary(
                 start_time=request.start_time,
                 end_time=request.end_time,
@@ -51,10 +50,7 @@ async def get_agent_summary(
                 "content": agent_summary,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         agent_summary = await DashboardController.clean_agent_summary(
             start_time=request.start_time,
             end_time=request.end_time,
@@ -73,10 +69,10 @@ async def get_agent_summary(
         logger.error(f"Error getting agent summary: {e}")
         raise InternalServerError("Internal server error")
 
-@router.get("/agent_os", response_model=AgentOSResponse)
+@router.get("/agent_os", response_model=AgentOSResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_os(
     request: AgentOSRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Get the agent OS summary.
@@ -98,9 +94,7 @@ async def get_agent_os(
     }
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin': 
+        if auth.is_admin: 
             agent_os_data = await DashboardController.clean_agent_os(
                 start_time=request.start_time,
                 end_time=request.end_time,
@@ -110,10 +104,7 @@ async def get_agent_os(
                 "content": agent_os_data,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         agent_os_data = await DashboardController.clean_agent_os(
             start_time=request.start_time,
             end_time=request.end_time,
@@ -132,10 +123,10 @@ async def get_agent_os(
         logger.error(f"Error getting agent OS: {e}")
         raise InternalServerError("Internal server error")
 
-@router.get("/alerts", response_model=AlertsResponse)
+@router.get("/alerts", response_model=AlertsResponse, dependencies=[Depends(conditional_get())])
 async def get_alerts(
     request: AlertsRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Get the different level alerts count.
@@ -159,9 +150,7 @@ async def get_alerts(
     }
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin': 
+        if auth.is_admin: 
             alerts = await DashboardController.clean_alerts(
                 start_time=request.start_time,
                 end_time=request.end_time,
@@ -171,10 +160,7 @@ async def get_alerts(
                 "content": alerts,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         alerts = await DashboardController.clean_alerts(
             start_time=request.start_time,
             end_time=request.end_time,
@@ -193,10 +179,10 @@ async def get_alerts(
         logger.error(f"Error getting alerts: {e}")
         raise InternalServerError("Internal server error")
 
-@router.get("/cve_barchart", response_model=CVEBarchartResponse)
+@router.get("/cve_barchart", response_model=CVEBarchartResponse, dependencies=[Depends(conditional_get())])
 async def get_cve_barchart(
     request: CVEBarchartRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Get the CVE barchart.
@@ -218,10 +204,8 @@ async def get_cve_barchart(
     }
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
             
-        if current_user.user_role == 'admin': 
+        if auth.is_admin: 
             cve_barchart = await DashboardController.clean_cve_barchart(
                 start_time=request.start_time,
                 end_time=request.end_time
@@ -231,10 +215,7 @@ async def get_cve_barchart(
                 "content": cve_barchart,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         cve_barchart = await DashboardController.clean_cve_barchart(
             start_time=request.start_time,
             end_time=request.end_time,
@@ -253,10 +234,10 @@ async def get_cve_barchart(
         logger.error(f"Error getting cve barchart: {e}")
         raise InternalServerError("Internal server error")
 
-@router.get("/tactic_linechart", response_model=TacticLineChartResponse)
+@router.get("/tactic_linechart", response_model=TacticLineChartResponse, dependencies=[Depends(conditional_get())])
 async def get_tactic_linechart(
     request: TacticLineChartRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """ 
     Get tactic linechart.
@@ -283,9 +264,7 @@ async def get_tactic_linechart(
     }
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin': 
+        if auth.is_admin: 
             tactic_linechart = await DashboardController.clean_tactic_linechart(
                 start_time=request.start_time,
                 end_time=request.end_time
@@ -295,10 +274,7 @@ async def get_tactic_linechart(
                 "content": tactic_linechart,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         tactic_linechart = await DashboardController.clean_tactic_linechart(
             start_time=request.start_time,
             end_time=request.end_time,
@@ -317,10 +293,10 @@ async def get_tactic_linechart(
         logger.error(f"Error getting tactic linechart: {e}")
         raise InternalServerError("Internal server error")
 
-@router.get("/malicious_file_barchart", response_model=MaliciousFileBarchartResponse)
+@router.get("/malicious_file_barchart", response_model=MaliciousFileBarchartResponse, dependencies=[Depends(conditional_get())])
 async def get_malicious_file_barchart(
     request: MaliciousFileBarchartRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Get malicious file barchart.
@@ -342,9 +318,7 @@ async def get_malicious_file_barchart(
     }
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin': 
+        if auth.is_admin: 
             malicious_file_barchart = await DashboardController.clean_malicious_file_barchart(
                 start_time=request.start_time,
                 end_time=request.end_time
@@ -354,10 +328,7 @@ async def get_malicious_file_barchart(
                 "content": malicious_file_barchart,
                 "message": "Success"
             }   
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         malicious_file_barchart = await DashboardController.clean_malicious_file_barchart(
             start_time=request.start_time,
             end_time=request.end_time,
@@ -376,10 +347,10 @@ async def get_malicious_file_barchart(
         logger.error(f"Error getting malicious file barchart: {e}")
         raise InternalServerError("Internal server error")
 
-@router.get("/authentication_piechart", response_model=AuthenticationPiechartResponse)
+@router.get("/authentication_piechart", response_model=AuthenticationPiechartResponse, dependencies=[Depends(conditional_get())])
 async def get_authentication_piechart(
     request: AuthenticationPiechartRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Get authentication piechart.
@@ -401,9 +372,7 @@ async def get_authentication_piechart(
     }
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin': 
+        if auth.is_admin: 
             authentication_piechart = await DashboardController.clean_authentication_piechart(
                 start_time=request.start_time,
                 end_time=request.end_time
@@ -413,10 +382,7 @@ async def get_authentication_piechart(
                 "content": authentication_piechart,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         authentication_piechart = await DashboardController.clean_authentication_piechart(
             start_time=request.start_time,
             end_time=request.end_time,
@@ -435,10 +401,10 @@ async def get_authentication_piechart(
         logger.error(f"Error getting authentication piechart: {e}")
         raise InternalServerError("Internal server error")
 
-@router.get("/agent_name", response_model=AgentNamePiechartResponse)
+@router.get("/agent_name", response_model=AgentNamePiechartResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_name(
     request: AgentNamePiechartRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Get agent name piechart.
@@ -460,9 +426,7 @@ async def get_agent_name(
     }
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin': 
+        if auth.is_admin: 
             agent_name = await DashboardController.clean_agent_name(
                 start_time=request.start_time,
                 end_time=request.end_time
@@ -472,10 +436,7 @@ async def get_agent_name(
                 "content": agent_name,
                 "message": "Success"
             }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
+        user_groups = auth.require_groups()
         agent_name = await DashboardController.clean_agent_name(
             start_time=request.start_time,
             end_time=request.end_time,
@@ -494,10 +455,11 @@ async def get_agent_name(
         logger.error(f"Error getting agent name: {e}")
         raise InternalServerError("Internal server error")
 
-@router.get("/event_table", response_model=EventTableResponse)
+@router.get("/event_table", response_model=EventTableResponse, dependencies=[Depends(conditional_get())])
 async def get_event_table(
+    response: Response,
     request: EventTableRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Get event table.
@@ -507,6 +469,9 @@ async def get_event_table(
       -H 'accept: application/json' \
       -H 'Authorization: Bearer [Token]'
 
+    Pass page_size to page through the events instead of getting the latest 1000. The response then
+    carries content.next_cursor; send it back as cursor for the next page until it is null.
+
     Response:
     {
       "total": 0,
@@ -525,36 +490,83 @@ async def get_event_table(
     
     """
     try:
-        if current_user.disabled:
-            raise PermissionError("User account is disabled")
-        if current_user.user_role == 'admin': 
+        user_groups = auth.require_groups()
+        if request.page_size or request.cursor:
+            event_table = await DashboardController.page_event_table(
+                start_time=request.start_time,
+                end_time=request.end_time,
+                group_name=user_groups,
+                page_size=request.page_size or 100,
+                cursor=request.cursor
+            )
+        else:
             event_table = await DashboardController.clean_event_table(
                 start_time=request.start_time,
-                end_time=request.end_time
+                end_time=request.end_time,
+                group_name=user_groups
             )
-            return {
-                "success": True,
-                "content": event_table,
-                "message": "Success"
-            }
-        user_groups = UserModel.get_user_groups(current_user.id)
-        permission_error = await AgentController.check_user_permission(current_user, user_groups)
-        if permission_error:
-            raise PermissionError("Permission denied")
-        event_table = await DashboardController.clean_event_table(
+        event_table.setdefault("next_cursor", None)
+        return fast_json_response({
+            "success": True,
+            "content": event_table,
+            "message": "Success"
+        }, response.headers, stream_path="content.event_table")
+    except UnauthorizedError as e:
+        raise UnauthorizedError("Authentication required")
+    except PermissionError as e:
+        raise PermissionError("Permission denied")  
+    except BadRequestError:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting event table: {e}")
+        raise InternalServerError("Internal server error")
+
+@router.get("/snapshot", response_model=DashboardSnapshotResponse, dependencies=[Depends(conditional_get())])
+async def get_snapshot(
+    request: DashboardSnapshotRequest = Depends(),
+    auth: AuthContext = Depends(AuthController.get_auth_context)
+):
+    """
+    Get every dashboard widget in one request. The user's groups are resolved once and all widget
+    queries are sent to Elasticsearch in a single _msearch.
+    Request:
+    curl -X 'GET' \
+      'https://flask.aixsoar.com/api/dashboard/snapshot?start_time=2024-01-01T00%3A00%3A00&end_time=2025-01-01T00%3A00%3A00' \
+      -H 'accept: application/json' \
+      -H 'Authorization: Bearer [Token]'
+    Response:
+    {
+      "success": true,
+      "content": {
+        "agent_summary": {"connected_agents": 10, "disconnected_agents": 5},
+        "agent_os": [{"os": "Windows", "count": 10}],
+        "alerts": {"critical_severity": 0, "high_severity": 3, "medium_severity": 12, "low_severity": 40},
+        "cve_barchart": [{"cve_name": "CVE-2024-1234", "count": 2}],
+        "tactic_linechart": [{"label": [], "datas": []}],
+        "malicious_file_barchart": [{"name": "C:\\Users\\test\\a.exe", "count": 1}],
+        "authentication_piechart": [{"tactic": "Brute Force", "count": 4}],
+        "agent_name": [{"agent_name": "user_001", "event_count": 120}],
+        "event_table": [{"timestamp": "2024-10-10T00:00:00", "agent_name": "user_001", "rule_description": "string", "rule_mitre_tactic": "string", "rule_mitre_id": "string", "rule_level": 8}]
+      },
+      "message": "Success"
+    }
+    """
+    try:
+        user_groups = auth.require_groups()  # None for admins, who see all groups
+        snapshot = await DashboardController.get_snapshot(
             start_time=request.start_time,
             end_time=request.end_time,
             group_name=user_groups
         )
         return {
             "success": True,
-            "content": event_table,
+            "content": snapshot,
             "message": "Success"
         }
     except UnauthorizedError as e:
         raise UnauthorizedError("Authentication required")
     except PermissionError as e:
-        raise PermissionError("Permission denied")  
+        raise PermissionError("Permission denied")
     except Exception as e:
-        logger.error(f"Error getting event table: {e}")
+        logger.error(f"Error getting dashboard snapshot: {e}")
         raise InternalServerError("Internal server error")
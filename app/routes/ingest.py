@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+from app.controllers.ingest import IngestController
+from app.controllers.auth import AuthController
+from app.models.user_db import UserModel
+from app.models.ingest_queue import IngestBatch
+from app.schemas.ingest import IngestAcceptedResponse, IngestBatchStatusResponse
+from app.ext.error import NotFoundError, InternalServerError
+from logging import getLogger
+
+logger = getLogger('app_logger')
+
+router = APIRouter()
+
+def accepted_response(batch: IngestBatch) -> JSONResponse:
+    """202 response returned by ingest endpoints when the write-behind queue is enabled."""
+    content = IngestAcceptedResponse(
+        success=True,
+        message="Events accepted for indexing",
+        batch_id=batch.batch_id,
+        documents=batch.total
+    )
+    return JSONResponse(status_code=202, content=content.model_dump())
+
+@router.get("/batches/{batch_id}", response_model=IngestBatchStatusResponse)
+async def get_batch_status(
+    batch_id: str,
+    current_user: UserModel = Depends(AuthController.get_current_user)
+):
+    """
+    Endpoint to get the outcome of an upload accepted by the write-behind queue.
+
+    Request:
+    curl -X 'GET' \
+      'https://flask.aixsoar.com/api/ingest/batches/3f9c0a7e2b9d4c61a8e4b1f0d2c3e4f5' \
+      -H 'accept: application/json' \
+      -H 'Authorization: Bearer [Token]'
+
+    Response:
+    {
+      "success": true,
+      "content": {
+        "batch_id": "3f9c0a7e2b9d4c61a8e4b1f0d2c3e4f5",
+        "status": "completed",
+        "total": 8,
+        "succeeded": 8,
+        "failed": 0,
+        "errors": [],
+        "created_at": "2024-11-13T08:00:00.000000",
+        "completed_at": "2024-11-13T08:00:00.412000"
+      }
+    }
+    """
+    try:
+        status = IngestController.get_batch_status(batch_id, current_user)
+        return IngestBatchStatusResponse(success=True, content=status)
+    except NotFoundError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_batch_status endpoint: {e}")
+        raise InternalServerError()
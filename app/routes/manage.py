@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.controllers.manage import ManageController
 from app.ext.error import UnauthorizedError, InternalServerError, PermissionError
 from app.controllers.auth import AuthController
@@ -8,6 +8,10 @@ from app.models.user_db import UserModel
 from app.schemas.manage import TotalAgentsAndLicenseResponse, UserListResponse, ToggleUserStatusRequest, UpdateLicenseRequest, GroupListResponse, GroupEmailMap, NextAgentNameResponse
 from app.schemas.user import UserSignup
 from app.models.manage_db import SessionLocal
+from app.tools.cache import result_cache, principal_cache, group_cache
+from app.models.single_flight import single_flight
+from app.tools.hashing import password_hasher
+from app.tools.throttle import client_limiter, username_limiter
 
 logger = getLogger('app_logger')
 
@@ -17,18 +21,15 @@ async def admin_required(user: UserModel = Depends(AuthController.get_current_us
     await AuthController.check_user_permission(user, "admin")
     return user
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 @router.get("/group")
 async def get_group(user: UserModel = Depends(admin_required)):
     """Use for script to crawl the group and email from mysql"""
     try:
-        group_email_map = ManageController.get_group_email_map(user)
+        group_email_map = await ManageController.get_group_email_map(user)
         return GroupListResponse(success=True, content=GroupEmailMap(root=group_email_map))
     except UnauthorizedError:
         raise
@@ -40,7 +41,7 @@ async def get_group(user: UserModel = Depends(admin_required)):
 async def toggle_user_status(request: ToggleUserStatusRequest, user: UserModel = Depends(admin_required)):
     """Toggle a user's disabled status between True and False"""
     try:
-        new_status = ManageController.toggle_user_status(request.user_id)
+        new_status = await ManageController.toggle_user_status(request.user_id)
         return {"message": f"User status updated successfully. New status: {'disabled' if new_status else 'enabled'}"}
     except UnauthorizedError:
         raise
@@ -52,7 +53,7 @@ async def toggle_user_status(request: ToggleUserStatusRequest, user: UserModel =
 async def update_license(request: UpdateLicenseRequest, user: UserModel = Depends(admin_required)):
     """Update a user's license amount"""
     try:
-        success = ManageController.update_user_license(request.user_id, request.license_amount)
+        success = await ManageController.update_user_license(request.user_id, request.license_amount)
         if success:
             return {"message": "License updated successfully"}
     except UnauthorizedError:
@@ -69,14 +70,14 @@ async def get_total_agents_and_license(user: UserSignup = Depends(AuthController
         if user.user_role == 'admin':
             group_names = None
         else:
-            group_names = UserModel.get_user_groups(user.id)
+            group_names = await UserModel.get_user_groups(user.id)
             logger.info(f"User groups: {group_names}")
             if not group_names:
                 logger.warning(f"No groups found for user {user.id}")
                 return TotalAgentsAndLicenseResponse(total_agents=0, total_license=0)
 
         total_agents = await ManageController.get_total_agents(group_names)
-        total_license = ManageController.get_total_license(user.id if user.user_role != 'admin' else None)
+        total_license = await ManageController.get_total_license(user.id if user.user_role != 'admin' else None)
         logger.info(f"Total agents: {total_agents}, Total license: {total_license}")
 
         return TotalAgentsAndLicenseResponse(total_agents=total_agents, total_license=total_license)
@@ -90,16 +91,16 @@ async def get_total_agents_and_license(user: UserSignup = Depends(AuthController
 @router.get("/users", response_model=UserListResponse)
 async def read_users(
     _: UserSignup = Depends(admin_required),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all users
     Request:
         - user: UserSignup: The current user
-        - db: Session: The database session
+        - db: AsyncSession: The database session
     Returns:
         - UserListResponse: A list of all users
     """
-    users = ManageController.get_users(db)
+    users = await ManageController.get_users(db)
     return UserListResponse(users=users)
 
 
@@ -122,7 +123,7 @@ async def get_next_agent_name(
     }
     """
     try:
-        next_name = ManageController.get_next_agent_name(current_user)
+        next_name = await ManageController.get_next_agent_name(current_user)
         return NextAgentNameResponse(next_agent_name=next_name)
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
@@ -130,4 +131,56 @@ async def get_next_agent_name(
         raise PermissionError("User does not have permission to access this resource")
     except Exception as e:
         logger.error(f"Error in get_next_agent_name endpoint: {e}")
-        raise InternalServerError()
\ No newline at end of file
+        raise InternalServerError()
+
+
+@router.get("/cache-stats")
+async def get_cache_stats(user: UserModel = Depends(admin_required)):
+    """
+    Hit/miss counters of the dashboard and chart result cache, of the coalesced Elasticsearch reads
+    and of the principal and group caches used for authentication
+
+    Request:
+    curl -X 'GET' \
+      'https://flask.aixsoar.com/api/manage/cache-stats' \
+      -H 'accept: application/json' \
+      -H 'Authorization: Bearer [Token]'
+
+    Response:
+    {
+      "entries": 42,
+      "max_entries": 1024,
+      "evictions": 0,
+      "hits": 310,
+      "misses": 57,
+      "endpoints": {"dashboard.alerts": {"hits": 40, "misses": 6}},
+      "single_flight": {"enabled": true, "in_flight": 0, "leaders": 120, "shared": 35},
+      "principals": {"entries": 8, "max_entries": 4096, "evictions": 0, "hits": 950, "misses": 12, "endpoints": {...}},
+      "groups": {"entries": 6, "max_entries": 4096, "evictions": 0, "hits": 2300, "misses": 9, "endpoints": {...}}
+    }
+    """
+    return {**result_cache.stats(), "single_flight": single_flight.stats(), "principals": principal_cache.stats(), "groups": group_cache.stats()}
+
+@router.get("/auth-stats")
+async def get_auth_stats(user: UserModel = Depends(admin_required)):
+    """
+    Load of the password hashing pool and counters of the login throttling
+
+    Request:
+    curl -X 'GET' \
+      'https://flask.aixsoar.com/api/manage/auth-stats' \
+      -H 'accept: application/json' \
+      -H 'Authorization: Bearer [Token]'
+
+    Response:
+    {
+      "password_hashing": {"workers": 2, "max_queue": 32, "running": 1, "queued": 0, "completed": 820, "rejected": 0, "avg_ms": 231.4},
+      "client_throttle": {"limit": 30, "window": 60.0, "keys": 14, "rejected": 3},
+      "username_throttle": {"limit": 5, "window": 300.0, "keys": 2, "rejected": 11}
+    }
+    """
+    return {
+        "password_hashing": password_hasher.stats(),
+        "client_throttle": client_limiter.stats(),
+        "username_throttle": username_limiter.stats()
+    }
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from typing import List
-from app.ext.error import UnauthorizedError, PermissionError, InternalServerError, UnprocessableEntityError
+from app.ext.error import UnauthorizedError, PermissionError, InternalServerError, UnprocessableEntityError, ServiceUnavailableError
 from app.schemas.mobus import (
     ModbusEventResponse, ModbusEventsRequest, ModbusEventCreate, ModbusEventsCreateResponse,
     SyslogEventCreate, SyslogEventResponse
@@ -8,14 +8,20 @@ from app.schemas.mobus import (
 from app.controllers.mobus import ModbusEventController
 from logging import getLogger
 from app.controllers.auth import AuthController
+from app.routes.conditional import conditional_get
+from app.tools.fast_json import fast_json_response
 from app.models.user_db import UserModel
+from app.models.ingest_queue import INGEST_WRITE_BEHIND
+from app.routes.ingest import accepted_response
+from app.schemas.ingest import IngestAcceptedResponse
 
 logger = getLogger('app_logger')
 
 router = APIRouter()
 
-@router.get("/get-events", response_model=List[ModbusEventResponse])
+@router.get("/get-events", response_model=List[ModbusEventResponse], dependencies=[Depends(conditional_get("modbus"))])
 async def get_modbus_events(
+    response: Response,
     request: ModbusEventsRequest = Depends(),
     current_user: UserModel = Depends(AuthController.get_current_user)
 ):
@@ -46,8 +52,8 @@ async def get_modbus_events(
         if current_user.user_role != 'admin' and current_user.username != 'redteam2':
             raise PermissionError
         else:
-            events = ModbusEventController.get_modbus_events(request.start_time, request.end_time)
-            return events
+            events = await ModbusEventController.get_modbus_events(request.start_time, request.end_time)
+            return fast_json_response(events, response.headers, stream_path="")
     except PermissionError:
         raise PermissionError("Permission denied")
     except UnauthorizedError:
@@ -56,7 +62,7 @@ async def get_modbus_events(
         logger.error(f"Error in get_modbus_events: {e}")
         raise InternalServerError from e
     
-@router.post("/post-events", response_model=ModbusEventsCreateResponse)
+@router.post("/post-events", response_model=ModbusEventsCreateResponse, responses={202: {"model": IngestAcceptedResponse}})
 async def post_modbus_events(
     event: ModbusEventCreate,
     current_user: UserModel = Depends(AuthController.get_current_user)
@@ -78,18 +84,24 @@ async def post_modbus_events(
     try:
         if current_user.user_role != 'admin':
             raise PermissionError
-        event_id = ModbusEventController.create_modbus_event(event)
+        if INGEST_WRITE_BEHIND:
+            batch = ModbusEventController.enqueue_modbus_event(event, current_user.username)
+            return accepted_response(batch)
+        event_id = await ModbusEventController.create_modbus_event(event)
         return {"message": "Event created successfully", "event_id": event_id}
     except PermissionError:
         raise PermissionError("Permission denied")
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
+    except ServiceUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Error in post_modbus_events: {e}")
         raise InternalServerError from e
 
-@router.get("/get-syslog", response_model=List[SyslogEventResponse])
+@router.get("/get-syslog", response_model=List[SyslogEventResponse], dependencies=[Depends(conditional_get("syslog"))])
 async def get_syslog_events(
+    response: Response,
     request: ModbusEventsRequest = Depends(),
     current_user: UserModel = Depends(AuthController.get_current_user)
 ):
@@ -124,8 +136,8 @@ async def get_syslog_events(
         if current_user.user_role != 'admin' and current_user.username != 'redteam2':
             raise PermissionError
         else:
-            events = ModbusEventController.get_syslog_events(request.start_time, request.end_time)
-            return events
+            events = await ModbusEventController.get_syslog_events(request.start_time, request.end_time)
+            return fast_json_response(events, response.headers, stream_path="")
     except PermissionError:
         raise PermissionError("Permission denied")
     except UnauthorizedError:
@@ -134,7 +146,7 @@ async def get_syslog_events(
         logger.error(f"Error in get_syslog_events: {e}")
         raise InternalServerError from e
 
-@router.post("/post-syslog", response_model=ModbusEventsCreateResponse)
+@router.post("/post-syslog", response_model=ModbusEventsCreateResponse, responses={202: {"model": IngestAcceptedResponse}})
 async def post_syslog_events(
     event: SyslogEventCreate,
     current_user: UserModel = Depends(AuthController.get_current_user)
@@ -170,12 +182,17 @@ async def post_syslog_events(
     try:
         if current_user.user_role != 'admin':
             raise PermissionError
-        event_id = ModbusEventController.create_syslog_event(event)
+        if INGEST_WRITE_BEHIND:
+            batch = ModbusEventController.enqueue_syslog_event(event, current_user.username)
+            return accepted_response(batch)
+        event_id = await ModbusEventController.create_syslog_event(event)
         return {"message": "Event created successfully", "event_id": event_id}
     except PermissionError:
         raise PermissionError("Permission denied")
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
+    except ServiceUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Error in post_syslog_events: {e}")
         raise InternalServerError from e
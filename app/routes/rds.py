@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from app.schemas.rds import RDSDetectionRequest, RDSDetectionResponse, RDSGetResponse
 from app.controllers.rds import RDSController
 from app.controllers.auth import AuthController
+from app.routes.conditional import conditional_get
+from app.tools.fast_json import fast_json_response
 from app.models.user_db import UserModel
-from app.ext.error import UnauthorizedError, ElasticsearchError, InternalServerError
+from app.ext.error import UnauthorizedError, ElasticsearchError, InternalServerError, ServiceUnavailableError
+from app.models.ingest_queue import INGEST_WRITE_BEHIND
+from app.routes.ingest import accepted_response
+from app.schemas.ingest import IngestAcceptedResponse
 from logging import getLogger
 from datetime import datetime
 
@@ -12,7 +17,7 @@ logger = getLogger('app_logger')
 
 router = APIRouter()
 
-@router.post("/rds_events", response_model=RDSDetectionResponse)
+@router.post("/rds_events", response_model=RDSDetectionResponse, responses={202: {"model": IngestAcceptedResponse}})
 async def post_rds_detection(
     detection: RDSDetectionRequest,
     current_user: UserModel = Depends(AuthController.get_current_user)
@@ -54,17 +59,24 @@ async def post_rds_detection(
       "message": "RDS detection events saved successfully",
       "events_saved": 1
     }
+
+    When INGEST_WRITE_BEHIND is enabled the endpoint answers 202 with a batch_id instead.
     """
     try:
         if current_user.disabled:
             raise UnauthorizedError("Unauthorized access")
         if current_user.user_role != "manager":
             raise UnauthorizedError("Unauthorized access")
+        elif INGEST_WRITE_BEHIND:
+            batch = await RDSController.enqueue_detection(detection, current_user.username)
+            return accepted_response(batch)
         else:
             response = await RDSController.save_detection(detection)
             return response
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
+    except ServiceUnavailableError:
+        raise
     except ValueError as e:
         logger.error(f"Validation error in post_rds_detection: {str(e)}")
         raise InternalServerError(str(e))
@@ -75,8 +87,9 @@ async def post_rds_detection(
         logger.error(f"Unexpected error in post_rds_detection: {str(e)}")
         raise InternalServerError()
 
-@router.get("/rds_events", response_model=RDSGetResponse)
+@router.get("/rds_events", response_model=RDSGetResponse, dependencies=[Depends(conditional_get("rds"))])
 async def get_rds_detections(
+    response: Response,
     start_time: datetime = Query(..., description="Start time for filtering records"),
     end_time: datetime = Query(..., description="End time for filtering records"),
     account: str = Query(None, description="Optional account identifier to filter records"),
@@ -123,8 +136,8 @@ async def get_rds_detections(
         if current_user.user_role != "manager":
             raise UnauthorizedError("Unauthorized access")
         else:
-            response = await RDSController.get_detections(start_time, end_time, account)
-            return response
+            detections = await RDSController.get_detections(start_time, end_time, account)
+            return fast_json_response(detections, response.headers, stream_path="records")
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
     except ElasticsearchError as e:
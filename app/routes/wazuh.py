@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from app.schemas.wazuh import (
     AgentInfoRequest, AgentInfoResponse, AgentSummaryResponse,AgentMessagesResponse, AgentMessagesRequest, 
     LineChartRequest, LineChartResponse, TotalEventAPIResponse, TotalEventRequest, TotalEventResponse,
-    PieChartAPIResponse, PieChartRequest, AgentInfoResponseContent, AgentDetailsAPIResponse
+    PieChartAPIResponse, PieChartRequest, AgentInfoResponseContent, AgentDetailsAPIResponse, EventExportRequest, AlertStreamRequest
 )
 from app.controllers.wazuh import AgentController
 from app.controllers.auth import AuthController
-from app.models.user_db import UserModel
-from app.ext.error import UnauthorizedError, ElasticsearchError, PermissionError, InternalServerError
+from app.routes.conditional import conditional_get
+from app.tools.fast_json import fast_json_response
+from app.models.user_db import UserModel, AuthContext
+from app.ext.error import UnauthorizedError, ElasticsearchError, PermissionError, InternalServerError, ServiceUnavailableError, BadRequestError
+from app.models.ingest_queue import INGEST_WRITE_BEHIND
+from app.routes.ingest import accepted_response
+from app.schemas.ingest import IngestAcceptedResponse
 from datetime import datetime
 from typing import Dict
 from dateutil.tz import tzutc
@@ -18,7 +24,7 @@ logger = getLogger('app_logger')
 
 router = APIRouter()
 
-@router.post("/info", response_model=AgentInfoResponse)
+@router.post("/info", response_model=AgentInfoResponse, responses={202: {"model": IngestAcceptedResponse}})
 async def post_agent_info(
     agent_info: AgentInfoRequest,
     current_user: UserModel = Depends(AuthController.get_current_user)
@@ -46,9 +52,16 @@ async def post_agent_info(
         "002": 3
       }
     }
+
+    When INGEST_WRITE_BEHIND is enabled the documents are queued instead and the endpoint
+    answers 202 with a batch_id that can be looked up at /api/ingest/batches/{batch_id}.
     
     """
     try:
+        if INGEST_WRITE_BEHIND:
+            batch = await AgentController.enqueue_agent_info(agent_info, current_user.username)
+            return accepted_response(batch)
+
         agent_ids = []
         events_saved: Dict[str, int] = {}
 
@@ -56,10 +69,11 @@ async def post_agent_info(
             await AgentController.save_agent_info(agent)
             agent_ids.append(agent.agent_id)
         
+        known_agent_ids = set(agent_ids)
+        agent_events = [event for event in agent_info.events if event.agent_id in known_agent_ids]
+        saved_counts = await AgentController.save_events(agent_events)
         for agent_id in agent_ids:
-            agent_events = [event for event in agent_info.events if event.agent_id == agent_id]
-            event_count = await AgentController.save_events(agent_events)
-            events_saved[agent_id] = event_count
+            events_saved[agent_id] = saved_counts.get(agent_id, 0)
 
         response_content = AgentInfoResponseContent(
             message="Agents info and events saved successfully",
@@ -69,17 +83,17 @@ async def post_agent_info(
 
         return AgentInfoResponse(success=True, content=response_content)
     
-    except (UnauthorizedError, PermissionError):
+    except (UnauthorizedError, PermissionError, ServiceUnavailableError):
         raise
     except Exception as e:
         logger.error(f"Error in get_agent_info endpoint: {e}")
         raise InternalServerError()
           
-@router.get("/agents/summary", response_model=AgentSummaryResponse)
+@router.get("/agents/summary", response_model=AgentSummaryResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_summary(
     start_time: datetime = Query(..., description="Start time for the summary period"),
     end_time: datetime = Query(..., description="End time for the summary period"),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Endpoint to get a summary of agent information within a specified time range.
@@ -138,16 +152,16 @@ async def get_agent_summary(
     
     """
     try:
-        summary = await AgentController.get_agent_summary(user=current_user, start_time=start_time, end_time=end_time)
+        summary = await AgentController.get_agent_summary(auth=auth, start_time=start_time, end_time=end_time)
         return AgentSummaryResponse(agents=summary)
     except Exception as e:
         logger.error(f"Error in get_agent_summary endpoint: {e}")
         raise InternalServerError()
 
-@router.get("/messages", response_model=AgentMessagesResponse)
+@router.get("/messages", response_model=AgentMessagesResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_messages(
     request: AgentMessagesRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Endpoint to get recent high-level messages (rule_level > 8) for all agents the user has access to.
@@ -171,22 +185,29 @@ async def get_agent_messages(
           "rule_mitre_id": "string",
           "rule_level": 0
         }
-      ]
+      ],
+      "next_cursor": null
     }
-    
+
+    Pass page_size to page through every message instead of the latest `limit`; send next_cursor
+    back as cursor for the next page until it is null.
     """
     try:
         messages = await AgentController.get_messages(
-            user=current_user, 
+            auth=auth, 
             start_time=request.start_time, 
             end_time=request.end_time, 
-            limit=request.limit
+            limit=request.limit,
+            page_size=request.page_size,
+            cursor=request.cursor
         )
         return messages
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
     except PermissionError:
         raise PermissionError("Permission denied")
+    except BadRequestError:
+        raise
     except ElasticsearchError as e:
         logger.error(f"Elasticsearch error: {e}")
         raise ElasticsearchError("Database error")
@@ -194,10 +215,87 @@ async def get_agent_messages(
         logger.error(f"Error in get_agent_messages endpoint: {e}")
         raise InternalServerError()
     
-@router.get("/line-chart", response_model=LineChartResponse)
+@router.get("/export", response_class=StreamingResponse)
+async def export_events(
+    request: EventExportRequest = Depends(),
+    auth: AuthContext = Depends(AuthController.get_auth_context)
+):
+    """
+    Endpoint to export every event the user has access to within the time range, as NDJSON or CSV.
+    Events are read page by page from a point-in-time and written as the client reads them, so the
+    export is not capped like the list endpoints and runs in constant memory.
+
+    Request:
+    curl -X 'GET' \
+      'https://flask.aixsoar.com/api/wazuh/export?start_time=2024-01-01T00%3A00%3A00&end_time=2025-01-01T00%3A00%3A00&format=csv' \
+      -H 'Authorization: Bearer [Token]' \
+      -o events.csv
+
+    Response (format=ndjson, one event per line):
+    {"timestamp": "2024-07-30T12:05:00+00:00", "agent_id": "001", "agent_name": "test-agent-1", "rule_level": 3, ...}
+
+    """
+    try:
+        chunks = await AgentController.export_events(
+            auth=auth,
+            start_time=request.start_time,
+            end_time=request.end_time,
+            export_format=request.format
+        )
+        media_type = "text/csv" if request.format == "csv" else "application/x-ndjson"
+        filename = f"events_{request.start_time:%Y%m%d}_{request.end_time:%Y%m%d}.{request.format}"
+        return StreamingResponse(chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    except UnauthorizedError:
+        raise UnauthorizedError("Authentication required")
+    except PermissionError:
+        raise PermissionError("Permission denied")
+    except BadRequestError:
+        raise
+    except ElasticsearchError as e:
+        logger.error(f"Elasticsearch error: {e}")
+        raise ElasticsearchError("Database error")
+    except Exception as e:
+        logger.error(f"Error in export_events endpoint: {e}")
+        raise InternalServerError()
+
+@router.get("/alerts/stream", response_class=StreamingResponse)
+async def stream_alerts(
+    request: AlertStreamRequest = Depends(),
+    auth: AuthContext = Depends(AuthController.get_auth_context)
+):
+    """
+    Server-sent events stream of newly ingested high-level events (rule_level >= 8 by default)
+    of the user's groups, pushed as they are indexed instead of polling /messages.
+    A comment line is sent while idle; a `dropped` event reports alerts skipped because the
+    client read too slowly.
+
+    Request:
+    curl -N -X 'GET' \
+      'https://flask.aixsoar.com/api/wazuh/alerts/stream?groups=group1,group2&min_level=10' \
+      -H 'Accept: text/event-stream' \
+      -H 'Authorization: Bearer [Token]'
+
+    Response:
+    id: 42
+    event: alert
+    data: {"timestamp": "2024-07-30T12:05:00+00:00", "agent_id": "001", "agent_name": "test-agent-1", "rule_level": 10, "group_name": "group1", ...}
+
+    """
+    try:
+        groups = [group.strip() for group in request.groups.split(",") if group.strip()] if request.groups else None
+        events = await AgentController.stream_alerts(auth, groups, request.min_level)
+        return StreamingResponse(events, media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    except (UnauthorizedError, PermissionError, ServiceUnavailableError):
+        raise
+    except Exception as e:
+        logger.error(f"Error in stream_alerts endpoint: {e}")
+        raise InternalServerError()
+
+@router.get("/line-chart", response_model=LineChartResponse, dependencies=[Depends(conditional_get())])
 async def get_line_chart_data(
     request: LineChartRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Endpoint to get line chart data for top rule descriptions over the specified time range.
@@ -232,7 +330,7 @@ async def get_line_chart_data(
         start_time_utc = request.start_time.replace(tzinfo=tzutc())
         end_time_utc = request.end_time.replace(tzinfo=tzutc())
         
-        chart_data = await AgentController.get_line_chart_data(current_user,start_time_utc, end_time_utc)
+        chart_data = await AgentController.get_line_chart_data(auth, start_time_utc, end_time_utc)
         return chart_data
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
@@ -245,10 +343,10 @@ async def get_line_chart_data(
         logger.error(f"Error in get_agent_line-chart endpoint: {e}")
         raise InternalServerError()
 
-@router.get("/total-event", response_model=TotalEventAPIResponse)
+@router.get("/total-event", response_model=TotalEventAPIResponse, dependencies=[Depends(conditional_get())])
 async def get_total_event(
     request: TotalEventRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Endpoint to get the total count of events (levels 8-14) within a specified time range.
@@ -269,7 +367,7 @@ async def get_total_event(
     
     """
     try:
-        count = await AgentController.get_total_event_count(current_user,start_time=request.start_time, end_time=request.end_time)
+        count = await AgentController.get_total_event_count(auth, start_time=request.start_time, end_time=request.end_time)
         return TotalEventAPIResponse(success=True, content=TotalEventResponse(count=count))
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
@@ -282,10 +380,10 @@ async def get_total_event(
         logger.error(f"Error in get_agent_line-chart endpoint: {e}")
         raise InternalServerError()
 
-@router.get("/pie-chart", response_model=PieChartAPIResponse)
+@router.get("/pie-chart", response_model=PieChartAPIResponse, dependencies=[Depends(conditional_get())])
 async def get_pie_chart_data(
     request: PieChartRequest = Depends(),
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Endpoint to get pie chart data including Top 5 agents, Top MITRE ATT&CKs, Top 5 Events, and Top 5 Event Counts by Agent Name.
@@ -329,7 +427,7 @@ async def get_pie_chart_data(
     
     """
     try:
-        pie_chart_data = await AgentController.get_pie_chart_data(current_user,request.start_time, request.end_time)
+        pie_chart_data = await AgentController.get_pie_chart_data(auth, request.start_time, request.end_time)
         return PieChartAPIResponse(success=True, content=pie_chart_data)
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
@@ -342,9 +440,10 @@ async def get_pie_chart_data(
         logger.error(f"Error in get_agent_line-chart endpoint: {e}")
         raise InternalServerError()
 
-@router.get("/agent-details", response_model=AgentDetailsAPIResponse)
+@router.get("/agent-details", response_model=AgentDetailsAPIResponse, dependencies=[Depends(conditional_get())])
 async def get_agent_details(
-    current_user: UserModel = Depends(AuthController.get_current_user)
+    response: Response,
+    auth: AuthContext = Depends(AuthController.get_auth_context)
 ):
     """
     Endpoint to get the latest details of all agents including agent name, IP, OS, status code, and last keep alive.
@@ -371,8 +470,8 @@ async def get_agent_details(
     }
     """
     try:
-        agent_details = await AgentController.get_agent_details(current_user)
-        return AgentDetailsAPIResponse(success=True, content=agent_details)
+        agent_details = await AgentController.get_agent_details(auth)
+        return fast_json_response({"success": True, "content": agent_details}, response.headers, stream_path="content")
     except UnauthorizedError:
         raise UnauthorizedError("Authentication required")
     except PermissionError:
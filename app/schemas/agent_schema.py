@@ -82,3 +82,4 @@ class AgentEventTableResponse(BaseModel):
     success: bool
     content: List[EventTable]
     message: str
+    next_cursor: Optional[str] = None
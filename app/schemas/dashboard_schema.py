@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
 
 #1. Agent Summary
@@ -176,12 +176,36 @@ class EventTable(BaseModel):
 
 class EventTableContent(BaseModel):
     event_table: List[EventTable]
+    next_cursor: Optional[str] = None
 
 class EventTableRequest(BaseModel):
     start_time: datetime = Field(..., description="Start time for the event table query")
     end_time: datetime = Field(..., description="End time for the event table query")
+    page_size: Optional[int] = Field(None, ge=1, le=1000, description="Page through the events with this many per page")
+    cursor: Optional[str] = Field(None, description="next_cursor of the previous page")
 
 class EventTableResponse(BaseModel):
     success: bool
     content: EventTableContent
     message: str
+
+#11. Dashboard Snapshot
+class DashboardSnapshot(BaseModel):
+    agent_summary: AgentSummaryContent
+    agent_os: List[OSInfo]
+    alerts: AlertSeverity
+    cve_barchart: List[CVEBarchart]
+    tactic_linechart: List[Tactic]
+    malicious_file_barchart: List[MaliciousFile]
+    authentication_piechart: List[Authentication]
+    agent_name: List[AgentNameWithEventCount]
+    event_table: List[EventTable]
+
+class DashboardSnapshotRequest(BaseModel):
+    start_time: datetime = Field(..., description="Start time for the dashboard snapshot query")
+    end_time: datetime = Field(..., description="End time for the dashboard snapshot query")
+
+class DashboardSnapshotResponse(BaseModel):
+    success: bool
+    content: DashboardSnapshot
+    message: str
@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime
+
+class IngestAcceptedResponse(BaseModel):
+    success: bool = Field(..., example=True, description="Indicates if the upload was accepted")
+    message: str = Field(..., example="Events accepted for indexing", description="Response message")
+    batch_id: str = Field(..., example="3f9c0a7e2b9d4c61a8e4b1f0d2c3e4f5", description="Identifier used to query the batch status")
+    documents: int = Field(..., example=8, description="Number of documents queued for indexing")
+
+class IngestBatchStatus(BaseModel):
+    batch_id: str = Field(..., description="Identifier of the accepted upload")
+    status: str = Field(..., example="completed", description="One of pending, completed, partial or failed")
+    total: int = Field(..., description="Number of documents in the batch")
+    succeeded: int = Field(..., description="Number of documents indexed")
+    failed: int = Field(..., description="Number of documents rejected by Elasticsearch")
+    errors: List[Dict] = Field(default_factory=list, description="First per-document errors reported by Elasticsearch")
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+
+class IngestBatchStatusResponse(BaseModel):
+    success: bool
+    content: IngestBatchStatus
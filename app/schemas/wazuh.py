@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Literal, Optional, Tuple
 from datetime import datetime, timezone
 
 class Agent(BaseModel):
@@ -145,6 +145,7 @@ class AgentMessage(BaseModel):
 class AgentMessagesResponse(BaseModel):
     total: int = Field(..., description="Total number of high-level messages in the specified time range")
     datas: List[AgentMessage] = Field(..., description="List of high-level messages")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, absent on the last page or when not paging")
 
     class Config:
         schema_extra = {
@@ -168,6 +169,17 @@ class AgentMessagesRequest(BaseModel):
     start_time: datetime = Field(..., description="Start time for the message query")
     end_time: datetime = Field(..., description="End time for the message query")
     limit: int = Field(20, ge=1, le=100, description="Maximum number of high-level messages to return")
+    page_size: Optional[int] = Field(None, ge=1, le=1000, description="Page through the messages with this many per page")
+    cursor: Optional[str] = Field(None, description="next_cursor of the previous page")
+
+class EventExportRequest(BaseModel):
+    start_time: datetime = Field(..., description="Start time of the exported events")
+    end_time: datetime = Field(..., description="End time of the exported events")
+    format: Literal["ndjson", "csv"] = Field("ndjson", description="Export format")
+
+class AlertStreamRequest(BaseModel):
+    groups: Optional[str] = Field(None, description="Comma-separated groups to receive alerts of, default all accessible groups")
+    min_level: Optional[int] = Field(None, ge=0, le=16, description="Minimum rule_level, never below the feed's minimum")
 
 class LineData(BaseModel):
     name: str = Field(..., description="Name of the data series")
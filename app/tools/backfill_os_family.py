@@ -0,0 +1,71 @@
+"""
+Backfill `os_family` on agent_info documents indexed before it was derived at ingest time.
+
+Usage:
+    python -m app.tools.backfill_os_family [--pattern "*_agents_data"] [--dry-run]
+"""
+from logging import getLogger
+import argparse
+import asyncio
+import logging
+from app.models.es_client import es, close_es
+from app.models.index_manager import index_manager, INDEX_FAMILIES
+from app.models.wazuh_db import OS_FAMILY_KEYWORDS
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+def build_painless_script() -> str:
+    """Painless version of determine_os_family, generated from the same keyword table."""
+    lines = ["String os = ctx._source.os == null ? '' : ctx._source.os.toString().toLowerCase();",
+             "String family = 'other';"]
+    for position, (family, keywords) in enumerate(OS_FAMILY_KEYWORDS):
+        condition = " || ".join(f"os.contains('{keyword}')" for keyword in keywords)
+        lines.append(f"{'if' if position == 0 else 'else if'} ({condition}) {{ family = '{family}'; }}")
+    lines.append("ctx._source.os_family = family;")
+    return "\n".join(lines)
+
+MISSING_OS_FAMILY_QUERY = {
+    "bool": {
+        "filter": [{"term": {"wazuh_data_type": "agent_info"}}],
+        "must_not": [{"exists": {"field": "os_family"}}]
+    }
+}
+
+async def backfill(pattern: str, dry_run: bool = False) -> int:
+    # Make sure existing indices map os_family as a keyword before writing it
+    await index_manager.install_templates()
+    response = await es.indices.get_alias(index=pattern, allow_no_indices=True)
+    updated = 0
+    for index_name in sorted(response.keys()):
+        if dry_run:
+            count = await es.count(index=index_name, query=MISSING_OS_FAMILY_QUERY)
+            logger.info(f"{index_name}: {count['count']} documents without os_family")
+            continue
+        result = await es.options(request_timeout=3600).update_by_query(
+            index=index_name,
+            query=MISSING_OS_FAMILY_QUERY,
+            script={"source": build_painless_script(), "lang": "painless"},
+            conflicts="proceed",
+            slices="auto",
+            refresh=True
+        )
+        updated += result.get("updated", 0)
+        logger.info(f"{index_name}: updated {result.get('updated', 0)} documents, {len(result.get('failures', []))} failures")
+    return updated
+
+async def main(pattern: str, dry_run: bool) -> None:
+    try:
+        updated = await backfill(pattern, dry_run)
+        if not dry_run:
+            logger.info(f"Backfilled os_family on {updated} documents")
+    finally:
+        await close_es()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill os_family on existing agent_info documents")
+    parser.add_argument("--pattern", default=INDEX_FAMILIES["agents"].pattern, help="Index pattern to backfill")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the documents that need a backfill")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.pattern, args.dry_run))
@@ -0,0 +1,79 @@
+"""
+Backfill `rule_description.keyword` on wazuh_events documents indexed before the subfield was mapped.
+
+The top-events pie chart, the line chart and retention compaction all aggregate on the keyword
+subfield; older documents without it are left out of the charts and block their days from being
+compacted until this has run. Descriptions longer than RULE_DESCRIPTION_KEYWORD_MAX characters never
+get the subfield; they are flagged with rule_description_overlength, as new events are at ingest, so
+they are not picked up again and are rolled up without a description.
+
+Usage:
+    python -m app.tools.backfill_rule_description [--pattern "*_agents_data"] [--dry-run]
+"""
+from logging import getLogger
+import argparse
+import asyncio
+import logging
+from app.models.es_client import es, close_es
+from app.models.index_manager import index_manager, INDEX_FAMILIES, RULE_DESCRIPTION_KEYWORD_MAX
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+MISSING_RULE_DESCRIPTION_KEYWORD_QUERY = {
+    "bool": {
+        "filter": [
+            {"term": {"wazuh_data_type": "wazuh_events"}},
+            {"exists": {"field": "rule_description"}}
+        ],
+        "must_not": [
+            {"exists": {"field": "rule_description.keyword"}},
+            {"term": {"rule_description_overlength": True}}
+        ]
+    }
+}
+
+# Re-indexing the unchanged source fills the subfield; over-length descriptions are flagged instead
+BACKFILL_SCRIPT = """
+if (ctx._source.rule_description.toString().length() > params.max_length) {
+    ctx._source.rule_description_overlength = true;
+}
+"""
+
+async def backfill(pattern: str, dry_run: bool = False) -> int:
+    # Make sure existing indices map the keyword subfield before re-indexing into it
+    await index_manager.install_templates()
+    response = await es.indices.get_alias(index=pattern, allow_no_indices=True)
+    updated = 0
+    for index_name in sorted(response.keys()):
+        if dry_run:
+            count = await es.count(index=index_name, query=MISSING_RULE_DESCRIPTION_KEYWORD_QUERY)
+            logger.info(f"{index_name}: {count['count']} events without rule_description.keyword")
+            continue
+        result = await es.options(request_timeout=3600).update_by_query(
+            index=index_name,
+            query=MISSING_RULE_DESCRIPTION_KEYWORD_QUERY,
+            script={"source": BACKFILL_SCRIPT, "lang": "painless", "params": {"max_length": RULE_DESCRIPTION_KEYWORD_MAX}},
+            conflicts="proceed",
+            slices="auto",
+            refresh=True
+        )
+        updated += result.get("updated", 0)
+        logger.info(f"{index_name}: updated {result.get('updated', 0)} documents, {len(result.get('failures', []))} failures")
+    return updated
+
+async def main(pattern: str, dry_run: bool) -> None:
+    try:
+        updated = await backfill(pattern, dry_run)
+        if not dry_run:
+            logger.info(f"Backfilled rule_description.keyword on {updated} documents")
+    finally:
+        await close_es()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill rule_description.keyword on existing wazuh_events documents")
+    parser.add_argument("--pattern", default=INDEX_FAMILIES["agents"].pattern, help="Index pattern to backfill")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the documents that need a backfill")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.pattern, args.dry_run))
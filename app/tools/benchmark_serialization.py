@@ -0,0 +1,101 @@
+"""
+Compare the per-row cost of the pydantic response path with the orjson fast path used by the large
+list endpoints, on synthetic rows shaped like their stored documents. No Elasticsearch is needed.
+
+Usage:
+    python -m app.tools.benchmark_serialization [--rows 10000] [--repeat 5]
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Type
+from pydantic import BaseModel, TypeAdapter
+import argparse
+import time
+from app.schemas.mobus import ModbusEventResponse, SyslogEventResponse
+from app.schemas.rds import RDSDetectionRecord
+from app.schemas.wazuh import AgentDetailResponse
+from app.schemas.dashboard_schema import EventTable
+from app.controllers.rds import RDS_RECORD_FIELDS
+from app.tools import fast_json
+
+START = datetime(2024, 10, 1, tzinfo=timezone.utc)
+
+def modbus_rows(count: int) -> List[Dict]:
+    return [{
+        "event_id": f"{i:032x}", "device_id": f"lvr{i % 50}", "timestamp": (START + timedelta(seconds=i)).isoformat(),
+        "event_type": "modbus", "source_port": 502, "destination_ip": "192.168.1.100", "destination_port": 502,
+        "modbus_function": 3, "modbus_data": "0x001F", "alert": "Modbus Unauthorized Access",
+        "additional_info": {"register": 40001, "error_code": "ILLEGAL_DATA_VALUE"}
+    } for i in range(count)]
+
+def syslog_rows(count: int) -> List[Dict]:
+    return [{
+        "event_id": f"{i:032x}", "device": "4WAN_1LAN_IPSec_VPN_Router", "timestamp": (START + timedelta(seconds=i)).isoformat(),
+        "severity": "WARNING", "message": "Connection Accepted",
+        "details": {"in_interface": "eth0", "out_interface": "eth1", "src_ip": "192.168.1.100", "dst_ip": "203.69.85.29",
+                    "protocol": "TCP", "src_port": 35932, "dst_port": 80}
+    } for i in range(count)]
+
+def rds_rows(count: int) -> List[Dict]:
+    return [{
+        "timestamp": (START + timedelta(seconds=i)).isoformat(), "account": "xxxxx", "edge_name": f"edge-{i % 20}",
+        "edge_ip": "192.168.100.2", "edge_mac": "88:11:22:33:44:55", "edge_os": "Windows", "edge_ssid": "Office-Network",
+        "edge_dns_gateway": "192.168.1.1", "tag_id": "0001", "tag": "ransomware", "file_hash": "a1b2c3d4e5f6",
+        "file_name": "suspicious.exe", "file_path": "C:/Users/Admin/Downloads/", "score": "100", "data_type": "rds_detection"
+    } for i in range(count)]
+
+def agent_rows(count: int) -> List[Dict]:
+    return [{
+        "agent_name": f"agent-{i}", "ip": "10.0.0.1", "os": "Microsoft Windows 11 Pro", "agent_status": "active",
+        "last_keep_alive": START + timedelta(seconds=i), "registration_time": START
+    } for i in range(count)]
+
+def event_table_rows(count: int) -> List[Dict]:
+    return [{
+        "timestamp": (START + timedelta(seconds=i)).isoformat(), "agent_name": f"agent-{i % 100}",
+        "rule_description": "Multiple authentication failures", "rule_mitre_tactic": "Credential Access",
+        "rule_mitre_id": "T1110", "rule_level": 10
+    } for i in range(count)]
+
+def pydantic_path(model: Type[BaseModel], rows: List[Dict], convert: Callable[[Dict], Dict] = lambda row: row) -> bytes:
+    """Model per row in the handler, then FastAPI's response_model validation and serialization."""
+    adapter = TypeAdapter(List[model])
+    models = [model(**convert(row)) for row in rows]
+    return adapter.dump_json(adapter.validate_python([item.model_dump() for item in models]))
+
+def fast_path(rows: List[Dict], convert: Callable[[Dict], Dict] = lambda row: row) -> bytes:
+    content = [convert(row) for row in rows]
+    return b"".join(fast_json._stream(content, [], content))
+
+def rds_record(row: Dict) -> Dict:
+    return {field: datetime.fromisoformat(row["timestamp"]) if field == "timestamp" else row[field] for field in RDS_RECORD_FIELDS}
+
+CASES = {
+    "modbus_events": (ModbusEventResponse, modbus_rows, lambda row: row),
+    "syslog_events": (SyslogEventResponse, syslog_rows, lambda row: row),
+    "rds_events": (RDSDetectionRecord, rds_rows, rds_record),
+    "agent_details": (AgentDetailResponse, agent_rows, lambda row: row),
+    "event_table": (EventTable, event_table_rows, lambda row: row),
+}
+
+def best_of(function: Callable[[], bytes], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main(rows: int, repeat: int) -> None:
+    print(f"{'endpoint':<16}{'pydantic us/row':>18}{'fast us/row':>14}{'speedup':>10}")
+    for name, (model, generate, convert) in CASES.items():
+        data = generate(rows)
+        before = best_of(lambda: pydantic_path(model, data, convert), repeat) / rows * 1e6
+        after = best_of(lambda: fast_path(data, convert), repeat) / rows * 1e6
+        print(f"{name:<16}{before:>18.2f}{after:>14.2f}{before / after:>9.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark list response serialization")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows per response")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per path; the fastest is reported")
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
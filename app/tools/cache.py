@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from typing import Any, Dict, Hashable, Optional, Tuple
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+import inspect
+import os
+import time
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+class TTLCache:
+    """
+    Bounded in-process cache. Entries expire after their own TTL and the least recently used
+    entry is evicted once `max_entries` is reached. Hits and misses are counted per endpoint.
+    """
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+
+    def get(self, endpoint: str, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._count(endpoint, "hits")
+            return True, entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self._count(endpoint, "misses")
+        return False, None
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        return self._entries.pop(key, None) is not None
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        hits = sum(counter["hits"] for counter in self._stats.values())
+        misses = sum(counter["misses"] for counter in self._stats.values())
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "hits": hits,
+            "misses": misses,
+            "endpoints": {endpoint: dict(counter) for endpoint, counter in self._stats.items()}
+        }
+
+    def _count(self, endpoint: str, outcome: str) -> None:
+        counter = self._stats.setdefault(endpoint, {"hits": 0, "misses": 0})
+        counter[outcome] += 1
+
+def _parse_ttls(raw: str) -> Dict[str, float]:
+    """Parse `endpoint=seconds,endpoint=seconds` overrides."""
+    ttls = {}
+    for item in raw.split(','):
+        if '=' in item:
+            endpoint, seconds = item.split('=', 1)
+            ttls[endpoint.strip()] = float(seconds)
+    return ttls
+
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+# Time windows are floored to this many seconds so polls a few seconds apart share an entry
+RESULT_CACHE_QUANTUM = int(os.getenv('RESULT_CACHE_QUANTUM_SECONDS', 10))
+RESULT_CACHE_TTLS = _parse_ttls(os.getenv('RESULT_CACHE_TTLS', ''))
+
+result_cache = TTLCache(max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 1024)))
+
+def quantize(when: datetime, quantum: int = RESULT_CACHE_QUANTUM) -> datetime:
+    if quantum <= 1:
+        return when
+    epoch_seconds = int(when.timestamp())
+    return datetime.fromtimestamp(epoch_seconds - epoch_seconds % quantum, tz=when.tzinfo)
+
+def _key_part(value: Any) -> Hashable:
+    if isinstance(value, datetime):
+        return quantize(value).isoformat()
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted((_key_part(item) for item in value), key=str))
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _key_part(v)) for k, v in value.items()))
+    return value if isinstance(value, Hashable) else repr(value)
+
+# Data versions the current request's ETag is built from, set by the conditional GET routes. Cached
+# and coalesced results are keyed by it, so a result read under older versions never gets a newer tag.
+response_versions: ContextVar[Optional[Tuple]] = ContextVar("response_versions", default=None)
+
+def cached_result(endpoint: str, ttl: float):
+    """
+    Cache the result of an async query function, keyed by `endpoint` and its arguments with
+    datetimes quantized and group lists sorted. The TTL can be overridden with RESULT_CACHE_TTLS.
+    Cached values are shared between callers and must be treated as read-only.
+    """
+    ttl = RESULT_CACHE_TTLS.get(endpoint, ttl)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not RESULT_CACHE_ENABLED or ttl <= 0:
+                return await func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (endpoint, response_versions.get()) + tuple(_key_part(value) for value in bound.arguments.values())
+            hit, value = result_cache.get(endpoint, key)
+            if hit:
+                return value
+            value = await func(*args, **kwargs)
+            result_cache.set(key, value, ttl)
+            return value
+        return wrapper
+    return decorator
+
+# Resolved users of AuthController.get_current_user, keyed by username. Unknown usernames are
+# cached for the shorter negative TTL; a TTL of 0 disables the cache.
+PRINCIPAL_CACHE_TTL = float(os.getenv('PRINCIPAL_CACHE_TTL', 30))
+PRINCIPAL_CACHE_NEGATIVE_TTL = float(os.getenv('PRINCIPAL_CACHE_NEGATIVE_TTL', 5))
+
+principal_cache = TTLCache(max_entries=int(os.getenv('PRINCIPAL_CACHE_MAX_ENTRIES', 4096)))
+
+def invalidate_principal(username: Optional[str]) -> None:
+    """Drop the cached user after a change to it; other workers see the change within the TTL."""
+    if username:
+        principal_cache.invalidate(username)
+
+# Group names of each user id, read by every group-restricted request
+GROUP_CACHE_TTL = float(os.getenv('GROUP_CACHE_TTL', 60))
+
+group_cache = TTLCache(max_entries=int(os.getenv('GROUP_CACHE_MAX_ENTRIES', 4096)))
+
+def invalidate_groups(user_id: Optional[int]) -> None:
+    """Drop the cached groups of a user after a group membership change."""
+    if user_id is not None:
+        group_cache.invalidate(user_id)
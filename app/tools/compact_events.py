@@ -0,0 +1,35 @@
+"""
+Compact raw events older than RETENTION_RAW_DAYS into hourly and daily rollups and delete the raw
+events below RETENTION_KEEP_MIN_LEVEL. Runs the same job as the RETENTION_ENABLED background task.
+
+Usage:
+    python -m app.tools.compact_events [--raw-days 90] [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+from logging import getLogger
+from app.models.es_client import close_es
+from app.models.index_manager import index_manager
+from app.models.retention import retention_compactor
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+async def main(raw_days: int, dry_run: bool) -> None:
+    try:
+        if raw_days is not None:
+            retention_compactor.raw_days = raw_days
+        await index_manager.install_templates()
+        summary = await retention_compactor.run_once(dry_run=dry_run)
+        logger.info(f"Compaction {'dry run ' if dry_run else ''}finished: {summary}")
+    finally:
+        await close_es()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact old raw events into rollups")
+    parser.add_argument("--raw-days", type=int, default=None, help="Keep raw events of this many days (default RETENTION_RAW_DAYS)")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the days that would be compacted")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.raw_days, args.dry_run))
@@ -0,0 +1,80 @@
+from typing import Any, Iterator, List, Mapping, Optional
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+import orjson
+import os
+import uuid
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+# Arrays longer than this are streamed in chunks of FAST_JSON_CHUNK_ROWS rows
+FAST_JSON_STREAM_ROWS = int(os.getenv('FAST_JSON_STREAM_ROWS', 2000))
+FAST_JSON_CHUNK_ROWS = int(os.getenv('FAST_JSON_CHUNK_ROWS', 500))
+
+# Naive datetimes are written as-is and aware UTC datetimes with a Z suffix, like pydantic does
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+def _array_chunks(rows: List, chunk_rows: int) -> Iterator[bytes]:
+    for start in range(0, len(rows), chunk_rows):
+        # Each chunk is a JSON array; drop its brackets and join the chunks with commas
+        body = dumps(rows[start:start + chunk_rows])[1:-1]
+        yield body if start == 0 else b"," + body
+
+def _stream(content: Any, path: List[str], rows: List) -> Iterator[bytes]:
+    marker = uuid.uuid4().hex
+    envelope = content
+    if path:
+        # Rebuild the envelope down to the streamed array with a placeholder in its place
+        envelope = dict(content)
+        node = envelope
+        for key in path[:-1]:
+            node[key] = dict(node[key])
+            node = node[key]
+        node[path[-1]] = marker
+    head, tail = dumps(envelope).split(dumps(marker), 1) if path else (b"", b"")
+    yield head + b"["
+    yield from _array_chunks(rows, FAST_JSON_CHUNK_ROWS)
+    yield b"]" + tail
+
+def fast_json_response(content: Any, headers: Optional[Mapping[str, str]] = None, stream_path: Optional[str] = None,
+                       status_code: int = 200) -> Response:
+    """
+    Serialize trusted handler output with orjson, bypassing the response_model validation FastAPI
+    would otherwise run. Only use it for data the handler built itself from stored documents; the
+    route's response_model still documents the shape.
+
+    `stream_path` names the large array in the content ("" for a top-level array, "content.datas"
+    for a nested one); when it holds more than FAST_JSON_STREAM_ROWS rows the response is streamed
+    chunk by chunk. `headers` are copied onto the response, e.g. the headers dependencies set on the
+    injected Response, which FastAPI does not merge into a returned Response.
+    """
+    headers = {key: value for key, value in (headers or {}).items() if key.lower() != "content-length"}
+    if stream_path is not None:
+        path = [key for key in stream_path.split(".") if key]
+        rows = content
+        for key in path:
+            rows = rows[key]
+        if isinstance(rows, list) and len(rows) > FAST_JSON_STREAM_ROWS:
+            return StreamingResponse(_stream(content, path, rows), status_code=status_code,
+                                     media_type="application/json", headers=headers)
+    return Response(dumps(content), status_code=status_code, media_type="application/json", headers=headers)
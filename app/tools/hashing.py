@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from passlib.context import CryptContext
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.ext.error import TooManyRequestsError
+import asyncio
+import os
+import time
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a dedicated thread pool so a burst of logins does not
+    block the event loop (bcrypt releases the GIL while hashing). At most `workers` hashes run at
+    once and at most `max_queue` wait for a worker; beyond that callers get a 429 instead of
+    queueing without bound.
+    """
+
+    def __init__(self, context: CryptContext, workers: int = 2, max_queue: int = 32):
+        self.context = context
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._busy_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise TooManyRequestsError("Too many concurrent login requests, please retry shortly", retry_after=1)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self.pending += 1
+        try:
+            result, seconds = await asyncio.get_running_loop().run_in_executor(self._executor, self._timed, func, *args)
+        finally:
+            self.pending -= 1
+        # Counted here rather than in the worker thread, so only the event loop updates the counters
+        self._busy_seconds += seconds
+        self.completed += 1
+        return result
+
+    @staticmethod
+    def _timed(func: Callable, *args: Any) -> Tuple[Any, float]:
+        started = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - started
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_ms": round(self._busy_seconds / self.completed * 1000, 1) if self.completed else 0.0
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Shared hasher for login and signup
+password_hasher = PasswordHasher(
+    CryptContext(schemes=["bcrypt"], deprecated="auto"),
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', 2)),
+    max_queue=int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 32))
+)
@@ -0,0 +1,95 @@
+from typing import Dict
+from elasticsearch import AsyncElasticsearch, NotFoundError
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+from app.models.es_client import es
+import asyncio
+import os
+import time
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+# Access tokens also carry the user's id, role, groups and membership version, so group-restricted
+# requests are authorized from the token alone
+TOKEN_GROUP_CLAIMS = os.getenv('TOKEN_GROUP_CLAIMS', 'false').lower() == 'true'
+# Claims older than this are not trusted and the user is resolved from the database (and its caches)
+TOKEN_CLAIMS_MAX_AGE = int(os.getenv('TOKEN_CLAIMS_MAX_AGE', 300))
+
+BUMP_SCRIPT = """
+def current = ctx._source.versions.get(params.user_id);
+ctx._source.versions.put(params.user_id, (current == null ? 0 : current) + 1);
+"""
+
+class MembershipVersions:
+    """
+    Membership version per user id, bumped when the user is enabled or disabled or their groups
+    change. The versions are kept in one shared document so a bump on any worker outdates the
+    user's group claims everywhere: bumps are written at once, and each worker re-reads the
+    versions at most every `check_interval` seconds. Until a worker has read them, and while the
+    document cannot be read, claims are not trusted and users are resolved from the database.
+    """
+    VERSION_ID = "membership"
+
+    def __init__(self, es: AsyncElasticsearch, version_index: str, check_interval: int = 5):
+        self.es = es
+        self.version_index = version_index
+        self.check_interval = check_interval
+        self._versions: Dict[str, int] = {}
+        self._checked_at = 0.0
+        self._readable = False
+        self._lock = asyncio.Lock()
+
+    async def current(self, user_id: int) -> int:
+        await self._sync()
+        return self._versions.get(str(user_id), 0)
+
+    async def bump(self, user_id: int) -> None:
+        try:
+            response = await self.es.update(
+                index=self.version_index,
+                id=self.VERSION_ID,
+                script={"source": BUMP_SCRIPT, "lang": "painless", "params": {"user_id": str(user_id)}},
+                upsert={"versions": {str(user_id): 1}},
+                retry_on_conflict=5,
+                source=True
+            )
+            self._versions = response["get"]["_source"].get("versions", {})
+        except Exception as e:
+            logger.error(f"Could not bump membership version of user {user_id}: {str(e)}")
+
+    async def is_current(self, user_id: int, version: int) -> bool:
+        await self._sync()
+        return self._readable and version == self._versions.get(str(user_id), 0)
+
+    async def _sync(self) -> None:
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return
+            try:
+                response = await self.es.get(index=self.version_index, id=self.VERSION_ID)
+                self._versions = response["_source"].get("versions", {})
+                self._readable = True
+            except NotFoundError:
+                self._versions = {}
+                self._readable = True
+            except Exception as e:
+                self._readable = False
+                logger.warning(f"Could not read membership versions, not trusting group claims: {str(e)}")
+            self._checked_at = time.monotonic()
+
+# Shared versions bumped by the user management paths and checked against token claims
+membership_versions = MembershipVersions(
+    es,
+    version_index=os.getenv('MEMBERSHIP_VERSION_INDEX', 'membership_versions'),
+    check_interval=int(os.getenv('MEMBERSHIP_VERSION_CHECK_INTERVAL', 5))
+)
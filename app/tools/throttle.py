@@ -0,0 +1,72 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict
+from dotenv import load_dotenv, find_dotenv
+from logging import getLogger
+import os
+import time
+
+# Get the centralized logger
+logger = getLogger('app_logger')
+
+# Load environment variables
+try:
+    load_dotenv(find_dotenv())
+except Exception as e:
+    logger.error(f"Error loading .env file: {str(e)}")
+    raise
+
+class RateLimiter:
+    """
+    In-process sliding-window limiter: at most `limit` hits per key within `window` seconds. Keys
+    are kept least recently used first and the oldest are dropped beyond `max_keys`, so a flood of
+    distinct keys cannot grow it without bound. A limit of 0 disables it.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int = 10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self.rejected = 0
+
+    def retry_after(self, key: str) -> float:
+        """Seconds until `key` may be hit again, 0 when it is under the limit."""
+        if self.limit <= 0:
+            return 0.0
+        hits = self._recent(key, time.monotonic())
+        if len(hits) < self.limit:
+            return 0.0
+        self.rejected += 1
+        return hits[0] + self.window - time.monotonic()
+
+    def hit(self, key: str) -> None:
+        if self.limit <= 0:
+            return
+        now = time.monotonic()
+        self._recent(key, now).append(now)
+        self._hits.move_to_end(key)
+        while len(self._hits) > self.max_keys:
+            self._hits.popitem(last=False)
+
+    def reset(self, key: str) -> None:
+        self._hits.pop(key, None)
+
+    def _recent(self, key: str, now: float) -> Deque[float]:
+        hits = self._hits.setdefault(key, deque())
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        return hits
+
+    def stats(self) -> Dict:
+        return {"limit": self.limit, "window": self.window, "keys": len(self._hits), "rejected": self.rejected}
+
+# Login and signup attempts per client IP; both hash a password
+client_limiter = RateLimiter(
+    limit=int(os.getenv('LOGIN_THROTTLE_IP_ATTEMPTS', 30)),
+    window=float(os.getenv('LOGIN_THROTTLE_IP_WINDOW', 60))
+)
+# Failed logins per username, cleared by a successful login
+username_limiter = RateLimiter(
+    limit=int(os.getenv('LOGIN_THROTTLE_USER_FAILURES', 5)),
+    window=float(os.getenv('LOGIN_THROTTLE_USER_WINDOW', 300))
+)
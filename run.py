@@ -5,4 +5,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    # Behind the reverse proxy, request.client is taken from X-Forwarded-For when the peer is one of
+    # FORWARDED_ALLOW_IPS, so per-client limits see the real client address
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True,
+                proxy_headers=True, forwarded_allow_ips=os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1'))